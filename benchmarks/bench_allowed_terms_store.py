@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from allowed_terms_store import write_allowed_terms_store, load_allowed_terms, allowed_terms_store_path
+
+
+def allowed_terms(n_taxa):
+    """An allowed terms dictionary with the size of the real NCBITaxonomy vocabulary and a few small columns."""
+    return {
+        'NCBITaxonomy': {'missing': 'missing value', 'allowed_values': [f'{taxid}|Taxon {taxid} sp.' for taxid in range(1, n_taxa + 1)]},
+        'SampleType': {'missing': 'missing value', 'allowed_values': ['animal', 'plant', 'microbial', 'environment']},
+        'AgeInYears': {'missing': 'missing value', 'allowed_values': ['numeric']},
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark loading allowed terms from the store against json.load')
+    parser.add_argument('--taxa', type=int, nargs='+', default=[500_000, 2_500_000])
+    parser.add_argument('--queries', type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'taxa':>10} {'json.load [s]':>14} {'store [s]':>10} {'lookups [s]':>12}")
+    for n_taxa in args.taxa:
+        with tempfile.TemporaryDirectory() as folder:
+            json_path = os.path.join(folder, 'allowed_terms.json')
+            allowedTerm_dict = allowed_terms(n_taxa)
+            with open(json_path, 'w') as json_file:
+                json.dump(allowedTerm_dict, json_file, indent=4)
+
+            t_json, from_json = timed(load_allowed_terms, json_path)
+            write_allowed_terms_store(allowedTerm_dict, allowed_terms_store_path(json_path), source_json=json_path)
+            t_store, from_store = timed(load_allowed_terms, json_path, True)
+
+            queries = [f'{taxid}|Taxon {taxid} sp.' for taxid in range(1, 2 * n_taxa, 2 * n_taxa // args.queries)]
+            vocabulary = pickle.loads(pickle.dumps(from_store['NCBITaxonomy']['allowed_values']))
+            t_lookup, found = timed(lambda: [query in vocabulary for query in queries])
+
+            assert found == [query in from_json['NCBITaxonomy']['allowed_values'] for query in queries], 'lookups differ'
+            assert vocabulary.lookup(queries) == set(queries) & set(from_json['NCBITaxonomy']['allowed_values']), 'batch lookups differ'
+            assert {key: dict(value, allowed_values=list(value['allowed_values'])) for key, value in from_store.items()} == from_json, 'allowed terms differ'
+        print(f"{n_taxa:>10} {t_json:>14.3f} {t_store:>10.3f} {t_lookup:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from allowed_term_index import AllowedTermIndex
+from read_and_validate_redu_from_github import to_categorical_columns
+from redu_schema import validate_vocabulary_column
+
+
+def make_frame(allowed_terms, allowed_term_index, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for key in allowed_terms:
+        allowed_values = allowed_terms[key]['allowed_values']
+        if not allowed_term_index.is_vocabulary(key) or len(allowed_values) < 2:
+            continue
+        # mostly allowed terms, some with extra whitespace and some invalid values
+        observed = np.array(list(allowed_values) + [allowed_values[0].replace(' ', '  '), 'not a term', 'missing value'], dtype=object)
+        columns[key] = rng.choice(observed, n_rows)
+    return pd.DataFrame(columns)
+
+
+def validate_by_value_map(df, allowed_term_index):
+    """The former validation: a dict over all unique values, applied with Series.map."""
+    out = {}
+    for key in df.columns:
+        missing_value = allowed_term_index.missing_value(key)
+        value_map = {v: allowed_term_index.match_normalized(key, v, missing_value) for v in df[key].unique()}
+        out[key] = df[key].map(value_map).fillna(missing_value).replace("", missing_value)
+    return pd.DataFrame(out)
+
+
+def validate_by_category_codes(df, allowed_term_index):
+    return pd.DataFrame({key: validate_vocabulary_column(df[key], key, allowed_term_index, allowed_term_index.missing_value(key))[0]
+                         for key in df.columns})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vocabulary validation and the memory of categorical REDU columns')
+    parser.add_argument('--allowed_terms', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'allowed_terms.json'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    args = parser.parse_args()
+
+    with open(args.allowed_terms, 'r') as f:
+        allowed_terms = json.load(f)
+
+    print(f"{'rows':>10} {'value map [s]':>14} {'codes [s]':>10} {'object [MB]':>12} {'categorical [MB]':>17}")
+    for n_rows in args.sizes:
+        allowed_term_index = AllowedTermIndex(allowed_terms)
+        df = make_frame(allowed_terms, allowed_term_index, n_rows)
+
+        start = time.perf_counter()
+        old = validate_by_value_map(df, allowed_term_index)
+        t_old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new = validate_by_category_codes(df, allowed_term_index)
+        t_new = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(old, new)
+
+        categorical = to_categorical_columns(new, allowed_term_index)
+        assert categorical.astype(object).equals(new)
+
+        object_mb = new.memory_usage(deep=True).sum() / 1e6
+        categorical_mb = categorical.memory_usage(deep=True).sum() / 1e6
+        print(f"{n_rows:>10} {t_old:>14.3f} {t_new:>10.3f} {object_mb:>12.1f} {categorical_mb:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
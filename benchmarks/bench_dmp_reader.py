@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from ncbi_dmp import read_dmp, read_names_dmp, format_taxonomy_terms
+
+
+NAME_CLASSES = ['scientific name', 'synonym', 'genbank common name', 'common name', 'authority', 'includes', 'type material']
+RANKS = ['species', 'genus', 'family', 'no rank', 'clade', 'strain', 'subspecies']
+DIVISIONS = [(0, 'BCT', 'Bacteria'), (1, 'INV', 'Invertebrates'), (2, 'MAM', 'Mammals'), (3, 'PHG', 'Phages'),
+             (4, 'PLN', 'Plants and Fungi'), (5, 'PRI', 'Primates'), (6, 'ROD', 'Rodents'), (7, 'SYN', 'Synthetic and Chimeric'),
+             (8, 'UNA', 'Unassigned'), (9, 'VRL', 'Viruses'), (10, 'VRT', 'Vertebrates'), (11, 'ENV', 'Environmental samples')]
+
+
+def write_dump(folder, n_taxa, seed=0):
+    rng = random.Random(seed)
+    with open(os.path.join(folder, 'nodes.dmp'), 'w') as nodes, open(os.path.join(folder, 'names.dmp'), 'w') as names:
+        for taxid in range(1, n_taxa + 1):
+            parent = rng.randint(1, taxid)
+            nodes.write(f"{taxid}\t|\t{parent}\t|\t{rng.choice(RANKS)}\t|\tXX\t|\t{rng.randint(0, 11)}\t|\t1\t|\t11\t|\t1\t|\t0\t|\t1\t|\t0\t|\t0\t|\t\t|\n")
+            names.write(f"{taxid}\t|\tTaxon {taxid} sp.\t|\t\t|\tscientific name\t|\n")
+            for _ in range(rng.randint(0, 2)):
+                name = rng.choice([f'"Taxon" {taxid}', f'taxon {taxid} strain ABC-{rng.randint(0, 99)}', f'Taxon {taxid} (Smith, 1901)'])
+                names.write(f"{taxid}\t|\t{name}\t|\t{name} <{taxid}>\t|\t{rng.choice(NAME_CLASSES[1:])}\t|\n")
+    with open(os.path.join(folder, 'division.dmp'), 'w') as division:
+        for div_id, code, name in DIVISIONS:
+            division.write(f"{div_id}\t|\t{code}\t|\t{name}\t|\t\t|\n")
+
+
+def allowed_taxonomy_terms_python_engine(names_dmp):
+    """The former update_allowed_terms_from_ontologies.py steps."""
+    df = pd.read_csv(names_dmp, sep='\t\\|\t', engine='python', header=None, usecols=[0, 1, 2, 3],
+                     names=['ncbi_id', 'taxaname', 'unique_name', 'name_class'], dtype=str, lineterminator='\n')
+    df['name_class'] = df['name_class'].str.rstrip('\t|')
+    scientific_names_df = df[df['name_class'].str.strip() == 'scientific name'].copy()
+    scientific_names_df = scientific_names_df.drop(['unique_name', 'name_class'], axis=1)
+    scientific_names_df.reset_index(drop=True, inplace=True)
+    return scientific_names_df.apply(lambda x: f'{x["ncbi_id"]}|{x["taxaname"]}', axis=1).to_frame(name='redu_ncbis')['redu_ncbis'].tolist()
+
+
+def allowed_taxonomy_terms_dmp_reader(names_dmp):
+    scientific_names_df = read_names_dmp(names_dmp, name_classes=['scientific name'], columns=[0, 1], names=['ncbi_id', 'taxaname'])
+    return format_taxonomy_terms(scientific_names_df['ncbi_id'], scientific_names_df['taxaname'])
+
+
+def rank_division_python_engine(nodes_dmp, division_dmp):
+    """The former prepare_ontologies.py steps."""
+    df_ncbi_rank = pd.read_csv(nodes_dmp, sep='\t\\|\t', engine='python', header=None, index_col=False, comment='#')
+    df_ncbi_rank = df_ncbi_rank.dropna(axis=1, how='all')
+    df_ncbi_rank.columns = ['TaxonID', 'ParentID', 'NCBIRank', 'Empties1', 'DivID', 'InheritedDivFlag', 'GeneticCodeID', 'InheritedGCFlag', 'MitochondrialGeneticCodeID', 'InheritedMitoGCFlag', 'GenBankHiddenFlag', 'HiddenSubtreeRootFlag', 'Comments']
+    df_ncbi_rank = df_ncbi_rank[['TaxonID', 'NCBIRank', 'DivID']]
+    df_ncbi_divisions = pd.read_csv(division_dmp, sep='\t\\|\t', engine='python', header=None, index_col=False)
+    df_ncbi_divisions[3] = df_ncbi_divisions[3].str.replace('\t|', '', regex=False).str.strip()
+    df_ncbi_divisions.columns = ['DivID', 'Abbreviation', 'NCBIDivision', 'Notes']
+    df_ncbi_divisions = df_ncbi_divisions[['DivID', 'NCBIDivision']]
+    df = pd.merge(df_ncbi_rank, df_ncbi_divisions, on='DivID', how='left')
+    return df[['TaxonID', 'NCBIRank', 'NCBIDivision']]
+
+
+def rank_division_dmp_reader(nodes_dmp, division_dmp):
+    df_ncbi_rank = read_dmp(nodes_dmp, [0, 2, 4], ['TaxonID', 'NCBIRank', 'DivID'], dtype={'TaxonID': 'int64', 'DivID': 'int64'})
+    df_ncbi_divisions = read_dmp(division_dmp, [0, 2], ['DivID', 'NCBIDivision'], dtype={'DivID': 'int64'})
+    df = pd.merge(df_ncbi_rank, df_ncbi_divisions, on='DivID', how='left')
+    return df[['TaxonID', 'NCBIRank', 'NCBIDivision']]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark the C engine .dmp reader against the python engine reads')
+    parser.add_argument('--taxa', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'taxa':>10} {'names python [s]':>17} {'names reader [s]':>17} {'nodes python [s]':>17} {'nodes reader [s]':>17}")
+    for n_taxa in args.taxa:
+        with tempfile.TemporaryDirectory() as folder:
+            write_dump(folder, n_taxa)
+            names_dmp, nodes_dmp, division_dmp = (os.path.join(folder, f) for f in ['names.dmp', 'nodes.dmp', 'division.dmp'])
+
+            t_names_old, terms_old = timed(allowed_taxonomy_terms_python_engine, names_dmp)
+            t_names_new, terms_new = timed(allowed_taxonomy_terms_dmp_reader, names_dmp)
+            t_nodes_old, ranks_old = timed(rank_division_python_engine, nodes_dmp, division_dmp)
+            t_nodes_new, ranks_new = timed(rank_division_dmp_reader, nodes_dmp, division_dmp)
+
+        assert terms_old == terms_new, 'NCBITaxonomy allowed terms differ'
+        assert ranks_old.to_csv(index=False) == ranks_new.to_csv(index=False), 'NCBI_Rank_Division tables differ'
+        print(f"{n_taxa:>10} {t_names_old:>17.3f} {t_names_new:>17.3f} {t_nodes_old:>17.3f} {t_nodes_new:>17.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from REDU_conversion_functions import age_category
+from read_and_validate_redu_from_github import life_stages, unique_subject_ids, sufficient_metadata_mask, SUFFICIENT_METADATA_COLUMNS
+
+
+MISSING = 'missing value'
+
+
+def make_frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+
+    ages = np.array(['0.5', '2', '7.5', '8', '17', '18', '30', '45', '50', '65', '80', 'abc', '', MISSING], dtype=object)
+    taxa = np.array(['9606|Homo sapiens', '10090|Mus musculus', MISSING], dtype=object)
+    subjects = np.array(['S1', 'S2', 'patient 7', '', 'not applicable', MISSING, None], dtype=object)
+
+    df = pd.DataFrame({
+        'MassiveID': rng.choice(np.array(['MSV000012345', 'MSV000067890', 'ST000001'], dtype=object), n_rows),
+        'AgeInYears': rng.choice(ages, n_rows),
+        'NCBITaxonomy': rng.choice(taxa, n_rows),
+        'SubjectIdentifierAsRecorded': rng.choice(subjects, n_rows),
+    })
+
+    # the filter columns are mostly missing so a good share of rows is dropped
+    for col in SUFFICIENT_METADATA_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.where(rng.random(n_rows) < 0.05, 'value', MISSING).astype(object)
+
+    return df
+
+
+def rowwise(df):
+    """The row-wise implementation complete_and_fill_REDU_table used before."""
+    life_stage = df.apply(lambda x: age_category(x['AgeInYears']) if x['NCBITaxonomy'] == "9606|Homo sapiens" else MISSING, axis=1)
+    subject_id = df.apply(lambda x: str(x['MassiveID']) + '_' + str(x['SubjectIdentifierAsRecorded'])
+                          if x['SubjectIdentifierAsRecorded'] != MISSING
+                          and x['SubjectIdentifierAsRecorded'] != ''
+                          and x['SubjectIdentifierAsRecorded'] != 'not applicable'
+                          and not pd.isna(x['SubjectIdentifierAsRecorded'])
+                          else MISSING, axis=1)
+
+    def count_non_missing_specific(row, cols):
+        return (row[cols] != "missing value").sum()
+
+    columns_to_check = [col for col in SUFFICIENT_METADATA_COLUMNS if col in df.columns]
+    keep = df.apply(count_non_missing_specific, cols=columns_to_check, axis=1) >= 1
+    return life_stage, subject_id, keep
+
+
+def columnar(df):
+    return life_stages(df, MISSING), unique_subject_ids(df, MISSING, MISSING), sufficient_metadata_mask(df)
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the generated columns and the sufficiency filter of the harmonizer')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--max_rowwise_rows', type=int, default=100_000,
+                        help='Only run the row-wise implementation up to this many rows, it takes minutes beyond that')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'row-wise [s]':>14} {'columnar [s]':>14} {'speedup':>9}")
+    for n_rows in args.sizes:
+        df = make_frame(n_rows)
+        t_columnar, new = timed(columnar, df)
+
+        if n_rows <= args.max_rowwise_rows:
+            t_rowwise, old = timed(rowwise, df)
+            for old_col, new_col in zip(old, new):
+                pd.testing.assert_series_equal(old_col, new_col, check_names=False, check_dtype=False)
+            print(f"{n_rows:>10} {t_rowwise:>14.3f} {t_columnar:>14.3f} {t_rowwise / t_columnar:>8.1f}x")
+        else:
+            print(f"{n_rows:>10} {'-':>14} {t_columnar:>14.3f} {'-':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+import ontology_cache
+from ontology_cache import set_ontology_cache, load_ontology
+from prepare_ontologies import get_uberon_table
+
+
+OWL_HEADER = '''<?xml version="1.0"?>
+<rdf:RDF xmlns="http://purl.obolibrary.org/obo/{name}.owl#"
+     xml:base="http://purl.obolibrary.org/obo/{name}.owl"
+     xmlns:owl="http://www.w3.org/2002/07/owl#"
+     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+     xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">
+    <owl:Ontology rdf:about="http://purl.obolibrary.org/obo/{name}.owl"/>
+    <owl:AnnotationProperty rdf:about="http://www.geneontology.org/formats/oboInOwl#hasExactSynonym"/>
+'''
+
+#the roots get_uberon_table looks up
+UBERON_ROOTS = ['UBERON_0000001', 'UBERON_0010000', 'UBERON_0000062', 'UBERON_0006314']
+
+
+def write_owl(path, name, prefix, n_classes, roots=(), seed=0):
+    """An RDF/XML ontology shaped like the OBO ones: classes with a label, exact synonyms and one or two parents."""
+    rng = random.Random(seed)
+    ids = list(roots) + [f'{prefix}_{i:07d}' for i in range(len(roots) + 1, n_classes + 1)]
+    with open(path, 'w') as owl:
+        owl.write(OWL_HEADER.format(name=name))
+        for k, class_id in enumerate(ids):
+            owl.write(f'    <owl:Class rdf:about="http://purl.obolibrary.org/obo/{class_id}">\n')
+            if rng.random() > 0.02:
+                owl.write(f'        <rdfs:label>{name} term {k}{" (sensu lato)" if rng.random() < 0.1 else ""}</rdfs:label>\n')
+            for synonym in range(rng.randint(0, 2)):
+                owl.write(f'        <oboInOwl:hasExactSynonym>{name} synonym {k}.{synonym}</oboInOwl:hasExactSynonym>\n')
+            for parent in {ids[rng.randrange(k)] for _ in range(rng.randint(1, 2))} if k else ():
+                owl.write(f'        <rdfs:subClassOf rdf:resource="http://purl.obolibrary.org/obo/{parent}"/>\n')
+            owl.write('    </owl:Class>\n')
+        owl.write('</rdf:RDF>\n')
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark reopening cached ontology quadstores against parsing the OWL file')
+    parser.add_argument('--classes', type=int, nargs='+', default=[20_000, 50_000])
+    parser.add_argument('--owl', help='Benchmark this uberon.owl instead of synthetic ones')
+    args = parser.parse_args()
+
+    print(f"{'classes':>10} {'parse [s]':>10} {'first cached [s]':>17} {'reopen [s]':>11} {'table parsed [s]':>17} {'table reopened [s]':>19}")
+    for n_classes in ([None] if args.owl else args.classes):
+        with tempfile.TemporaryDirectory() as folder:
+            owl_path = args.owl
+            if owl_path is None:
+                owl_path = os.path.join(folder, 'uberon.owl')
+                write_owl(owl_path, 'uberon', 'UBERON', n_classes, roots=UBERON_ROOTS)
+
+            set_ontology_cache(None)
+            t_parse, _ = timed(load_ontology, owl_path)
+            t_table_parsed, table_parsed = timed(get_uberon_table, owl_path)
+
+            set_ontology_cache(os.path.join(folder, 'cache'))
+            t_first, _ = timed(load_ontology, owl_path)
+            set_ontology_cache(os.path.join(folder, 'cache'))
+            t_reopen, _ = timed(load_ontology, owl_path)
+            t_table_reopened, table_reopened = timed(get_uberon_table, owl_path)
+            assert ontology_cache._ontology_cache.hits == 2, 'the quadstore was not reused'
+            set_ontology_cache(None)
+
+        assert table_parsed.to_csv(index=False) == table_reopened.to_csv(index=False), 'UBERON tables differ'
+        print(f"{len(table_parsed) if n_classes is None else n_classes:>10} {t_parse:>10.2f} {t_first:>17.2f} {t_reopen:>11.2f} "
+              f"{t_table_parsed:>17.2f} {t_table_reopened:>19.2f}")
+
+
+if __name__ == '__main__':
+    main()
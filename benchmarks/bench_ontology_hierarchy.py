@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from ontology_cache import load_ontology
+from ontology_hierarchy import OntologyHierarchy, get_hierarchy_table, hierarchy_table_path, merge_hierarchy_tables
+from prepare_ontologies import get_uberon_table
+from bench_ontology_cache import write_owl, UBERON_ROOTS
+
+
+#the columns of get_uberon_table and the roots they are computed from
+FLAGS = {'Is Multicellular': 'UBERON:0010000', 'Is Organ': 'UBERON:0000062', 'Is Fluid': 'UBERON:0006314'}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the ontology hierarchy index against the descendants of owlready2 and benchmark its queries')
+    parser.add_argument('--classes', type=int, nargs='+', default=[20_000, 50_000])
+    parser.add_argument('--roots', type=int, default=100, help='Number of random roots to query')
+    parser.add_argument('--owl', help='Benchmark this uberon.owl instead of synthetic ones')
+    args = parser.parse_args()
+
+    print(f"{'classes':>10} {'pairs':>10} {'index [s]':>10} {'load [s]':>9} {'descendants() per root [s]':>27} "
+          f"{'series per root [s]':>20} {'is_descendant [us]':>19}")
+    for n_classes in ([None] if args.owl else args.classes):
+        with tempfile.TemporaryDirectory() as folder:
+            owl_path = args.owl
+            if owl_path is None:
+                owl_path = os.path.join(folder, 'uberon.owl')
+                write_owl(owl_path, 'uberon', 'UBERON', n_classes, roots=UBERON_ROOTS)
+
+            uberon_table = get_uberon_table(owl_path)
+            uberon_table['UBERONOntologyIndex'] = uberon_table['UBERONOntologyIndex'].str.replace('_', ':')
+
+            t_index, hierarchy_df = timed(lambda: merge_hierarchy_tables([get_hierarchy_table(owl_path, 'UBERON_')]))
+            csv_path = hierarchy_table_path(os.path.join(folder, 'UBERON_CL_PO_ontology.csv'))
+            hierarchy_df.to_csv(csv_path, index=False)
+            t_load, hierarchy = timed(OntologyHierarchy.read_csv, csv_path)
+
+            for column, root in FLAGS.items():
+                assert uberon_table[column].tolist() == hierarchy.is_descendant_series(uberon_table['UBERONOntologyIndex'], root).tolist(), f'{column} differs'
+
+            # a new rule per root: descendants() over the loaded ontology against the index
+            onto = load_ontology(owl_path)
+            classes = list(onto.classes())
+            roots = random.Random(0).sample(classes, min(args.roots, len(classes)))
+            t_descendants, expected = timed(lambda: [{cls.name.replace('_', ':') for cls in root.descendants()} for root in roots])
+            t_series, found = timed(lambda: [hierarchy.is_descendant_series(uberon_table['UBERONOntologyIndex'], root.name.replace('_', ':')) for root in roots])
+            for root_terms, in_root in zip(expected, found):
+                assert in_root.tolist() == uberon_table['UBERONOntologyIndex'].isin(root_terms).tolist(), 'descendants differ'
+
+            terms = uberon_table['UBERONOntologyIndex'].tolist()
+            t_lookup, _ = timed(lambda: [hierarchy.is_descendant(term, root) for root in FLAGS.values() for term in terms])
+
+        print(f"{len(classes) if n_classes is None else n_classes:>10} {len(hierarchy_df):>10} {t_index:>10.2f} {t_load:>9.2f} "
+              f"{t_descendants / len(roots):>27.4f} {t_series / len(roots):>20.4f} {t_lookup / (len(FLAGS) * len(terms)) * 1e6:>19.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from ontology_table_store import CATEGORICAL_COLUMNS, read_ontology_table, ontology_table_store_path, write_ontology_table_store
+from prepare_ontologies import run_ontology_jobs, ontology_table_jobs, assemble_ontology_tables, write_ontology_tables
+from bench_ontology_cache import write_owl, UBERON_ROOTS
+
+
+#how the converters read each table: (columns, unique) of read_and_validate_redu_from_github.py and of MWB_to_REDU.py
+READS = {
+    'UBERON_CL_PO_ontology.csv': [(['UBERONOntologyIndex', 'Label', 'Is Fluid', 'Is Multicellular'], 'Label'), (None, None)],
+    'DOID_ontology.csv': [(['DOIDOntologyIndex', 'UBERONOntologyIndex', 'Label'], 'Label')],
+    'ENVO_biome_ontology.csv': [(['ENVOEnvironmentBiomeIndex', 'Label'], 'Label'), (None, None)],
+    'ENVO_material_ontology.csv': [(['ENVOEnvironmentMaterialIndex', 'Label'], 'Label'), (None, None)],
+    'NCBI_Rank_Division.csv': [(None, 'TaxonID')],
+}
+
+
+def read_csv(csv_path, columns, unique):
+    """The reads before the stores."""
+    df = pd.read_csv(csv_path, index_col=False)
+    if unique is not None:
+        df = df.drop_duplicates(subset=[unique])
+    return df if columns is None else df[[column for column in df.columns if column in columns]]
+
+
+def read_all(reader, results):
+    """Puts the time to read every table the way the converters do and the peak memory of the process in results."""
+    start = time.perf_counter()
+    for csv_path, reads in READS.items():
+        for columns, unique in reads:
+            reader(csv_path, columns, unique)
+    elapsed = time.perf_counter() - start
+    # VmHWM and not ru_maxrss, which keeps the peak of the parent across the exec of the spawned process
+    with open('/proc/self/status') as status:
+        peak_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+    results.put((elapsed, peak_kb / 1024))
+
+
+def run_fresh(reader):
+    # a new process for every reader, so the peak memory is that of its reads and not of the tables written here
+    context = get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=read_all, args=(reader, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark reading the ontology tables from their Parquet stores against the csvs')
+    parser.add_argument('--classes', type=int, default=100_000)
+    parser.add_argument('--taxa', type=int, default=2_000_000, help='Rows of the synthetic NCBI_Rank_Division.csv')
+    parser.add_argument('--folder', help='Folder with the ontology csvs of prepare_ontologies.py to use instead of synthetic ones')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        if args.folder:
+            for csv_path in READS:
+                shutil.copy(os.path.join(args.folder, csv_path), csv_path)
+                write_ontology_table_store(csv_path)
+        else:
+            owl_paths = []
+            for name, prefix, n_classes in [('uberon', 'UBERON', args.classes), ('cl', 'CL', args.classes // 2), ('po', 'PO', args.classes // 2),
+                                            ('doid', 'DOID', args.classes // 2), ('biome', 'ENVO', args.classes // 10), ('material', 'ENVO', args.classes // 10)]:
+                owl_paths.append(os.path.join(folder, f'{name}.owl'))
+                write_owl(owl_paths[-1], name, prefix, n_classes, roots=UBERON_ROOTS if name == 'uberon' else ())
+            tables = assemble_ontology_tables(run_ontology_jobs(ontology_table_jobs(*owl_paths)))
+            tables['NCBI_Rank_Division.csv'] = pd.DataFrame({'TaxonID': range(1, args.taxa + 1),
+                                                             'NCBIRank': ['species', 'genus', 'no rank'] * (args.taxa // 3) + ['species'] * (args.taxa % 3),
+                                                             'NCBIDivision': 'Bacteria'})
+            write_ontology_tables(tables)
+
+        for csv_path, reads in READS.items():
+            for columns, unique in reads:
+                df = read_ontology_table(csv_path, columns, unique)
+                # the categoricals hold the strings of the csv
+                for column in CATEGORICAL_COLUMNS:
+                    if column in df.columns:
+                        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+                        df[column] = df[column].astype(object)
+                pd.testing.assert_frame_equal(df, read_csv(csv_path, columns, unique))
+
+        print(f"{'table':>28} {'csv [MB]':>9} {'parquet [MB]':>13}")
+        for csv_path in READS:
+            print(f"{csv_path:>28} {os.path.getsize(csv_path) / 1e6:>9.1f} {os.path.getsize(ontology_table_store_path(csv_path)) / 1e6:>13.1f}")
+
+        t_csv, rss_csv = run_fresh(read_csv)
+        t_store, rss_store = run_fresh(read_ontology_table)
+        print(f"{'reader':>8} {'time [s]':>9} {'peak [MB]':>10}")
+        print(f"{'csv':>8} {t_csv:>9.2f} {rss_csv:>10.0f}")
+        print(f"{'parquet':>8} {t_store:>9.2f} {rss_store:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from ontology_cache import set_owl_reader
+from prepare_ontologies import get_uberon_table, get_ontology_table
+from bench_ontology_cache import write_owl, UBERON_ROOTS
+
+
+#the tables prepare_ontologies.py builds from each file
+TABLES = {
+    'uberon': lambda path: get_uberon_table(path),
+    'doid': lambda path: get_ontology_table(path, ont_prefix='DOID_', index_column_name='DOIDOntologyIndex'),
+    'biome': lambda path: get_ontology_table(path, ont_prefix='ENVO_', index_column_name='ENVOEnvironmentBiomeIndex'),
+    'material': lambda path: get_ontology_table(path, ont_prefix='ENVO_', index_column_name='ENVOEnvironmentMaterialIndex'),
+}
+
+
+def build_table(reader, table, owl_path, results):
+    """Puts the table as csv, the time to build it and the peak memory of the process in results."""
+    set_owl_reader(reader)
+    start = time.perf_counter()
+    csv = TABLES[table](owl_path).to_csv(index=False)
+    results.put((csv, time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def run_fresh(reader, table, owl_path):
+    # a new process for every table, so the peak memory is that of one table. Not a daemonic pool worker,
+    # owlready2 parses large files in a child process when the start method is fork, like in the pipeline
+    context = get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=build_table, args=(reader, table, owl_path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark the streaming OWL reader against owlready2')
+    parser.add_argument('--classes', type=int, default=100_000)
+    parser.add_argument('--uberon', help='uberon.owl to use instead of a synthetic one')
+    parser.add_argument('--doid', help='doid.owl to use instead of a synthetic one')
+    parser.add_argument('--biome', help='biome-hierarchy.owl to use instead of a synthetic one')
+    parser.add_argument('--material', help='material-hierarchy.owl to use instead of a synthetic one')
+    args = parser.parse_args()
+
+    print(f"{'table':>10} {'size [MB]':>10} {'owlready2 [s]':>14} {'stream [s]':>11} {'owlready2 [MB]':>15} {'stream [MB]':>12}")
+    with tempfile.TemporaryDirectory() as folder:
+        for table, name, prefix, roots in [('uberon', 'uberon', 'UBERON', UBERON_ROOTS), ('doid', 'doid', 'DOID', ()),
+                                            ('biome', 'envo', 'ENVO', ()), ('material', 'envo', 'ENVO', ())]:
+            owl_path = getattr(args, table)
+            if owl_path is None:
+                owl_path = os.path.join(folder, f'{table}.owl')
+                write_owl(owl_path, name, prefix, args.classes if table in ('uberon', 'doid') else args.classes // 10, roots=roots)
+
+            csv_owlready2, t_owlready2, rss_owlready2 = run_fresh('owlready2', table, owl_path)
+            csv_stream, t_stream, rss_stream = run_fresh('stream', table, owl_path)
+            assert csv_owlready2 == csv_stream, f'{table} tables differ'
+            print(f"{table:>10} {os.path.getsize(owl_path) / 1e6:>10.1f} {t_owlready2:>14.2f} {t_stream:>11.2f} "
+                  f"{rss_owlready2:>15.0f} {rss_stream:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
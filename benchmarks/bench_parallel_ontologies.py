@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from ontology_cache import set_ontology_cache
+from prepare_ontologies import run_ontology_jobs, ontology_table_jobs, hierarchy_table_jobs, assemble_ontology_tables, assemble_hierarchy_tables
+from bench_ontology_cache import write_owl, UBERON_ROOTS
+
+
+def prepare(owl_paths, workers):
+    results = run_ontology_jobs({**ontology_table_jobs(*owl_paths), **hierarchy_table_jobs(*owl_paths)}, workers)
+    return {**assemble_ontology_tables(results), **assemble_hierarchy_tables(results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark preparing the ontologies in a process pool against one process')
+    parser.add_argument('--classes', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        owl_paths = []
+        for name, prefix, n_classes in [('uberon', 'UBERON', args.classes), ('cl', 'CL', args.classes // 2), ('po', 'PO', args.classes // 2),
+                                        ('doid', 'DOID', args.classes // 2), ('biome', 'ENVO', args.classes // 10), ('material', 'ENVO', args.classes // 10)]:
+            owl_paths.append(os.path.join(folder, f'{name}.owl'))
+            write_owl(owl_paths[-1], name, prefix, n_classes, roots=UBERON_ROOTS if name == 'uberon' else ())
+
+        # the pool is only used when every OWL file is loaded on its own, the quadstores are written before timing
+        set_ontology_cache(os.path.join(folder, 'cache'))
+        prepare(owl_paths, 1)
+        start = time.perf_counter()
+        expected = prepare(owl_paths, 1)
+        print(f"{'workers':>8} {'time [s]':>9}")
+        print(f"{1:>8} {time.perf_counter() - start:>9.2f}")
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            tables = prepare(owl_paths, workers)
+            elapsed = time.perf_counter() - start
+            for file_name, table in expected.items():
+                assert table.to_csv(index=False) == tables[file_name].to_csv(index=False), f'{file_name} differs with {workers} workers'
+            print(f"{workers:>8} {elapsed:>9.2f}")
+        set_ontology_cache(None)
+    print(f'{os.cpu_count()} CPUs')
+
+
+if __name__ == '__main__':
+    main()
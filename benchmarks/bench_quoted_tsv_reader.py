@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from read_and_validate_redu_from_github import clean_read_tsv_quoted_lines
+
+
+def clean_read_tsv_quoted_lines_string_building(path):
+    """The former implementation, building the cleaned file as one string."""
+    cleaned_data = ''
+    with open(path, 'r') as file:
+        for line in file:
+            cleaned_line = line.strip().strip('"')
+            cleaned_data += cleaned_line + '\n'
+    return pd.read_csv(StringIO(cleaned_data), sep='\t')
+
+
+def write_quoted_tsv(path, n_rows):
+    columns = ['filename', 'MassiveID', 'SampleType', 'NCBITaxonomy', 'AgeInYears', 'Country']
+    with open(path, 'w') as f:
+        f.write('"' + '\t'.join(columns) + '"\n')
+        for i in range(n_rows):
+            f.write(f'"file_{i}.mzML\tMSV0000{i % 977}\tanimal\t9606|Homo sapiens\t{i % 90}\tUnited States of America"\n')
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reading quoted ReDU sheets')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'file [MB]':>10} {'string [s]':>11} {'string peak [MB]':>17} {'stream [s]':>11} {'stream peak [MB]':>17}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in args.sizes:
+            path = os.path.join(tmp, f'quoted_{n_rows}.tsv')
+            write_quoted_tsv(path, n_rows)
+
+            t_old, peak_old, old = measure(clean_read_tsv_quoted_lines_string_building, path)
+            t_new, peak_new, new = measure(clean_read_tsv_quoted_lines, path)
+            pd.testing.assert_frame_equal(old, new)
+
+            size_mb = os.path.getsize(path) / 1e6
+            print(f"{n_rows:>10} {size_mb:>10.1f} {t_old:>11.3f} {peak_old:>17.1f} {t_new:>11.3f} {peak_new:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
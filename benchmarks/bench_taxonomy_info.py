@@ -0,0 +1,171 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+import REDU_conversion_functions
+from REDU_conversion_functions import get_taxonomy_info
+from ncbi_lineage import NCBILineage
+
+
+#(taxid, parent, rank, name) of the clades the SampleType rules look at
+CLADES = [(1, 1, 'no rank', 'root'),
+          (131567, 1, 'no rank', 'cellular organisms'),
+          (2, 131567, 'superkingdom', 'Bacteria'),
+          (1117, 2, 'phylum', 'Cyanobacteria'),
+          (2759, 131567, 'superkingdom', 'Eukaryota'),
+          (33090, 2759, 'kingdom', 'Viridiplantae'),
+          (35493, 33090, 'phylum', 'Streptophyta'),
+          (3041, 33090, 'phylum', 'Chlorophyta'),
+          (2763, 2759, 'phylum', 'Rhodophyta'),
+          (2836, 2759, 'class', 'Bacillariophyta'),
+          (4751, 2759, 'kingdom', 'Fungi'),
+          (33208, 2759, 'kingdom', 'Metazoa'),
+          (40674, 33208, 'class', 'Mammalia'),
+          (8292, 33208, 'class', 'Amphibia'),
+          (8293, 8292, 'order', 'Caudata'),
+          (50557, 33208, 'class', 'Insecta'),
+          (6040, 33208, 'phylum', 'Porifera'),
+          (6447, 33208, 'phylum', 'Mollusca'),
+          (6073, 33208, 'phylum', 'Cnidaria'),
+          (10239, 1, 'superkingdom', 'Viruses')]
+
+
+def write_taxonomy_dump(folder, n_nodes, seed=0):
+    """Writes a nodes.dmp, names.dmp and merged.dmp with the clades above and n_nodes random taxa below them."""
+    rng = random.Random(seed)
+    nodes = list(CLADES)
+    taxids = [c[0] for c in CLADES]
+    next_taxid = 1_000_000
+    for _ in range(n_nodes):
+        parent = taxids[int(len(taxids) * rng.random() ** 0.5)]
+        nodes.append((next_taxid, parent, rng.choice(['genus', 'species', 'no rank']), f'Taxon {next_taxid}'))
+        taxids.append(next_taxid)
+        next_taxid += 1
+
+    with open(os.path.join(folder, 'nodes.dmp'), 'w') as f:
+        for taxid, parent, rank, _ in nodes:
+            f.write(f"{taxid}\t|\t{parent}\t|\t{rank}\t|\t\t|\t0\t|\n")
+    with open(os.path.join(folder, 'names.dmp'), 'w') as f:
+        for taxid, _, _, name in nodes:
+            f.write(f"{taxid}\t|\t{name}\t|\t\t|\tscientific name\t|\n")
+            f.write(f"{taxid}\t|\t{name.lower()} syn\t|\t\t|\tsynonym\t|\n")
+    merged = {next_taxid + k: rng.choice(taxids) for k in range(100)}
+    with open(os.path.join(folder, 'merged.dmp'), 'w') as f:
+        for old, new in merged.items():
+            f.write(f"{old}\t|\t{new}\t|\n")
+    return [n[0] for n in nodes], list(merged)
+
+
+def read_efetch_records(folder):
+    """taxid -> (parent, scientific name) and the merged taxids, read line by line without ncbi_lineage."""
+    records = {}
+    with open(os.path.join(folder, 'nodes.dmp')) as f:
+        for line in f:
+            fields = line.split('\t|\t')
+            records[int(fields[0])] = [int(fields[1]), None]
+    with open(os.path.join(folder, 'names.dmp')) as f:
+        for line in f:
+            fields = line.rstrip('\t|\n').split('\t|\t')
+            if fields[3] == 'scientific name':
+                records[int(fields[0])][1] = fields[1]
+    merged = {}
+    with open(os.path.join(folder, 'merged.dmp')) as f:
+        for line in f:
+            fields = line.rstrip('\t|\n').split('\t|\t')
+            merged[int(fields[0])] = int(fields[1])
+    return records, merged
+
+
+def serve_efetch(records, merged, latency):
+    """Starts a stand-in for the NCBI efetch taxonomy endpoint and returns the server."""
+
+    def taxon_xml(taxid):
+        taxid = merged.get(taxid, taxid)
+        if taxid not in records:
+            return '<?xml version="1.0" ?>\n<TaxaSet></TaxaSet>\n'
+        lineage = []
+        parent = records[taxid][0]
+        while parent != 1:
+            lineage.append(records[parent][1])
+            parent = records[parent][0]
+        return ('<?xml version="1.0" ?>\n<TaxaSet><Taxon>'
+                f'<TaxId>{taxid}</TaxId><ScientificName>{escape(records[taxid][1])}</ScientificName>'
+                f'<Lineage>{escape("; ".join(reversed(lineage)))}</Lineage>'
+                '</Taxon></TaxaSet>\n')
+
+    class EfetchHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            query = parse_qs(urlparse(self.path).query)
+            try:
+                body = taxon_xml(int(query['id'][0]))
+            except (KeyError, ValueError):
+                body = '<?xml version="1.0" ?>\n<eFetchResult><ERROR>ID list is empty!</ERROR></eFetchResult>\n'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/xml')
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EfetchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark the taxonomy dump classification against the efetch path on a local stand-in server')
+    parser.add_argument('--nodes', type=int, default=200_000, help='Random taxa in the synthetic taxonomy dump')
+    parser.add_argument('--queries', type=int, default=1_000, help='Unique taxids classified')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds the stand-in server waits per request, NCBI answers in about 0.3-1 s')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        taxids, merged_taxids = write_taxonomy_dump(folder, args.nodes)
+        records, merged = read_efetch_records(folder)
+        server = serve_efetch(records, merged, args.latency)
+        REDU_conversion_functions.NCBI_EUTILS_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+        rng = random.Random(1)
+        queries = [str(c[0]) for c in CLADES] + [str(t) for t in merged_taxids[:10]] + ['999999999', 'NA', 'abc', '']
+        queries += [str(t) for t in rng.sample(taxids, min(args.queries, len(taxids)))]
+
+        start = time.perf_counter()
+        lineage = NCBILineage.from_dmp(*(os.path.join(folder, f) for f in ['nodes.dmp', 'names.dmp', 'merged.dmp']))
+        t_load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        local = [lineage.taxonomy_info(q) for q in queries]
+        t_local = time.perf_counter() - start
+
+        start = time.perf_counter()
+        local_again = [lineage.taxonomy_info(q) for q in queries]
+        t_memoized = time.perf_counter() - start
+
+        start = time.perf_counter()
+        http = [get_taxonomy_info(q) for q in queries]
+        t_http = time.perf_counter() - start
+        server.shutdown()
+
+    differing = [(q, h, l) for q, h, l in zip(queries, http, local) if h != l]
+    assert not differing, f"labels differ (taxid, efetch, dump): {differing[:10]}"
+    assert local_again == local
+
+    labelled = sum(label[0] is not None for label in local)
+    print(f"{len(queries)} taxids, {labelled} with a SampleType, same labels from efetch and the dump")
+    print(f"{'efetch [s]':>12} {'dump load [s]':>14} {'dump [s]':>10} {'memoized [s]':>13}")
+    print(f"{t_http:>12.3f} {t_load:>14.3f} {t_local:>10.3f} {t_memoized:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from REDU_conversion_functions import get_taxonomy_id_from_name__allowedTerms, get_taxonomy_ids_from_names__allowedTerms
+
+
+def scan_taxonomy_id_from_name(organism_name, allowedTerm_dict, ncbi_id=''):
+    """The former linear scan of get_taxonomy_id_from_name__allowedTerms."""
+    taxonomy_data = allowedTerm_dict["NCBITaxonomy"]["allowed_values"]
+    try:
+        int(ncbi_id)
+    except ValueError:
+        ncbi_id = ''
+    if ncbi_id != '':
+        for entry in taxonomy_data:
+            parts = entry.split('|')
+            if len(parts) == 2 and parts[0] == ncbi_id:
+                return entry
+    organism_name = str(organism_name)
+    for entry in taxonomy_data:
+        parts = entry.split('|')
+        if len(parts) == 2 and parts[1].lower() == organism_name.lower():
+            return entry
+    return None
+
+
+def make_allowed_terms(n_terms, seed=0):
+    rng = random.Random(seed)
+    genera = [f'Genus{i}' for i in range(n_terms // 20 + 1)]
+    return [f"{i + 1}|{rng.choice(genera)} species{i}" for i in range(n_terms)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark the TaxonomyResolver against the former scan of the allowed NCBITaxonomy terms')
+    parser.add_argument('--terms', type=int, default=2_500_000)
+    parser.add_argument('--organisms', type=int, default=50, help='Organism names resolved, the scan takes about a second per name for 2.5M terms')
+    args = parser.parse_args()
+
+    allowed_values = make_allowed_terms(args.terms)
+    allowedTerm_dict = {'NCBITaxonomy': {'allowed_values': allowed_values}}
+
+    rng = random.Random(1)
+    organisms = [rng.choice(allowed_values).split('|')[1].upper() for _ in range(args.organisms // 2)]
+    organisms += [f'Unknown organism {i}' for i in range(args.organisms - len(organisms))]
+    ncbi_ids = [str(rng.randint(1, args.terms)) for _ in organisms]
+
+    start = time.perf_counter()
+    scanned = [scan_taxonomy_id_from_name(o, allowedTerm_dict) for o in organisms]
+    scanned_by_id = [scan_taxonomy_id_from_name(o, allowedTerm_dict, i) for o, i in zip(organisms, ncbi_ids)]
+    t_scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolved = [get_taxonomy_id_from_name__allowedTerms(o, allowedTerm_dict=allowedTerm_dict) for o in organisms]
+    t_first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolved_by_id = [get_taxonomy_id_from_name__allowedTerms(o, allowedTerm_dict=allowedTerm_dict, ncbi_id={i}) for o, i in zip(organisms, ncbi_ids)]
+    batch = get_taxonomy_ids_from_names__allowedTerms(organisms, allowedTerm_dict=allowedTerm_dict)
+    t_resolver = time.perf_counter() - start
+
+    assert resolved == scanned and [batch[o] for o in organisms] == scanned
+    assert resolved_by_id == scanned_by_id
+
+    print(f"{args.terms} allowed terms, {len(organisms)} organisms resolved by name and by ID, same terms")
+    print(f"{'scan [s]':>10} {'resolver incl. build [s]':>25} {'resolver [s]':>13}")
+    print(f"{t_scan:>10.3f} {t_first:>25.3f} {t_resolver:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
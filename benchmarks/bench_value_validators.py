@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+from redu_schema import numeric_pair_mask, file_extension_mask
+
+
+FILE_EXTENSIONS = ['.mzXML', '.mzML', '.raw', '.cdf', '.wiff', '.d']
+
+#values where the former checks are easy to get wrong
+EDGE_CASES = ['', '|', '1', '-1', '--1', '1-', '+1', '.', '-.', '.5', '-.5', '5.', '5.5.5', '1.5|-2.3', '1|2|3', '1||2',
+              '|1', '1|', ' 1', '1 ', '1e5', 'inf', 'nan', '²', '1²|³', '١٢٣', '-٣.٤', '1_000', '0x10', '1\n', '\n1', '1\0', '1\x002', 'a|b',
+              '1.5|' * 20 + '2', '1.5|' * 20 + 'x',
+              'a.mzML', 'A.MZML', 'a.mzml ', 'a.d', 'a.D', 'a.gz', 'mzML', '.raw', 'x.Raw', 'folder.d/file']
+
+
+def numeric_pair_mask_per_value(values):
+    """The former check, one value at a time."""
+    return np.array([all(part.replace('.', '', 1).isdigit() or part.lstrip('-').replace('.', '', 1).isdigit() for part in str(x).split('|'))
+                     for x in values], dtype=bool)
+
+
+def file_extension_mask_per_value(values, extensions):
+    """The former check, one value at a time."""
+    return np.array([any(str(x).lower().endswith(ext.lower()) for ext in extensions) for x in values], dtype=bool)
+
+
+def make_values(n_values, seed=0):
+    rng = np.random.default_rng(seed)
+    alphabet = np.array(list('0123456789.-|ab ²٣'))
+    weights = np.array([6] * 10 + [4, 2, 2, 1, 1, 1, 1, 1], dtype=float)
+    lengths = rng.integers(0, 14, n_values)
+    characters = rng.choice(alphabet, lengths.sum(), p=weights / weights.sum())
+    values = np.split(characters, np.cumsum(lengths)[:-1])
+    values = [''.join(v) for v in values]
+    # a share of well-formed coordinates and file names
+    for i in range(0, n_values, 3):
+        values[i] = f"{rng.uniform(-90, 90):.5f}|{rng.uniform(-180, 180):.5f}"
+    for i in range(1, n_values, 5):
+        values[i] = f"sample_{i}{rng.choice(FILE_EXTENSIONS + ['.txt', '.mzML.gz'])}"
+    return np.array(EDGE_CASES + values, dtype=object)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark the vectorized numeric|numeric and file extension validators')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 3_000_000])
+    args = parser.parse_args()
+
+    print(f"{'values':>10} {'pair loop [s]':>14} {'pair regex [s]':>15} {'ext loop [s]':>13} {'ext vector [s]':>15}")
+    for n_values in args.sizes:
+        values = make_values(n_values)
+
+        t_pair_old, pair_old = timed(numeric_pair_mask_per_value, values)
+        t_pair_new, pair_new = timed(numeric_pair_mask, values)
+        t_ext_old, ext_old = timed(file_extension_mask_per_value, values, FILE_EXTENSIONS)
+        t_ext_new, ext_new = timed(file_extension_mask, values, FILE_EXTENSIONS)
+
+        for name, old, new in [('numeric|numeric', pair_old, pair_new), ('file extension', ext_old, ext_new)]:
+            differing = values[old != new]
+            assert len(differing) == 0, f"{name} decisions differ for {list(differing[:10])}"
+
+        print(f"{len(values):>10} {t_pair_old:>14.3f} {t_pair_new:>15.3f} {t_ext_old:>13.3f} {t_ext_new:>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
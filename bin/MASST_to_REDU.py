@@ -1,8 +1,12 @@
 import argparse
 import pandas as pd
-import json
 import os
 from read_and_validate_redu_from_github import complete_and_fill_REDU_table
+from allowed_term_index import AllowedTermIndex
+from allowed_terms_store import load_allowed_terms
+from ontology_table_store import read_ontology_table
+from resolution_cache import ResolutionCache
+from remapping_report import RemappingReport
 
 
 
@@ -17,6 +21,9 @@ if __name__ == '__main__':
     parser.add_argument('--path_plantMASST')
     parser.add_argument('--path_ncbiRanksDivisions')
     parser.add_argument("--AllowedTermJson_path", type=str, help="Path to json with allowed terms")
+    parser.add_argument("--resolution_cache", type=str, help="SQLite file to reuse term resolutions across runs")
+    parser.add_argument("--remapping_report", type=str, help="Write the counts of remapped values and ignored columns to this JSONL file")
+    parser.add_argument("--remapping_verbosity", type=int, choices=[0, 1, 2], default=2, help="Remapped values printed to the log: 0 none, 1 one line per column, 2 every value")
     args = parser.parse_args()
 
 
@@ -35,12 +42,10 @@ if __name__ == '__main__':
     df_pm = df_pm[~df_pm['filename'].isin(df_redu['filename'])]
 
 
-    with open(args.AllowedTermJson_path, 'r') as json_file:
-        allowed_terms = json.load(json_file)
+    allowed_terms = load_allowed_terms(args.AllowedTermJson_path)
 
 
-    NCBIRankDivision_table = pd.read_csv(args.path_ncbiRanksDivisions, index_col = False)
-    NCBIRankDivision_table = NCBIRankDivision_table.drop_duplicates(subset=['TaxonID'])
+    NCBIRankDivision_table = read_ontology_table(args.path_ncbiRanksDivisions, unique='TaxonID')
 
     
 
@@ -64,7 +69,13 @@ if __name__ == '__main__':
     if len(df_list) > 0:
 
         df_massts = pd.concat(df_list, ignore_index=True)
-        df_massts_filled = complete_and_fill_REDU_table(df_massts, allowedTerm_dict=allowed_terms, NCBIRankDivision_table=NCBIRankDivision_table)
+        remapping_report = RemappingReport(args.remapping_verbosity)
+        df_massts_filled = complete_and_fill_REDU_table(df_massts, allowedTerm_dict=allowed_terms, NCBIRankDivision_table=NCBIRankDivision_table,
+                                                        allowed_term_index=AllowedTermIndex(allowed_terms),
+                                                        resolution_cache=ResolutionCache(args.resolution_cache, allowed_terms) if args.resolution_cache else None,
+                                                        remapping_report=remapping_report)
+        if args.remapping_report:
+            remapping_report.write(args.remapping_report)
 
         #save output to csv
         for massive_id in df_massts_filled['MassiveID'].unique():
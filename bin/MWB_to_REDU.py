@@ -13,15 +13,17 @@ import traceback
 import time
 from REDU_conversion_functions import get_taxonomy_id_from_name__allowedTerms
 from read_and_validate_redu_from_github import complete_and_fill_REDU_table
+from allowed_term_index import AllowedTermIndex
+from allowed_terms_store import load_allowed_terms
+from ontology_table_store import read_ontology_table
+from resolution_cache import ResolutionCache
+from remapping_report import RemappingReport
+from ontology_join import OntologyJoinStage
+from path_normalization import clean_macosx_paths, strip_gz, basename_lower
 from REDU_conversion_functions import age_category
 from REDU_conversion_functions import get_taxonomy_info
-
-
-def clean_path(path):
-    if path.startswith("__MACOSX/") and '/._' in path:
-        # Remove the __MACOSX part and the ._ prefix from the filename
-        return path.replace("__MACOSX/", "").replace("/._", "/")
-    return path
+from ncbi_lineage import NCBILineage
+from ncbi_name_index import TaxonomyNameIndex
 
 
 def merge_repeated_fileobservations_across_mwatb(df, **kwargs):
@@ -111,7 +113,7 @@ def _get_metabolomicsworkbench_files(dataset_accession):
                         file_obj["FILENAME"].lower().endswith(tuple(acceptable_extensions))]
         workbench_df = pd.DataFrame(mw_file_list)
         workbench_df["filename"] = workbench_df["FILENAME"]
-        workbench_df['filename'] = workbench_df['filename'].apply(clean_path)
+        workbench_df['filename'] = clean_macosx_paths(workbench_df['filename'], prefix_only=True)
         workbench_df["size_mb"] = (workbench_df["FILESIZE"].astype(int) / 1024 / 1024).astype(int)
         workbench_df["URL"] = workbench_df["URL"]        
 
@@ -447,17 +449,9 @@ def create_dataframe_from_SUBJECT_SAMPLE_FACTORS(data, rest_response, raw_file_n
 
         RAWFILE_PREF_DEBUG_STEM = "p10_1_a6_qing_hao__dist"  # e.g. "p10_1_a6_qing_hao__dist" ; empty disables debug prints
 
-        def _basename_lower(x):
-            s = "" if pd.isna(x) else str(x)
-            s = s.replace("\\", "/").split("/")[-1].lower()
-            return s
-
-        def _strip_gz(name_lower: str) -> str:
-            return re.sub(r"\.gz$", "", name_lower)
-
         tmp = raw_file_name_df.copy()
-        tmp["_base_lower"] = tmp["filename_base"].map(_basename_lower)
-        tmp["_no_gz"] = tmp["_base_lower"].map(_strip_gz)
+        tmp["_base_lower"] = basename_lower(tmp["filename_base"])
+        tmp["_no_gz"] = strip_gz(tmp["_base_lower"])
 
         # stem = filename without final extension (after optional .gz removal)
         tmp["_stem"] = tmp["_no_gz"].str.rsplit(".", n=1).str[0]
@@ -477,8 +471,8 @@ def create_dataframe_from_SUBJECT_SAMPLE_FACTORS(data, rest_response, raw_file_n
         # optional targeted debug (won't spam)
         if RAWFILE_PREF_DEBUG_STEM:
             cand = raw_file_name_df.copy()
-            cand["_base_lower"] = cand["filename_base"].map(_basename_lower)
-            cand["_no_gz"] = cand["_base_lower"].map(_strip_gz)
+            cand["_base_lower"] = basename_lower(cand["filename_base"])
+            cand["_no_gz"] = strip_gz(cand["_base_lower"])
             cand["_stem"] = cand["_no_gz"].str.rsplit(".", n=1).str[0]
             cand["_rank"] = 2
             cand.loc[cand["_no_gz"].str.endswith(".mzml"), "_rank"] = 0
@@ -522,12 +516,8 @@ def create_dataframe_from_SUBJECT_SAMPLE_FACTORS(data, rest_response, raw_file_n
         # Set to {} to silence stem-specific debug
         DEBUG_STEMS = {"p10_1_a6_qing_hao__dist"}  # lowercase stem WITHOUT extension
 
-        def _basename_lower(s: str) -> str:
-            # remove folder parts (handles / and \), lowercase
-            return str(s).replace("\\", "/").split("/")[-1].lower()
-
         # build preferred filename_base per stem from uploader table
-        raw_file_name_df['_base_lower'] = raw_file_name_df['filename_base'].map(_basename_lower)
+        raw_file_name_df['_base_lower'] = basename_lower(raw_file_name_df['filename_base'], missing_as_empty=False)
 
         raw_file_name_df['_stem'] = raw_file_name_df['_base_lower'].str.rsplit('.', n=1).str[0]
         raw_file_name_df['_ext']  = raw_file_name_df['_base_lower'].str.rsplit('.', n=1).str[-1].fillna('')
@@ -550,7 +540,7 @@ def create_dataframe_from_SUBJECT_SAMPLE_FACTORS(data, rest_response, raw_file_n
         # compute stem from metadata-provided filename_raw
         df['filename_raw_orig'] = df['filename_raw']
 
-        df['_raw_base_lower'] = df['filename_raw'].map(_basename_lower)
+        df['_raw_base_lower'] = basename_lower(df['filename_raw'], missing_as_empty=False)
         df['_raw_stem'] = df['_raw_base_lower'].str.rsplit('.', n=1).str[0]
         df['_raw_ext']  = df['_raw_base_lower'].str.rsplit('.', n=1).str[-1].fillna('')
 
@@ -914,7 +904,7 @@ def create_dataframe_outer_dict(MWB_mwTAB_dict, rest_response, raw_file_name_df=
     #######
     unique_species = set(df_outer['SUBJECT_SPECIES'])
     unique_species_ncbiIDs = set(df_outer['TAXONOMY_ID'])
-    processed_species = {species: get_taxonomy_id_from_name__allowedTerms(species, ncbi_id=unique_species_ncbiIDs, allowedTerm_dict=allowedTerm_dict) for species in unique_species}
+    processed_species = {species: get_taxonomy_id_from_name__allowedTerms(species, ncbi_id=unique_species_ncbiIDs, allowedTerm_dict=allowedTerm_dict, name_index=kwargs.get('name_index')) for species in unique_species}
     df_outer['NCBITaxonomy'] = df_outer['SUBJECT_SPECIES'].map(processed_species)
     attempt_taxa_extraction_from_inner = False
     if all(value is None for value in processed_species.values()):
@@ -955,7 +945,8 @@ def create_dataframe_outer_dict(MWB_mwTAB_dict, rest_response, raw_file_name_df=
 
     df_outer.loc[:, ['SampleType', 'SampleTypeSub1']] = 'missing value'
 
-    processed_taxonomy = {taxonomy.split('|')[0]: get_taxonomy_info(taxonomy.split('|')[0])
+    taxonomy_info = kwargs.get('taxonomy_info') or get_taxonomy_info
+    processed_taxonomy = {taxonomy.split('|')[0]: taxonomy_info(taxonomy.split('|')[0])
                         for taxonomy in df_outer['NCBITaxonomy'].unique()
                         if taxonomy is not None and '|' in taxonomy and 'None' not in taxonomy}
 
@@ -1094,7 +1085,7 @@ def translate_MWB_to_REDU_from_csv(MWB_table,
                 unique_species = set(MWB_table[MWB_table['Key'] != 'raw_file_name']['Value'])
                 
                 for species in unique_species:
-                    result = get_taxonomy_id_from_name__allowedTerms(species, allowedTerm_dict=allowedTerm_dict)
+                    result = get_taxonomy_id_from_name__allowedTerms(species, allowedTerm_dict=allowedTerm_dict, name_index=kwargs.get('name_index'))
                     if result is None:
                         none_count += 1
                         if none_count >= 100:
@@ -1180,6 +1171,9 @@ def MWB_to_REDU_study_wrapper(study_id, path_to_csvs='translation_sheets',
     ENVOEnvironmentBiomeIndex_table = kwargs['ENVOEnvironmentBiomeIndex_table']
     ENVOEnvironmentMaterialIndex_table = kwargs['ENVOEnvironmentMaterialIndex_table']
     NCBIRankDivision_table = kwargs['NCBIRankDivision_table']
+    allowed_term_index = kwargs.get('allowed_term_index')
+    if allowed_term_index is None:
+        allowed_term_index = AllowedTermIndex(allowedTerm_dict)
 
     raw_file_name_tupple = _get_metabolomicsworkbench_files(study_id)
 
@@ -1224,7 +1218,9 @@ def MWB_to_REDU_study_wrapper(study_id, path_to_csvs='translation_sheets',
                                       allowedTerm_dict=allowedTerm_dict,
                                       ontology_table=ontology_table,
                                       ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
-                                      ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table)
+                                      ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,
+                                      taxonomy_info=kwargs.get('taxonomy_info'),
+                                      name_index=kwargs.get('name_index'))
         
         if isinstance(redu_df, pd.DataFrame):
             redu_dfs.append(redu_df)
@@ -1267,6 +1263,10 @@ def MWB_to_REDU_study_wrapper(study_id, path_to_csvs='translation_sheets',
                                                  ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
                                                  ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,
                                                  NCBIRankDivision_table=NCBIRankDivision_table,
+                                                 allowed_term_index=allowed_term_index,
+                                                 ontology_join=kwargs.get('ontology_join'),
+                                                 resolution_cache=kwargs.get('resolution_cache'),
+                                                 remapping_report=kwargs.get('remapping_report'),
                                                  add_usi = True, other_allowed_file_extensions = ['.raw', '.cdf', '.wiff', '.d'])
 
 
@@ -1302,10 +1302,12 @@ def MWB_to_REDU_wrapper(mwTab_json=None, rest_response=None, MWB_analysis_ID=Non
     try:
 
         #create dataframe from mwTab file only considering per study variables
-        df_outer_dict = create_dataframe_outer_dict(mwTab_json, rest_response, raw_file_name_df=raw_file_name_df, path_to_csvs=path_to_csvs, allowedTerm_dict=allowedTerm_dict, ontology_table=ontology_table)
+        df_outer_dict = create_dataframe_outer_dict(mwTab_json, rest_response, raw_file_name_df=raw_file_name_df, path_to_csvs=path_to_csvs, allowedTerm_dict=allowedTerm_dict, ontology_table=ontology_table,
+                                                    taxonomy_info=kwargs.get('taxonomy_info'), name_index=kwargs.get('name_index'))
 
         #translate terms from per-study-variables to ReDU ontology 
-        df_outer_dict_REDUfied = translate_MWB_to_REDU_from_csv(df_outer_dict,case='outer',path_to_csvs=path_to_csvs,ontology_table=ontology_table,allowedTerm_dict=allowedTerm_dict)
+        df_outer_dict_REDUfied = translate_MWB_to_REDU_from_csv(df_outer_dict,case='outer',path_to_csvs=path_to_csvs,ontology_table=ontology_table,allowedTerm_dict=allowedTerm_dict,
+                                                                name_index=kwargs.get('name_index'))
 
         #
         df_outer_dict_REDUfied_filled = translate_MWB_to_REDU_from_csv(df_outer_dict_REDUfied,case='fill',path_to_csvs=path_to_csvs,ontology_table=ontology_table,allowedTerm_dict=allowedTerm_dict)
@@ -1428,6 +1430,12 @@ if __name__ == '__main__':
     parser.add_argument("--path_to_envo_material_csv", type=str, help="Path to the prepared uberon_cl_po ontology csv")
     parser.add_argument("--duplicate_raw_file_handling", "-duplStrat", type=str, help="What should be done with duplicate filenames across studies? Can be 'keep_pols_dupl' to keep cases where files can be distinguished by their polarity or 'remove_duplicates' to only keep cases where files can be assigned unambiguously (i.e. cases with only one analysis per study_id)(optional)", default='remove_duplicates')
     parser.add_argument("--path_to_polarity_info", type=str, help="Path to the polarity file.", default='none')
+    parser.add_argument("--resolution_cache", type=str, help="SQLite file to reuse term resolutions across studies and runs (optional)", default=None)
+    parser.add_argument("--nodes_dmp", type=str, help="nodes.dmp of the NCBI taxonomy dump, with --names_dmp SampleType is derived without NCBI requests (optional)", default=None)
+    parser.add_argument("--names_dmp", type=str, help="names.dmp of the NCBI taxonomy dump, species are also matched by its synonyms and common names (optional)", default=None)
+    parser.add_argument("--merged_dmp", type=str, help="merged.dmp of the NCBI taxonomy dump, to resolve merged taxids (optional)", default=None)
+    parser.add_argument("--remapping_report", type=str, help="Write the counts of remapped values and ignored columns to this JSONL file (optional)", default=None)
+    parser.add_argument("--remapping_verbosity", type=int, choices=[0, 1, 2], help="Remapped values printed to the log: 0 none, 1 one line per column, 2 every value (optional)", default=2)
 
     print('Starting MWB2REDU script,..')
 
@@ -1439,20 +1447,33 @@ if __name__ == '__main__':
     path_to_allowed_term_json = args.path_to_allowed_term_json
 
     # Read allowed terms json
-    with open(path_to_allowed_term_json, 'r') as file:
-        allowedTerm_dict = json.load(file)
+    allowedTerm_dict = load_allowed_terms(path_to_allowed_term_json)
+
+    allowed_term_index = AllowedTermIndex(allowedTerm_dict)
+    resolution_cache = ResolutionCache(args.resolution_cache, allowedTerm_dict) if args.resolution_cache else None
+    remapping_report = RemappingReport(args.remapping_verbosity)
+
+    # SampleType from the local taxonomy dump instead of one NCBI request per taxid
+    taxonomy_info = None
+    if args.nodes_dmp and args.names_dmp:
+        taxonomy_info = NCBILineage.from_dmp(args.nodes_dmp, args.names_dmp, args.merged_dmp).taxonomy_info
+    name_index = TaxonomyNameIndex.from_dmp(args.names_dmp) if args.names_dmp else None
 
     # Read ontology
-    ontology_table = pd.read_csv(args.path_to_uberon_cl_po_csv)
-    ENVOEnvironmentBiomeIndex_table = pd.read_csv(args.path_to_envo_biome_csv)
-    ENVOEnvironmentMaterialIndex_table = pd.read_csv(args.path_to_envo_material_csv)
+    ontology_table = read_ontology_table(args.path_to_uberon_cl_po_csv)
+    ENVOEnvironmentBiomeIndex_table = read_ontology_table(args.path_to_envo_biome_csv)
+    ENVOEnvironmentMaterialIndex_table = read_ontology_table(args.path_to_envo_material_csv)
 
     # Read polarity file
     polarity_table = pd.read_csv(args.path_to_polarity_info)
    
     # Read NCBI rank and division csv
-    NCBIRankDivision_table = pd.read_csv(args.path_ncbi_rank_division, index_col = False)
-    NCBIRankDivision_table = NCBIRankDivision_table.drop_duplicates(subset=['TaxonID'])
+    NCBIRankDivision_table = read_ontology_table(args.path_ncbi_rank_division, unique='TaxonID')
+
+    ontology_join = OntologyJoinStage(UBERONOntologyIndex_table=ontology_table,
+                                      ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
+                                      ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,
+                                      NCBIRankDivision_table=NCBIRankDivision_table)
 
     # result
     if study_id == "ALL":
@@ -1481,7 +1502,13 @@ if __name__ == '__main__':
                                           ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
                                           ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,
                                           polarity_table=polarity_table,
-                                          NCBIRankDivision_table=NCBIRankDivision_table)
+                                          NCBIRankDivision_table=NCBIRankDivision_table,
+                                          allowed_term_index=allowed_term_index,
+                                          ontology_join=ontology_join,
+                                          resolution_cache=resolution_cache,
+                                          remapping_report=remapping_report,
+                                          taxonomy_info=taxonomy_info,
+                                          name_index=name_index)
                 print('Extracted information for {} samples.'.format(len(result)))
                 if len(result) > 1:
                     all_results_list.append(result)
@@ -1502,6 +1529,18 @@ if __name__ == '__main__':
                                   ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
                                   ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,
                                   polarity_table=polarity_table,
-                                  NCBIRankDivision_table=NCBIRankDivision_table)
+                                  NCBIRankDivision_table=NCBIRankDivision_table,
+                                  allowed_term_index=allowed_term_index,
+                                  ontology_join=ontology_join,
+                                  resolution_cache=resolution_cache,
+                                  remapping_report=remapping_report,
+                                  taxonomy_info=taxonomy_info,
+                                  name_index=name_index)
+
+    if resolution_cache is not None:
+        resolution_cache.report()
+
+    if args.remapping_report:
+        remapping_report.write(args.remapping_report)
 
     print("Output files written to working directory")
@@ -3,16 +3,23 @@ import requests
 import pandas as pd
 from bs4 import BeautifulSoup
 import argparse
-import json
 import time
 import traceback
 import numpy as np
 from tqdm import tqdm
 from REDU_conversion_functions import age_category
-from REDU_conversion_functions import get_taxonomy_id_from_name__allowedTerms
+from REDU_conversion_functions import get_taxonomy_ids_from_names__allowedTerms
 from REDU_conversion_functions import get_taxonomy_info
+from ncbi_lineage import NCBILineage
+from ncbi_name_index import TaxonomyNameIndex
 from REDU_conversion_functions import merge_repeated_fileobservations
 from read_and_validate_redu_from_github import complete_and_fill_REDU_table
+from allowed_term_index import AllowedTermIndex
+from allowed_terms_store import load_allowed_terms
+from ontology_table_store import read_ontology_table
+from resolution_cache import ResolutionCache
+from remapping_report import RemappingReport
+from ontology_join import OntologyJoinStage
 from REDU_conversion_functions import find_column_after_target_column
 
 
@@ -249,6 +256,9 @@ def Metabolights2REDU(study_id, **kwargs):
             ENVOEnvironmentMaterialIndex_table = kwargs['ENVOEnvironmentMaterialIndex_table']
             ENVOEnvironmentBiomeIndex_table = kwargs['ENVOEnvironmentBiomeIndex_table']
             NCBIRankDivision_table  = kwargs['NCBIRankDivision_table']
+            allowed_term_index = kwargs.get('allowed_term_index')
+            if allowed_term_index is None:
+                allowed_term_index = AllowedTermIndex(allowedTerm_dict)
 
             
             df_study.loc[:, 'YearOfAnalysis'] = submissionYear
@@ -256,14 +266,16 @@ def Metabolights2REDU(study_id, **kwargs):
             #add NCBITaxonomy and Sampletype & SampleTypeSub1
             #######
             if 'Samples_Organism' in df_study.columns:
-                processed_organisms = {org: str(get_taxonomy_id_from_name__allowedTerms(org, allowedTerm_dict = allowedTerm_dict)) for org in df_study['Samples_Organism'].unique()}
+                processed_organisms = {org: str(term) for org, term in get_taxonomy_ids_from_names__allowedTerms(df_study['Samples_Organism'].unique(), allowedTerm_dict = allowedTerm_dict,
+                                                                                                                    name_index = kwargs.get('name_index')).items()}
 
                 df_study.loc[:, 'NCBITaxonomy'] = df_study['Samples_Organism'].map(processed_organisms)
                 df_study.loc[:, 'NCBITaxonomy'] = df_study['NCBITaxonomy'].replace(to_replace=r'^.*None.*$', value='missing value', regex=True)
                 
                 df_study.loc[:, ['SampleType', 'SampleTypeSub1']] = 'missing value'
 
-                processed_taxonomy = {taxonomy.split('|')[0]: get_taxonomy_info(taxonomy.split('|')[0])
+                taxonomy_info = kwargs.get('taxonomy_info') or get_taxonomy_info
+                processed_taxonomy = {taxonomy.split('|')[0]: taxonomy_info(taxonomy.split('|')[0])
                                     for taxonomy in df_study['NCBITaxonomy'].unique()
                                     if '|' in taxonomy and 'None' not in taxonomy}
                 
@@ -401,12 +413,7 @@ def Metabolights2REDU(study_id, **kwargs):
                 # Apply the function to the column
                 df_study['Assay_Instrument'] = df_study['Assay_Instrument'].apply(lambda x: remove_prefixes(x, prefixes))
 
-                allowed_values_map = dict(zip(
-                    allowedTerm_dict["MassSpectrometer"]["allowed_values_matching_0"],
-                    allowedTerm_dict["MassSpectrometer"]["allowed_values"]
-                ))
-
-                df_study["MassSpectrometer"] = df_study["Assay_Instrument"].map(allowed_values_map)
+                df_study["MassSpectrometer"] = allowed_term_index.mass_spectrometers.match_names(df_study["Assay_Instrument"])
 
 
 
@@ -503,7 +510,9 @@ def Metabolights2REDU(study_id, **kwargs):
             df_study = merge_repeated_fileobservations(df_study)
             df_study = complete_and_fill_REDU_table(df_study, allowedTerm_dict, UBERONOntologyIndex_table=ontology_table, ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
                                                     ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,NCBIRankDivision_table=NCBIRankDivision_table, add_usi = True, 
-                                                    other_allowed_file_extensions = ['.raw', '.cdf', '.wiff', '.d'])
+                                                    other_allowed_file_extensions = ['.raw', '.cdf', '.wiff', '.d'], allowed_term_index=allowed_term_index,
+                                                    ontology_join=kwargs.get('ontology_join'), resolution_cache=kwargs.get('resolution_cache'),
+                                                    remapping_report=kwargs.get('remapping_report'))
             
             df_study = df_study.drop_duplicates() 
 
@@ -529,6 +538,12 @@ if __name__ == "__main__":
     parser.add_argument("--path_to_envo_biome_csv", type=str, help="Path to the prepared uberon_cl_po ontology csv")
     parser.add_argument("--path_to_envo_material_csv", type=str, help="Path to the prepared uberon_cl_po ontology csv")
     parser.add_argument("--path_ncbi_rank_division", type=str, help="Path to the path_ncbi_rank_division")
+    parser.add_argument("--resolution_cache", type=str, help="SQLite file to reuse term resolutions across studies and runs", default=None)
+    parser.add_argument("--nodes_dmp", type=str, help="nodes.dmp of the NCBI taxonomy dump, with --names_dmp SampleType is derived without NCBI requests", default=None)
+    parser.add_argument("--names_dmp", type=str, help="names.dmp of the NCBI taxonomy dump, organisms are also matched by its synonyms and common names", default=None)
+    parser.add_argument("--merged_dmp", type=str, help="merged.dmp of the NCBI taxonomy dump, to resolve merged taxids", default=None)
+    parser.add_argument("--remapping_report", type=str, help="Write the counts of remapped values and ignored columns to this JSONL file", default=None)
+    parser.add_argument("--remapping_verbosity", type=int, choices=[0, 1, 2], help="Remapped values printed to the log: 0 none, 1 one line per column, 2 every value", default=2)
             
     args = parser.parse_args()
 
@@ -552,22 +567,31 @@ if __name__ == "__main__":
 
 
     # Read allowed terms json
-    with open(allowedTermSheet_json, 'r') as file:
-        allowedTerm_dict = json.load(file)
+    allowedTerm_dict = load_allowed_terms(allowedTermSheet_json)
+
+    allowed_term_index = AllowedTermIndex(allowedTerm_dict)
+    resolution_cache = ResolutionCache(args.resolution_cache, allowedTerm_dict) if args.resolution_cache else None
+    remapping_report = RemappingReport(args.remapping_verbosity)
 
-    # Add terms for matching
-    allowed_values = allowedTerm_dict["MassSpectrometer"]["allowed_values"]
-    allowedTerm_dict["MassSpectrometer"]["allowed_values_matching_0"] = [value.split('|')[0] for value in allowed_values]
+    # SampleType from the local taxonomy dump instead of one NCBI request per taxid
+    taxonomy_info = None
+    if args.nodes_dmp and args.names_dmp:
+        taxonomy_info = NCBILineage.from_dmp(args.nodes_dmp, args.names_dmp, args.merged_dmp).taxonomy_info
+    name_index = TaxonomyNameIndex.from_dmp(args.names_dmp) if args.names_dmp else None
 
 
     # Read ontology tables
-    ontology_table = pd.read_csv(args.path_to_uberon_cl_po_csv)
-    ENVOEnvironmentBiomeIndex_table = pd.read_csv(args.path_to_envo_biome_csv)
-    ENVOEnvironmentMaterialIndex_table = pd.read_csv(args.path_to_envo_material_csv)
+    ontology_table = read_ontology_table(args.path_to_uberon_cl_po_csv)
+    ENVOEnvironmentBiomeIndex_table = read_ontology_table(args.path_to_envo_biome_csv)
+    ENVOEnvironmentMaterialIndex_table = read_ontology_table(args.path_to_envo_material_csv)
 
     # Read NCBI rank and division csv
-    NCBIRankDivision_table = pd.read_csv(args.path_ncbi_rank_division, index_col = False)
-    NCBIRankDivision_table = NCBIRankDivision_table.drop_duplicates(subset=['TaxonID'])
+    NCBIRankDivision_table = read_ontology_table(args.path_ncbi_rank_division, unique='TaxonID')
+
+    ontology_join = OntologyJoinStage(UBERONOntologyIndex_table=ontology_table,
+                                      ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
+                                      ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,
+                                      NCBIRankDivision_table=NCBIRankDivision_table)
 
 
     REDU_dataframes = []
@@ -576,7 +600,10 @@ if __name__ == "__main__":
         try:
             print(f'Processing study {study_id}...')
             redu_table_single = Metabolights2REDU(study_id, allowedTerm_dict = allowedTerm_dict, ontology_table = ontology_table, ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
-                                                  ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table, NCBIRankDivision_table=NCBIRankDivision_table)
+                                                  ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table, NCBIRankDivision_table=NCBIRankDivision_table,
+                                                  allowed_term_index=allowed_term_index, ontology_join=ontology_join,
+                                                  resolution_cache=resolution_cache, remapping_report=remapping_report,
+                                                  taxonomy_info=taxonomy_info, name_index=name_index)
         except Exception as e:
             traceback_info = traceback.format_exc()
             print(f"An error occurred with study_id {study_id}: {e}\nTraceback:\n{traceback_info}")
@@ -595,3 +622,6 @@ if __name__ == "__main__":
     else:
         print('nothing to return!')
 
+    if args.remapping_report:
+        remapping_report.write(args.remapping_report)
+
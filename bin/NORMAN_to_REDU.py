@@ -4,14 +4,18 @@ import requests
 import pandas as pd
 from io import StringIO
 from tqdm import tqdm
-import re
 from urllib.parse import unquote
 import numpy as np
-from REDU_conversion_functions import get_taxonomy_id_from_name__allowedTerms
-import json
+from REDU_conversion_functions import get_taxonomy_ids_from_names__allowedTerms
+from ncbi_name_index import TaxonomyNameIndex
 import traceback
 from getAllNORMAN_file_paths import process_dataset_files
 from read_and_validate_redu_from_github import complete_and_fill_REDU_table
+from allowed_term_index import AllowedTermIndex
+from allowed_terms_store import load_allowed_terms
+from ontology_table_store import read_ontology_table
+from resolution_cache import ResolutionCache
+from remapping_report import RemappingReport
 
 def create_usi(row):
     return f"mzspec:DSFP_{row['uuid']}:{row['file_names']}"
@@ -58,6 +62,9 @@ def main(output_filename, study_id, **kwargs):
     ENVOEnvironmentBiomeIndex_table = kwargs['ENVOEnvironmentBiomeIndex_table']
     ENVOEnvironmentMaterialIndex_table = kwargs['ENVOEnvironmentMaterialIndex_table']
     NCBIRankDivision_table = kwargs['NCBIRankDivision_table']
+    allowed_term_index = kwargs.get('allowed_term_index')
+    if allowed_term_index is None:
+        allowed_term_index = AllowedTermIndex(allowedTerm_dict)
 
 
     # Fetch the list of datasets
@@ -197,7 +204,8 @@ def main(output_filename, study_id, **kwargs):
                             df_metadata_sheet['NCBITaxonomy'] = np.where(
                                 df_metadata_sheet['sample_type'] == 'Real Sample',  
                                 df_metadata_sheet['Biota species name (in Latin)']
-                                .map({org: str(get_taxonomy_id_from_name__allowedTerms(org, allowedTerm_dict = allowedTerm_dict)) for org in df_metadata_sheet['Biota species name (in Latin)'].unique()})
+                                .map({org: str(term) for org, term in get_taxonomy_ids_from_names__allowedTerms(df_metadata_sheet['Biota species name (in Latin)'].unique(), allowedTerm_dict = allowedTerm_dict,
+                                                                                                                name_index = kwargs.get('name_index')).items()})
                                 .fillna(''),
                                 ''
                                 )
@@ -333,11 +341,6 @@ def main(output_filename, study_id, **kwargs):
                             print(f"URL: {download_url}")
                             continue
 
-                        allowed_values_map = dict(zip(
-                            allowedTerm_dict["MassSpectrometer"]["allowed_values_matching_0"],
-                            allowedTerm_dict["MassSpectrometer"]["allowed_values"]
-                        ))
-
                         # If any of the values starts with "orbitrap " remove the substring "orbitrap " from the value
                         instrumentinfo_sheet['instrument_model'] = instrumentinfo_sheet['instrument_model'].str.replace('orbitrap ', '', case=False, regex=True)
                         instrumentinfo_sheet['instrument_model'] = instrumentinfo_sheet['instrument_model'].str.replace('maxis ', '', case=False, regex=True)
@@ -353,11 +356,8 @@ def main(output_filename, study_id, **kwargs):
                         instrumentinfo_sheet['instrument_model'] = instrumentinfo_sheet['instrument_model'].apply(
                             lambda x: ' '.join(x.split()) if not x.startswith((' ',)) else x)
                         
-                        instrumentinfo_sheet["MassSpectrometer"] = (
-                            instrumentinfo_sheet["instrument_model"]
-                            .apply(norm)
-                            .map(allowed_values_map)
-                        )
+                        instrumentinfo_sheet["MassSpectrometer"] = allowed_term_index.mass_spectrometers.match_normalized_names(
+                            instrumentinfo_sheet["instrument_model"])
 
 
                         nomran_sheets_for_single_dataset_sheets['Instrument info'].append(instrumentinfo_sheet)
@@ -554,7 +554,10 @@ def main(output_filename, study_id, **kwargs):
 
         combined_df = complete_and_fill_REDU_table(combined_df, allowedTerm_dict, UBERONOntologyIndex_table=ontology_table, ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
                                                     ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,NCBIRankDivision_table=NCBIRankDivision_table, add_usi = False, 
-                                                    other_allowed_file_extensions = ['.raw', '.cdf', '.wiff', '.d'], keep_usi = True)
+                                                    other_allowed_file_extensions = ['.raw', '.cdf', '.wiff', '.d'], keep_usi = True,
+                                                    allowed_term_index=allowed_term_index,
+                                                    resolution_cache=kwargs.get('resolution_cache'),
+                                                    remapping_report=kwargs.get('remapping_report'))
         
         # Make unique by USI
         combined_df = combined_df.drop_duplicates(subset=['USI'], keep='first')
@@ -619,33 +622,60 @@ if __name__ == "__main__":
         type=str, 
         help="Path to the path_ncbi_rank_division"
         )
+    parser.add_argument(
+        "--resolution_cache", 
+        type=str, 
+        default=None,
+        help="SQLite file to reuse term resolutions across runs"
+        )
+    parser.add_argument(
+        "--names_dmp", 
+        type=str, 
+        default=None,
+        help="names.dmp of the NCBI taxonomy dump, species are also matched by its synonyms and common names"
+        )
+    parser.add_argument(
+        "--remapping_report", 
+        type=str, 
+        default=None,
+        help="Write the counts of remapped values and ignored columns to this JSONL file"
+        )
+    parser.add_argument(
+        "--remapping_verbosity", 
+        type=int, 
+        choices=[0, 1, 2],
+        default=2,
+        help="Remapped values printed to the log: 0 none, 1 one line per column, 2 every value"
+        )
     
     args = parser.parse_args()
     
     path_to_allowed_term_json = args.path_to_allowed_term_json
 
     # Read allowed terms json
-    with open(path_to_allowed_term_json, 'r') as file:
-        allowedTerm_dict = json.load(file)
-
-    norm = lambda s: re.sub(r'[^a-z0-9]', '', str(s).lower())
-    allowed_values = allowedTerm_dict["MassSpectrometer"]["allowed_values"]
-    allowedTerm_dict["MassSpectrometer"]["allowed_values_matching_0"] = [
-    norm(v.split('|')[0]) for v in allowed_values]
+    allowedTerm_dict = load_allowed_terms(path_to_allowed_term_json)
 
     # Read ontology
-    ontology_table = pd.read_csv(args.path_to_uberon_cl_po_csv)
-    ENVOEnvironmentBiomeIndex_table = pd.read_csv(args.path_to_envo_biome_csv)
-    ENVOEnvironmentMaterialIndex_table = pd.read_csv(args.path_to_envo_material_csv)
+    ontology_table = read_ontology_table(args.path_to_uberon_cl_po_csv)
+    ENVOEnvironmentBiomeIndex_table = read_ontology_table(args.path_to_envo_biome_csv)
+    ENVOEnvironmentMaterialIndex_table = read_ontology_table(args.path_to_envo_material_csv)
 
    
     # Read NCBI rank and division csv
-    NCBIRankDivision_table = pd.read_csv(args.path_ncbi_rank_division, index_col = False)
-    NCBIRankDivision_table = NCBIRankDivision_table.drop_duplicates(subset=['TaxonID'])
+    NCBIRankDivision_table = read_ontology_table(args.path_ncbi_rank_division, unique='TaxonID')
+
+    remapping_report = RemappingReport(args.remapping_verbosity)
 
     main(args.output, args.study_id,
          allowedTerm_dict = allowedTerm_dict,
          ontology_table = ontology_table,
          ENVOEnvironmentBiomeIndex_table = ENVOEnvironmentBiomeIndex_table,
          ENVOEnvironmentMaterialIndex_table = ENVOEnvironmentMaterialIndex_table,
-         NCBIRankDivision_table = NCBIRankDivision_table)
+         NCBIRankDivision_table = NCBIRankDivision_table,
+         allowed_term_index = AllowedTermIndex(allowedTerm_dict),
+         resolution_cache = ResolutionCache(args.resolution_cache, allowedTerm_dict) if args.resolution_cache else None,
+         remapping_report = remapping_report,
+         name_index = TaxonomyNameIndex.from_dmp(args.names_dmp) if args.names_dmp else None)
+
+    if args.remapping_report:
+        remapping_report.write(args.remapping_report)
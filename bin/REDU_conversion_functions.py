@@ -3,12 +3,17 @@ import os
 import requests
 import time
 from bs4 import BeautifulSoup
-from owlready2 import get_ontology
 import owlready2
 import pandas as pd
+import numpy as np
 import tqdm
+from ncbi_lineage import classify_lineage
+from taxonomy_resolver import TaxonomyResolver
+from ontology_cache import load_ontology
 
 
+NCBI_EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+
 
 def merge_repeated_fileobservations(df):
 
@@ -67,6 +72,36 @@ def age_category(age):
         return 'Later Adulthood (>65 yrs)'
     else:
         return ''
+
+
+# bins reproduce the comparisons in age_category: (-inf, 2), [2, 8], (8, 18], (18, 45], (45, 65], (65, inf]
+AGE_CATEGORY_BINS = [-np.inf, np.nextafter(2, -np.inf), 8, 18, 45, 65, np.inf]
+AGE_CATEGORY_LABELS = ['Infancy (<2 yrs)',
+                       'Early Childhood (2 yrs < x <=8 yrs)',
+                       'Adolescence (8 yrs < x <= 18 yrs)',
+                       'Early Adulthood (18 yrs < x <= 45 yrs)',
+                       'Middle Adulthood (45 yrs < x <= 65 yrs)',
+                       'Later Adulthood (>65 yrs)']
+
+def age_category_series(ages):
+    """
+    Vectorized age_category. Only the unique values are parsed with float(), so the result is identical
+    to applying age_category to every element, including the '' for values that cannot be parsed.
+    """
+    codes, uniques = pd.factorize(pd.Series(ages, dtype=object))
+
+    def _to_float(age):
+        try:
+            return float(age)
+        except (ValueError, TypeError):
+            return np.nan
+
+    parsed_uniques = np.array([_to_float(age) for age in uniques] + [np.nan], dtype=float)
+    # factorize marks missing values with -1, which picks the trailing NaN
+    parsed = parsed_uniques[codes]
+
+    categories = pd.cut(parsed, bins=AGE_CATEGORY_BINS, labels=AGE_CATEGORY_LABELS, include_lowest=True)
+    return np.asarray(pd.Series(categories).astype(object).fillna(''), dtype=object)
     
 
 def get_taxonomic_name_from_id(ncbi_id):
@@ -107,13 +142,12 @@ def get_taxonomic_name_from_id(ncbi_id):
 
 def get_taxonomy_info(ncbi_id, cell_culture_key1 = '', cell_culture_key2 = ''):
     if ncbi_id is not None and ncbi_id != "NA":
-        cell_culture_key_words = ["cell", "media", "culture"]
         try:
             #try to get taxa via API
             for attempt in range(3):
                 try:
                     response = requests.get(
-                        f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=taxonomy&id={ncbi_id}")
+                        f"{NCBI_EUTILS_URL}/efetch.fcgi?db=taxonomy&id={ncbi_id}")
                     soup = BeautifulSoup(response.text, "xml")
                     classification = [s.lower() for s in soup.find("Taxon").find("Lineage").text.split("; ")]
                     break
@@ -126,47 +160,7 @@ def get_taxonomy_info(ncbi_id, cell_culture_key1 = '', cell_culture_key2 = ''):
                 # If the loop completes without breaking, raise an exception
                 raise Exception("All retries failed. Unable to fetch taxonomy data.")
 
-            SampleType = None
-            SampleTypeSub1 = None
-
-            if "viridiplantae" in classification:
-                SampleType = "plant"
-                SampleTypeSub1 = "plant_NOS"
-                if "Algae" in classification or 'rhodophyta' in classification or "phaeophyceae" in classification:
-                    SampleType = "algae"
-                if "chlorophyta" in classification or "microalgae" in classification or "microalga" in classification:
-                    SampleType = "microalgae"
-                if "streptophyta" in classification:
-                    SampleTypeSub1 = "plant_angiospermae"
-                if "cyanobacteria" in classification:
-                    SampleTypeSub1 = "marine_cyanobacteria_insitu"
-                if "bacillariophyta" in classification:
-                    SampleTypeSub1 = "marine_diatom"
-            elif "metazoa" in classification:
-                SampleType = "animal"
-                if "mammalia" in classification and any(
-                        word in cell_culture_key1.lower() for word in cell_culture_key_words) or any(
-                        word in cell_culture_key2.lower() for word in cell_culture_key_words):
-                    SampleType = "culture_mammalian"
-                    SampleTypeSub1 = "culture_mammalian"
-                if "amphibia" in classification:
-                    if "Caudata" in classification or "urodela" in classification or "echinodermata" in classification:
-                        SampleTypeSub1 = "salamander"
-                    else:
-                        SampleTypeSub1 = "frog"
-                if "insecta" in classification:
-                    SampleTypeSub1 = "insect"
-                if "porifera" in classification or "mollusca" in classification:
-                    SampleTypeSub1 = "marine_invertebrates"
-                if "cnidaria" in classification:
-                    SampleTypeSub1 = "marine_coral"
-            elif "fungi" in classification:
-                SampleType = "culture_fungal"
-                SampleTypeSub1 = "culture_fungal"
-            elif "bacteria" in classification:
-                SampleType = "culture_bacterial"
-                SampleTypeSub1 = "culture_bacterial"
-            return [SampleType, SampleTypeSub1]
+            return classify_lineage(classification, cell_culture_key1, cell_culture_key2)
         except Exception:
             return [None, None]
     else:
@@ -175,40 +169,16 @@ def get_taxonomy_info(ncbi_id, cell_culture_key1 = '', cell_culture_key2 = ''):
 def get_taxonomy_id_from_name__allowedTerms(organism_name, **kwargs):
 
     allowedTerm_dict = kwargs['allowedTerm_dict']
-    taxonomy_data = allowedTerm_dict["NCBITaxonomy"]["allowed_values"]
+    taxonomy_resolver = TaxonomyResolver.cached(allowedTerm_dict["NCBITaxonomy"]["allowed_values"])
     
     ncbi_id_input = ''
     if 'ncbi_id' in kwargs.keys():
         ncbi_id_input = str(kwargs['ncbi_id'].pop())
 
-    try:
-        ncbi_id_numeric = int(ncbi_id_input)
-    except ValueError:
-        # ncbi_id_input cannot be made numeric, return None or an appropriate error message
-        ncbi_id_input = ''
-
-    
-    if ncbi_id_input != '':
-        ncbi_id_input = str(ncbi_id_input)
-        for entry in taxonomy_data:
-            parts = entry.split('|')
-            if len(parts) == 2:
-                ncbi_id, name = parts
-                if str(ncbi_id) == ncbi_id_input:
-                    return ncbi_id + '|' + str(name)
-            else:
-                continue
-
-
-    organism_name = str(organism_name)
-    for entry in taxonomy_data:
-        parts = entry.split('|')
-        if len(parts) == 2:
-            ncbi_id, name = parts
-            if name.lower() == organism_name.lower():
-                return ncbi_id + '|' + str(name)
-        else:
-            continue
+    # by the ID, then the name, then synonyms, common names, ... of names.dmp
+    hit = taxonomy_resolver.match(organism_name, ncbi_id_input, kwargs.get('name_index'))
+    if hit is not None:
+        return hit
 
     return None
     req_ncbi_name = get_taxonomy_id_from_name(organism_name)
@@ -221,6 +191,16 @@ def get_taxonomy_id_from_name__allowedTerms(organism_name, **kwargs):
     return None
 
 
+def get_taxonomy_ids_from_names__allowedTerms(organism_names, **kwargs):
+    """
+    get_taxonomy_id_from_name__allowedTerms for a whole column: {organism name: 'ID|Name' or None} for the unique
+    organism_names, resolved together by name and, if given, by kwargs['name_index'].
+    """
+    taxonomy_resolver = TaxonomyResolver.cached(kwargs['allowedTerm_dict']["NCBITaxonomy"]["allowed_values"])
+    organism_names = pd.unique(pd.Series(organism_names, dtype=object))
+    return dict(zip(organism_names, taxonomy_resolver.resolve(organism_names, kwargs.get('name_index'))))
+
+
 def get_taxonomy_id_from_name(species_name, retries=3):
     if species_name is None or species_name in ["NA", "N/A"]:
         return None
@@ -229,7 +209,7 @@ def get_taxonomy_id_from_name(species_name, retries=3):
     while attempts < retries:
         try:
             response = requests.get(
-                f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=taxonomy&term={species_name}&retmode=xml"
+                f"{NCBI_EUTILS_URL}/esearch.fcgi?db=taxonomy&term={species_name}&retmode=xml"
             )
 
             if response.status_code == 200:
@@ -260,7 +240,7 @@ def get_taxonomy_id_from_name(species_name, retries=3):
 
 
 def get_uberon_table(owl_path):
-    onto = get_ontology(owl_path).load()
+    onto = load_ontology(owl_path)
 
     multi_cellular = onto.search(iri="http://purl.obolibrary.org/obo/UBERON_0010000")[0]
     organ = onto.search(iri="http://purl.obolibrary.org/obo/UBERON_0000062")[0]
@@ -271,7 +251,8 @@ def get_uberon_table(owl_path):
     downstream_classes_bodily_fluid = set(bodily_fluid.descendants())
             
     data = []
-    for cls in onto.classes():
+    # by IRI, so the rows are the same with either OWL reader
+    for cls in sorted(onto.classes(), key=lambda cls: cls.iri):
         label = cls.label.first() if cls.label else None
         synonyms = [synonym for synonym in cls.hasExactSynonym] if hasattr(cls, 'hasExactSynonym') else []
 
@@ -302,7 +283,7 @@ def get_uberon_table(owl_path):
 
 
 def get_ontology_table(owl_path, ont_prefix, rm_synonym_info=False, descendant_node=None, index_column_name = 'UBERONOntologyIndex'):
-    onto = get_ontology(owl_path).load()
+    onto = load_ontology(owl_path)
 
     filter_class = None
     descendants = set()
@@ -316,7 +297,8 @@ def get_ontology_table(owl_path, ont_prefix, rm_synonym_info=False, descendant_n
             descendants.discard(filter_class)
 
     data = []
-    for cls in tqdm.tqdm(onto.classes(), desc="Processing classes"):
+    # by IRI, so the rows are the same with either OWL reader
+    for cls in tqdm.tqdm(sorted(onto.classes(), key=lambda cls: cls.iri), desc="Processing classes"):
         # Skip the class if it is the filter_class itself and descendant_node is provided
         if descendant_node and cls == filter_class:
             continue
@@ -0,0 +1,89 @@
+import pandas as pd
+
+from mass_spectrometer_resolver import MassSpectrometerResolver
+from taxonomy_resolver import TaxonomyResolver
+
+
+#allowed_values markers that stand for a rule instead of a vocabulary
+SPECIAL_ALLOWED_VALUES = ['00', 'numeric', 'numeric|numeric']
+
+
+class AllowedTermIndex:
+    """
+    Lookups over allowed_terms.json built once per process, those of a column the first time it is used.
+
+    Args:
+    allowedTerm_dict: The dictionary loaded from allowed_terms.json.
+    """
+
+    def __init__(self, allowedTerm_dict):
+        self.allowedTerm_dict = allowedTerm_dict
+        self._normalized = {}
+        self._categories = {}
+        self._ms = None
+
+    def allowed_values(self, key):
+        return self.allowedTerm_dict[key]['allowed_values']
+
+    def missing_value(self, key):
+        return self.allowedTerm_dict[key]['missing']
+
+    def normalized_map(self, key):
+        """Map of allowed term with spaces removed -> allowed term. The first allowed term wins, as with the former linear scan."""
+        if key not in self._normalized:
+            normalized = {}
+            for allowed in self.allowed_values(key):
+                normalized.setdefault(allowed.replace(" ", ""), allowed)
+            self._normalized[key] = normalized
+        return self._normalized[key]
+
+    def match_normalized(self, key, observed_value, default=None):
+        return self.normalized_map(key).get(str(observed_value).replace(" ", ""), default)
+
+    def is_vocabulary(self, key):
+        """
+        True for columns holding a controlled vocabulary, i.e. not filename, not one of the SPECIAL_ALLOWED_VALUES
+        rules and with allowed values (generated columns like UBERONOntologyIndex have none).
+        """
+        if key not in self.allowedTerm_dict or key == 'filename':
+            return False
+        allowed_values = self.allowed_values(key)
+        return len(allowed_values) > 0 and allowed_values[0] not in SPECIAL_ALLOWED_VALUES
+
+    def categories(self, key):
+        """
+        pd.Index of the allowed terms that validate to themselves, then the missing value. '' and terms that
+        normalize like an earlier term are left out.
+        """
+        if key not in self._categories:
+            categories = [allowed for allowed in self.normalized_map(key).values() if allowed != '']
+            if self.missing_value(key) not in categories:
+                categories.append(self.missing_value(key))
+            self._categories[key] = pd.Index(categories, dtype=object)
+        return self._categories[key]
+
+    def categorical_dtype(self, key, observed=()):
+        """
+        CategoricalDtype for a REDU column: the categories of the column followed by any other value in the
+        series of observed, so that converting those series is lossless.
+        """
+        categories = self.categories(key)
+        for values in observed:
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.categories
+            else:
+                values = pd.Index(values.dropna().unique())
+            categories = categories.append(values[~values.isin(categories)])
+        return pd.CategoricalDtype(categories)
+
+    @property
+    def taxonomy(self):
+        """TaxonomyResolver over the allowed NCBITaxonomy terms, shared with the converters of this process."""
+        return TaxonomyResolver.cached(self.allowed_values('NCBITaxonomy'))
+
+    @property
+    def mass_spectrometers(self):
+        """MassSpectrometerResolver over the allowed MassSpectrometer terms."""
+        if self._ms is None:
+            self._ms = MassSpectrometerResolver(self.allowed_values('MassSpectrometer'))
+        return self._ms
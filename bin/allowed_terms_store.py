@@ -0,0 +1,191 @@
+import json
+import os
+import sqlite3
+from collections.abc import Sequence
+
+
+#bump when the layout of the store changes, older stores are then ignored
+STORE_VERSION = 2
+
+#vocabularies up to this size are loaded with the columns, larger ones only when they are used
+EAGER_VOCABULARY_SIZE = 10_000
+
+#stay below the host parameter limit of older SQLite builds
+_QUERY_CHUNK_SIZE = 500
+
+
+def allowed_terms_store_path(json_path):
+    """The store written next to an allowed terms json: allowed_terms.json -> allowed_terms.sqlite."""
+    return os.path.splitext(json_path)[0] + '.sqlite'
+
+
+def write_allowed_terms_store(allowedTerm_dict, path, source_json=None):
+    """Writes allowedTerm_dict to the SQLite store of load_allowed_terms, tied to source_json by its size and mtime."""
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        connection.execute('CREATE TABLE columns (position INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, spec TEXT NOT NULL, n_values INTEGER NOT NULL)')
+        connection.execute('CREATE TABLE allowed_values (column_position INTEGER NOT NULL, position INTEGER NOT NULL, value TEXT NOT NULL, '
+                           'PRIMARY KEY (column_position, position)) WITHOUT ROWID')
+
+        for column_position, (name, value) in enumerate(allowedTerm_dict.items()):
+            allowed_values = value.get('allowed_values')
+            # anything but a list of strings stays in the json of the column
+            in_table = isinstance(allowed_values, list) and all(isinstance(v, str) for v in allowed_values)
+            spec = {k: (None if k == 'allowed_values' and in_table else v) for k, v in value.items()}
+            connection.execute('INSERT INTO columns VALUES (?, ?, ?, ?)',
+                               (column_position, name, json.dumps(spec, ensure_ascii=False), len(allowed_values) if in_table else -1))
+            if in_table:
+                connection.executemany('INSERT INTO allowed_values VALUES (?, ?, ?)',
+                                       ((column_position, i, v) for i, v in enumerate(allowed_values)))
+
+        connection.execute('CREATE INDEX allowed_values_by_value ON allowed_values (column_position, value)')
+        meta = {'version': str(STORE_VERSION), 'source_stat': _source_stat(source_json) if source_json else ''}
+        connection.executemany('INSERT INTO meta VALUES (?, ?)', meta.items())
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class LazyVocabulary(Sequence):
+    """
+    The allowed values of one column of an allowed terms store. Membership tests and lookups query the store,
+    iterating loads all values once.
+
+    Args:
+    path: The store.
+    column_position: The position of the column in the store.
+    n_values: The number of allowed values.
+    """
+
+    def __init__(self, path, column_position, n_values):
+        self.path = path
+        self.column_position = column_position
+        self.n_values = n_values
+        self._values = None
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            self._pid = os.getpid()
+        return self._connection
+
+    def tolist(self):
+        if self._values is None:
+            rows = self._connect().execute('SELECT value FROM allowed_values WHERE column_position = ? ORDER BY position',
+                                           (self.column_position,))
+            self._values = [row[0] for row in rows]
+        return self._values
+
+    def __len__(self):
+        return self.n_values
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, index):
+        if self._values is not None or isinstance(index, slice):
+            return self.tolist()[index]
+        if index < 0:
+            index += self.n_values
+        if not 0 <= index < self.n_values:
+            raise IndexError('allowed value index out of range')
+        row = self._connect().execute('SELECT value FROM allowed_values WHERE column_position = ? AND position = ?',
+                                      (self.column_position, index)).fetchone()
+        return row[0]
+
+    def __contains__(self, value):
+        if self._values is not None:
+            return value in self._values
+        if not isinstance(value, str):
+            return False
+        row = self._connect().execute('SELECT 1 FROM allowed_values WHERE column_position = ? AND value = ? LIMIT 1',
+                                      (self.column_position, value)).fetchone()
+        return row is not None
+
+    def lookup(self, values):
+        """The set of values that are allowed, one indexed query per chunk of values."""
+        values = list({v for v in values if isinstance(v, str)})
+        found = set()
+        for start in range(0, len(values), _QUERY_CHUNK_SIZE):
+            chunk = values[start:start + _QUERY_CHUNK_SIZE]
+            rows = self._connect().execute(f"SELECT value FROM allowed_values WHERE column_position = ? "
+                                           f"AND value IN ({','.join('?' * len(chunk))})", [self.column_position] + chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def __add__(self, other):
+        return self.tolist() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.tolist()
+
+    def __eq__(self, other):
+        if isinstance(other, LazyVocabulary):
+            other = other.tolist()
+        return isinstance(other, list) and self.tolist() == other
+
+    def __repr__(self):
+        return f'LazyVocabulary({self.path!r}, column {self.column_position}, {self.n_values} values)'
+
+
+def read_allowed_terms_store(path, eager_vocabulary_size=EAGER_VOCABULARY_SIZE):
+    """
+    allowedTerm_dict from a store: the columns in their original order with all their entries. allowed_values
+    is a list for vocabularies of up to eager_vocabulary_size values and a LazyVocabulary for larger ones.
+    """
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        allowedTerm_dict = {}
+        for column_position, name, spec, n_values in connection.execute('SELECT position, name, spec, n_values FROM columns ORDER BY position'):
+            value = json.loads(spec)
+            if n_values > eager_vocabulary_size:
+                value['allowed_values'] = LazyVocabulary(path, column_position, n_values)
+            elif n_values >= 0:
+                rows = connection.execute('SELECT value FROM allowed_values WHERE column_position = ? ORDER BY position', (column_position,))
+                value['allowed_values'] = [row[0] for row in rows]
+            allowedTerm_dict[name] = value
+        return allowedTerm_dict
+    finally:
+        connection.close()
+
+
+def _source_stat(json_path):
+    stat = os.stat(json_path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def _store_matches(store_path, json_path):
+    try:
+        connection = sqlite3.connect(f'file:{store_path}?mode=ro', uri=True)
+        try:
+            meta = dict(connection.execute('SELECT key, value FROM meta'))
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return False
+    return meta.get('version') == str(STORE_VERSION) and meta.get('source_stat') == _source_stat(json_path)
+
+
+def load_allowed_terms(json_path, lazy_vocabularies=False):
+    """
+    allowedTerm_dict of an allowed terms json, from its store with lazy_vocabularies. Otherwise the json is loaded,
+    which is faster for the consumers that read every vocabulary anyway.
+    """
+    store_path = allowed_terms_store_path(json_path)
+    if lazy_vocabularies and os.path.exists(store_path) and _store_matches(store_path, json_path):
+        print(f'Reading allowed terms from {store_path}')
+        return read_allowed_terms_store(store_path)
+
+    with open(json_path, 'r') as json_file:
+        return json.load(json_file)
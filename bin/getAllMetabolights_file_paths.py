@@ -6,6 +6,7 @@ import pandas as pd
 import argparse 
 import time
 import os 
+from path_normalization import truncate_d_folders
 
 def safe_api_request(url, retries=3, expected_codes={200}):
 
@@ -90,13 +91,6 @@ def get_all_files(study_id, headers):
 def create_usi(row):
     return f"mzspec:{row['study_id']}:{row['file_path']}"
 
-def process_filename(filename):
-    path_parts = filename.split('/')
-    for part in path_parts:
-        if part.endswith('.d'):
-            return '/'.join(path_parts[:path_parts.index(part)+1])
-    return filename
-            
 def _get_existing_datasets(path_to_file):
     try:
         existing_datasets = pd.read_csv(path_to_file, sep="\t")
@@ -141,7 +135,7 @@ if __name__ == "__main__":
     files_df = pd.DataFrame(data)
 
     #add  USI
-    files_df['file_path'] = files_df['file_path'].apply(process_filename)
+    files_df['file_path'] = truncate_d_folders(files_df['file_path'])
     files_df = files_df.drop_duplicates(keep='first')
     files_df['USI'] = files_df.apply(create_usi, axis=1)
 
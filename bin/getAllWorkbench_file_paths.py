@@ -4,14 +4,9 @@ import requests
 import argparse
 import tqdm
 from urllib.parse import urlparse, parse_qs
+from path_normalization import truncate_d_folders, clean_macosx_paths
 
 
-def clean_mac_path(path):
-    if "__MACOSX/" in path and '/._' in path:
-        # Remove the __MACOSX part and the ._ prefix from the filename
-        return path.replace("__MACOSX/", "").replace("/._", "/")
-    return path
-
 # Define a function to extract the first folder with an extension in order to not get the individual files in e.g. agilent "files"
 def extract_first_folder_with_extension(url):
     filepath = parse_qs(urlparse(url).query).get('F', [None])[0]
@@ -58,14 +53,6 @@ def _get_metabolomicsworkbench_filepaths(study_id):
 
     return workbench_df
 
-def process_filename(filename):
-    path_parts = filename.split('/')
-    for part in path_parts:
-        print(part)
-        if part.endswith('.d'):
-            return '/'.join(path_parts[:path_parts.index(part)+1])
-    return filename
-
 def _get_existing_datasets(path_to_file):
     try:
         existing_datasets = pd.read_csv(path_to_file, sep="\t")
@@ -118,11 +105,11 @@ if __name__ == '__main__':
         result_df = _get_metabolomicsworkbench_filepaths(study_id=args.study_id)
 
     result_df['study_id'] = result_df['STUDY_ID']
-    result_df['file_path'] = result_df['FILENAME'].apply(process_filename)
-    result_df['file_path'] = result_df['file_path'].apply(clean_mac_path)
+    result_df['file_path'] = truncate_d_folders(result_df['FILENAME'])
+    result_df['file_path'] = clean_macosx_paths(result_df['file_path'])
     
-    result_df['USI'] = result_df['USI_file'].apply(process_filename)
-    result_df['USI'] = result_df['USI'].apply(clean_mac_path)
+    result_df['USI'] = truncate_d_folders(result_df['USI_file'])
+    result_df['USI'] = clean_macosx_paths(result_df['USI'])
 
     result_df = result_df.drop_duplicates(keep='first')
 
@@ -9,6 +9,7 @@ from io import StringIO
 from subprocess import PIPE, run
 import json
 from pathlib import Path
+from allowed_terms_store import load_allowed_terms
 
 ccms_peak_link = "https://datasetcache.gnps2.org/datasette/datasette/database/uniquemri.csv?_sort=usi&dataset__exact=" # MSV000081468&filepath__endswith=%25.mz%25ML&_size=max"
 gnps_column_names_added = ['USI']
@@ -176,8 +177,8 @@ def main():
         passed_file_names = df['Name'].tolist()
 
     
-    with open(args.path_allowed_terms_json, 'r') as file:
-        allowed_terms_json = json.load(file)
+    # only the column names are used, the vocabularies are not read
+    allowed_terms_json = load_allowed_terms(args.path_allowed_terms_json, lazy_vocabularies=True)
 
     gnps_column_names = ["ATTRIBUTE_DatasetAccession"] + list(set(allowed_terms_json.keys()) - {'USI', 'MassiveID'})
 
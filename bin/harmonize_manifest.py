@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import shutil
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def sha256_files(paths):
+    """One hash over several files, in the order given."""
+    sha256 = hashlib.sha256()
+    for path in paths:
+        sha256.update(sha256_file(path).encode('ascii'))
+    return sha256.hexdigest()
+
+
+def code_sha256(paths):
+    """One hash over the source files of the harmonizer, in the order of their file names."""
+    return sha256_files(sorted(paths, key=os.path.basename))
+
+
+#the hashes an output is reused for, all of them have to be unchanged
+REUSE_KEYS = ['input_sha256', 'allowed_terms_sha256', 'ontology_sha256', 'code_sha256']
+
+
+def manifest_entry(file_path, allowed_terms_sha256, ontology_sha256, code_sha256):
+    """
+    Manifest entry of one input file. 'output' is the name of the harmonized file in the output folder,
+    it is set once the file is processed and stays None if the table had no rows left. 'remapping' holds the
+    records of its RemappingReport, so reusing the output also reuses its remapped values.
+    """
+    return {'input_sha256': sha256_file(file_path),
+            'allowed_terms_sha256': allowed_terms_sha256,
+            'ontology_sha256': ontology_sha256,
+            'code_sha256': code_sha256,
+            'output': None,
+            'remapping': []}
+
+
+def load_manifest(path):
+    """Returns {input file name: entry} of a manifest written by write_manifest, or {} if there is none."""
+    if path is None or not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)['files']
+
+
+def write_manifest(path, entries):
+    with open(path, 'w') as f:
+        json.dump({'files': entries}, f, indent=4, sort_keys=True)
+
+
+def reuse_previous_output(previous_entry, entry, previous_output_folder, output_folder):
+    """
+    Copies the previous harmonized output of a file to output_folder if the input, the allowed terms, the
+    ontology tables and the harmonizer code are all unchanged. Returns True if the previous result was reused.
+    """
+    if previous_entry is None or previous_output_folder is None or 'remapping' not in previous_entry:
+        return False
+    for key in REUSE_KEYS:
+        if previous_entry.get(key) != entry[key]:
+            return False
+
+    if previous_entry.get('output') is not None:
+        previous_output = os.path.join(previous_output_folder, previous_entry['output'])
+        if not os.path.isfile(previous_output):
+            return False
+        shutil.copyfile(previous_output, os.path.join(output_folder, previous_entry['output']))
+
+    entry['output'] = previous_entry.get('output')
+    entry['remapping'] = previous_entry['remapping']
+    return True
@@ -0,0 +1,55 @@
+import re
+
+import pandas as pd
+
+
+_NON_ALPHANUMERIC = re.compile(r'[^a-z0-9]')
+
+
+def normalize_instrument_name(name):
+    """Lower-cased name with everything but letters and digits removed, e.g. 'Q Exactive HF-X' -> 'qexactivehfx'."""
+    return _NON_ALPHANUMERIC.sub('', str(name).lower())
+
+
+class MassSpectrometerResolver:
+    """
+    Lookups of the allowed MassSpectrometer terms ('Name|Accession') by term, name, accession and normalized name.
+    If two terms share a key, resolve takes the first one and match_names/match_normalized_names the last one.
+
+    Args:
+    allowed_values: The allowed MassSpectrometer terms.
+    """
+
+    def __init__(self, allowed_values):
+        self.terms = set(allowed_values)
+        self.by_name = {}
+        self.by_accession = {}
+        self.by_normalized_name = {}
+        self.by_name_last = {}
+        for term in allowed_values:
+            name = term.split("|", 1)[0]
+            self.by_name.setdefault(name, term)
+            self.by_name_last[name] = term
+            self.by_normalized_name[normalize_instrument_name(name)] = term
+            if "|" in term:
+                self.by_accession.setdefault(term.split("|", 1)[1], term)
+
+    def resolve(self, observed_value, default=None):
+        """'Name|Accession' -> allowed term: the exact term, then the same name, then the same accession."""
+        if observed_value in self.terms:
+            return observed_value
+        if "|" not in str(observed_value):
+            return default
+        name, accession = str(observed_value).split("|", 1)
+        hit = self.by_name.get(name)
+        if hit is None:
+            hit = self.by_accession.get(accession, default)
+        return hit
+
+    def match_names(self, names):
+        """Series of instrument names -> allowed terms with that name, NaN where there is none."""
+        return pd.Series(names).map(self.by_name_last)
+
+    def match_normalized_names(self, names):
+        """Series of instrument names -> allowed terms with the same normalized name, NaN where there is none."""
+        return pd.Series(names).map(normalize_instrument_name).map(self.by_normalized_name)
@@ -1,6 +1,8 @@
 import pandas as pd
 import argparse
-import json
+from collections import defaultdict
+from allowed_term_index import AllowedTermIndex
+from allowed_terms_store import load_allowed_terms
 
 def main():
     # parsing arguments
@@ -15,16 +17,20 @@ def main():
     args = parser.parse_args()
 
     # read allowed terms
-    with open(args.path_to_allowed_term_json, 'r') as f:
-        allowed_terms = json.load(f)
+    allowed_terms = load_allowed_terms(args.path_to_allowed_term_json)
 
     columns_to_use = list(allowed_terms.keys())
 
     # replace value "MassiveID" with "ATTRIBUTE_DatasetAccession"
     columns_to_use = [col.replace("MassiveID", "ATTRIBUTE_DatasetAccession") for col in columns_to_use]
 
+    # controlled vocabulary columns are read as categoricals, this keeps the merged table small
+    allowed_term_index = AllowedTermIndex(allowed_terms)
+    vocabulary_columns = [col for col in columns_to_use if allowed_term_index.is_vocabulary(col)]
+    vocabulary_dtypes = {col: 'category' for col in vocabulary_columns}
+
     # read GNPS metadata
-    gnps_df = pd.read_csv(args.gnps_metadata, sep='\t')
+    gnps_df = pd.read_csv(args.gnps_metadata, sep='\t', dtype=vocabulary_dtypes)
     gnps_df["DataSource"] = "GNPS"
 
     #drop duplicated files
@@ -32,23 +38,29 @@ def main():
     gnps_df = gnps_df[~duplicates]
 
     # read Workbench metadata
-    mwb_df = pd.read_csv(args.mwb_metadata, sep='\t', dtype=str)
+    mwb_df = pd.read_csv(args.mwb_metadata, sep='\t', dtype=defaultdict(lambda: str, vocabulary_dtypes))
     mwb_df["DataSource"] = "Workbench"
 
     # read MetaboLights metadata
-    metabo_df = pd.read_csv(args.metabolights_metadata, sep='\t', dtype=str)
+    metabo_df = pd.read_csv(args.metabolights_metadata, sep='\t', dtype=defaultdict(lambda: str, vocabulary_dtypes))
     metabo_df["DataSource"] = "MetaboLights"
 
     # read NORMAN metadata
-    norman_df = pd.read_csv(args.norman_metadata, sep='\t', dtype=str)
+    norman_df = pd.read_csv(args.norman_metadata, sep='\t', dtype=defaultdict(lambda: str, vocabulary_dtypes))
     norman_df["DataSource"] = "NORMAN"
 
     # read MASST metadata
-    masst_df = pd.read_csv(args.masst_metadata, sep='\t', dtype=str)
+    masst_df = pd.read_csv(args.masst_metadata, sep='\t', dtype=defaultdict(lambda: str, vocabulary_dtypes))
     masst_df["DataSource"] = "GNPS"
 
+    # give every source the same categories per column (allowed terms first, then anything else observed), so concat keeps the categoricals
+    all_dfs = [gnps_df, mwb_df, metabo_df, masst_df, norman_df]
+    shared_dtypes = {col: allowed_term_index.categorical_dtype(col, observed=[df[col] for df in all_dfs if col in df.columns])
+                     for col in vocabulary_columns}
+    all_dfs = [df.astype({col: dtype for col, dtype in shared_dtypes.items() if col in df.columns}) for df in all_dfs]
+
     # merge GNPS and ReDU metadata
-    merged_df = pd.concat([gnps_df, mwb_df, metabo_df, masst_df, norman_df], ignore_index=True)
+    merged_df = pd.concat(all_dfs, ignore_index=True)
 
     # include only columns from gnps
     merged_df = merged_df[columns_to_use]
@@ -1,13 +1,13 @@
-import ete3
 import pandas as pd
 from tqdm import tqdm
 import re
+from ncbi_lineage import NCBILineage, DESIRED_RANKS
 
 
 ### Credit to Michael Strobel (adapted)
 
 def get_lineage_as_dict(ncbi, tax_ids, pbar=True):
-    desired_ranks = ['superkingdom','kingdom','phylum','class','order','family','genus','species']
+    desired_ranks = DESIRED_RANKS
     results = {}
 
     it = tqdm(tax_ids, desc="Fetching lineage for tax_ids") if pbar else tax_ids
@@ -28,12 +28,15 @@ def get_lineage_as_dict(ncbi, tax_ids, pbar=True):
     return df
 
 
-def annotate_taxonomy(df: pd.DataFrame) -> pd.DataFrame:
+def annotate_taxonomy(df: pd.DataFrame, lineage: NCBILineage = None) -> pd.DataFrame:
+    """
+    Adds the NCBISuperkingdom ... NCBISpecies columns for the taxid in NCBITaxonomy, from lineage (an NCBILineage)
+    if given, otherwise from the database of ete3 NCBITaxa.
+    """
     if 'NCBITaxonomy' not in df.columns:
         return df
 
     print("annotate_taxonomy got a totoal of", len(df), "rows", flush=True)
-    ncbi = ete3.NCBITaxa()
 
     _df = df.copy()
     _df.dropna(subset=['NCBITaxonomy'], inplace=True)
@@ -51,7 +54,11 @@ def annotate_taxonomy(df: pd.DataFrame) -> pd.DataFrame:
     )
     print(f"Found {len(tax_ids)} unique NCBI Taxonomy IDs", flush=True)
 
-    lineage_df = get_lineage_as_dict(ncbi, tax_ids, pbar=True)
+    if lineage is not None:
+        lineage_df = lineage.lineage_table(tax_ids)
+    else:
+        import ete3
+        lineage_df = get_lineage_as_dict(ete3.NCBITaxa(), tax_ids, pbar=True)
 
     # Map ete3 rank → pretty column name
     rank_to_col = {
@@ -117,13 +124,20 @@ def update_sampletype(df):
 
 if __name__ == "__main__":
     import argparse
-    parser = argparse.ArgumentParser(description="Annotate NCBITaxonomy with taxonomic classifications using ete3.")
+    parser = argparse.ArgumentParser(description="Annotate NCBITaxonomy with taxonomic classifications from the NCBI taxonomy dump, or using ete3.")
     parser.add_argument("input_tsv", type=str)
     parser.add_argument("output_tsv", type=str)
+    parser.add_argument("--nodes_dmp", type=str, help="nodes.dmp of the NCBI taxonomy dump, with --names_dmp no ete3 database is needed")
+    parser.add_argument("--names_dmp", type=str, help="names.dmp of the NCBI taxonomy dump")
+    parser.add_argument("--merged_dmp", type=str, help="merged.dmp of the NCBI taxonomy dump, to resolve merged taxids (optional)")
     args = parser.parse_args()
 
+    lineage = None
+    if args.nodes_dmp and args.names_dmp:
+        lineage = NCBILineage.from_dmp(args.nodes_dmp, args.names_dmp, args.merged_dmp)
+
     df = pd.read_csv(args.input_tsv, sep='\t', dtype={'NCBITaxonomy': 'string'}, low_memory=False)
-    annotated_df = annotate_taxonomy(df)
+    annotated_df = annotate_taxonomy(df, lineage)
     annotated_df = update_sampletype(annotated_df)
 
     try:
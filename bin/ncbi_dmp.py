@@ -0,0 +1,65 @@
+import csv
+
+import pandas as pd
+
+
+#field positions of the .dmp files of the NCBI taxonomy dump (https://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdump_readme.txt)
+NAMES_DMP_FIELDS = ['tax_id', 'name_txt', 'unique_name', 'name_class']
+NODES_DMP_FIELDS = ['tax_id', 'parent_tax_id', 'rank', 'embl_code', 'division_id', 'inherited_div_flag',
+                    'genetic_code_id', 'inherited_GC_flag', 'mitochondrial_genetic_code_id', 'inherited_MGC_flag',
+                    'GenBank_hidden_flag', 'hidden_subtree_root_flag', 'comments']
+DIVISION_DMP_FIELDS = ['division_id', 'division_cd', 'division_name', 'comments']
+
+#lines per chunk when rows are filtered while reading
+DMP_CHUNKSIZE = 1_000_000
+
+
+def read_dmp(path, columns, names, dtype=None, filters=None, chunksize=DMP_CHUNKSIZE):
+    """
+    Reads fields of an NCBI taxonomy .dmp file ('\\t|\\t' separated) with the C parser of pandas.
+
+    Args:
+    path: The .dmp file.
+    columns: The field positions to read, e.g. [0, 1, 3] of names.dmp for taxid, name and name class.
+    names: The column names of the fields in columns.
+    dtype: Optional {column name: dtype}. Other columns are str, '' for empty fields.
+    filters: Optional {field position: allowed values}, applied chunk by chunk while reading.
+    chunksize: Lines per chunk when filtering.
+
+    Returns:
+    DataFrame with the columns names, in that order.
+    """
+    # split on a plain tab, every second field is then the '|' between two values
+    positions = [2 * c for c in columns]
+    dtypes = {2 * c: (dtype or {}).get(name, str) for c, name in zip(columns, names)}
+    filters = {2 * c: list(allowed) for c, allowed in (filters or {}).items()}
+    for position in filters:
+        dtypes.setdefault(position, str)
+    reader = pd.read_csv(path, sep='\t', header=None, usecols=list(dtypes), dtype=dtypes, quoting=csv.QUOTE_NONE,
+                         keep_default_na=False, na_filter=False, chunksize=chunksize if filters else None)
+
+    if not filters:
+        return reader[positions].set_axis(names, axis=1)
+
+    chunks = []
+    with reader:
+        for chunk in reader:
+            keep = pd.Series(True, index=chunk.index)
+            for position, allowed in filters.items():
+                keep &= chunk[position].isin(allowed)
+            chunks.append(chunk.loc[keep, positions].set_axis(names, axis=1))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_names_dmp(path, name_classes=None, columns=(0, 1, 3), names=('taxid', 'name', 'name_class')):
+    """names.dmp as taxid (int64), name and name class, only the rows of the given name_classes if any."""
+    names = list(names)
+    dtype = {'taxid': 'int64'} if 'taxid' in names else None
+    filters = {3: name_classes} if name_classes is not None else None
+    return read_dmp(path, list(columns), names, dtype=dtype, filters=filters)
+
+
+def format_taxonomy_terms(taxids, taxon_names):
+    """'ID|Name' REDU terms of the pairs in taxids and taxon_names, as a list."""
+    return (pd.Series(taxids).astype(str).reset_index(drop=True) + '|'
+            + pd.Series(taxon_names).astype(str).reset_index(drop=True)).tolist()
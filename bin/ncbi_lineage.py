@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+from ncbi_dmp import read_dmp, read_names_dmp
+
+
+DESIRED_RANKS = ['superkingdom', 'kingdom', 'phylum', 'class', 'order', 'family', 'genus', 'species']
+
+#a lineage is never deeper than this, it only guards against cycles in a broken nodes.dmp
+_MAX_LINEAGE_DEPTH = 512
+
+
+def classify_lineage(classification, cell_culture_key1='', cell_culture_key2=''):
+    """[SampleType, SampleTypeSub1] of a taxon from the lower-cased names of its ancestors."""
+    cell_culture_key_words = ["cell", "media", "culture"]
+
+    SampleType = None
+    SampleTypeSub1 = None
+
+    if "viridiplantae" in classification:
+        SampleType = "plant"
+        SampleTypeSub1 = "plant_NOS"
+        if "Algae" in classification or 'rhodophyta' in classification or "phaeophyceae" in classification:
+            SampleType = "algae"
+        if "chlorophyta" in classification or "microalgae" in classification or "microalga" in classification:
+            SampleType = "microalgae"
+        if "streptophyta" in classification:
+            SampleTypeSub1 = "plant_angiospermae"
+        if "cyanobacteria" in classification:
+            SampleTypeSub1 = "marine_cyanobacteria_insitu"
+        if "bacillariophyta" in classification:
+            SampleTypeSub1 = "marine_diatom"
+    elif "metazoa" in classification:
+        SampleType = "animal"
+        if "mammalia" in classification and any(
+                word in cell_culture_key1.lower() for word in cell_culture_key_words) or any(
+                word in cell_culture_key2.lower() for word in cell_culture_key_words):
+            SampleType = "culture_mammalian"
+            SampleTypeSub1 = "culture_mammalian"
+        if "amphibia" in classification:
+            if "Caudata" in classification or "urodela" in classification or "echinodermata" in classification:
+                SampleTypeSub1 = "salamander"
+            else:
+                SampleTypeSub1 = "frog"
+        if "insecta" in classification:
+            SampleTypeSub1 = "insect"
+        if "porifera" in classification or "mollusca" in classification:
+            SampleTypeSub1 = "marine_invertebrates"
+        if "cnidaria" in classification:
+            SampleTypeSub1 = "marine_coral"
+    elif "fungi" in classification:
+        SampleType = "culture_fungal"
+        SampleTypeSub1 = "culture_fungal"
+    elif "bacteria" in classification:
+        SampleType = "culture_bacterial"
+        SampleTypeSub1 = "culture_bacterial"
+    return [SampleType, SampleTypeSub1]
+
+
+class NCBILineage:
+    """
+    Offline NCBI taxonomy lineages from nodes.dmp and names.dmp (data/get_data.sh), like ete3 NCBITaxa gave them.
+
+    Args:
+    parents: Array of the parent taxid per taxid, 0 for taxids that are not in the tree. The root is its own parent.
+    rank_codes: Array of the index into rank_names of the rank per taxid.
+    rank_names: The rank names.
+    scientific_names: Series of the scientific name by taxid.
+    merged: Optional dict of merged (old) taxid -> current taxid, from merged.dmp.
+    """
+
+    def __init__(self, parents, rank_codes, rank_names, scientific_names, merged=None):
+        self.parents = parents
+        self.rank_codes = rank_codes
+        self.rank_names = list(rank_names)
+        self.scientific_names = scientific_names
+        self.merged = merged or {}
+        self._classifications = {}
+
+    @classmethod
+    def from_dmp(cls, nodes_dmp, names_dmp, merged_dmp=None):
+        nodes = read_dmp(nodes_dmp, [0, 1, 2], ['taxid', 'parent', 'rank'], dtype={'taxid': 'int64', 'parent': 'int64'})
+        taxids = nodes['taxid'].to_numpy()
+        rank_codes, rank_names = pd.factorize(nodes['rank'])
+
+        parents = np.zeros(taxids.max() + 1, dtype=np.int64)
+        parents[taxids] = nodes['parent'].to_numpy()
+        codes = np.full(taxids.max() + 1, -1, dtype=np.int16)
+        codes[taxids] = rank_codes
+
+        names = read_names_dmp(names_dmp, name_classes=['scientific name'])
+        scientific_names = pd.Series(names['name'].to_numpy(), index=names['taxid'].to_numpy())
+
+        merged = None
+        if merged_dmp is not None:
+            merged_table = read_dmp(merged_dmp, [0, 1], ['old_taxid', 'new_taxid'], dtype={'old_taxid': 'int64', 'new_taxid': 'int64'})
+            merged = dict(zip(merged_table['old_taxid'].tolist(), merged_table['new_taxid'].tolist()))
+
+        return cls(parents, codes, rank_names, scientific_names, merged)
+
+    def current_taxids(self, tax_ids):
+        """tax_ids with merged taxids replaced by the taxid they were merged into."""
+        tax_ids = np.asarray(tax_ids, dtype=np.int64)
+        if self.merged:
+            tax_ids = np.array([self.merged.get(t, t) for t in tax_ids.tolist()], dtype=np.int64)
+        return tax_ids
+
+    def lineage_ids(self, tax_ids, desired_ranks=DESIRED_RANKS):
+        """
+        Returns {rank: array of the taxid of the ancestor (or the taxid itself) with that rank}, 0 where the
+        lineage has no such rank or the taxid is unknown.
+        """
+        current = self.current_taxids(tax_ids)
+        known = (current > 0) & (current < len(self.parents))
+        known[known] = self.parents[current[known]] > 0
+        current = np.where(known, current, 0)
+
+        desired_codes = {rank: self.rank_names.index(rank) for rank in desired_ranks if rank in self.rank_names}
+        found = {rank: np.zeros(len(current), dtype=np.int64) for rank in desired_ranks}
+
+        active = known
+        for _ in range(_MAX_LINEAGE_DEPTH):
+            if not active.any():
+                break
+            codes = self.rank_codes[current]
+            for rank, code in desired_codes.items():
+                hit = active & (codes == code) & (found[rank] == 0)
+                found[rank][hit] = current[hit]
+            parents = self.parents[current]
+            active = active & (parents != current)
+            current = np.where(active, parents, current)
+        return found
+
+    def lineage_table(self, tax_ids, desired_ranks=DESIRED_RANKS):
+        """
+        DataFrame with the column taxid (as str) and one column per desired rank holding the scientific name of
+        that ancestor, None where there is none. Unknown taxids have no name in any rank.
+        """
+        tax_ids = np.asarray(tax_ids, dtype=np.int64)
+        found = self.lineage_ids(tax_ids, desired_ranks)
+
+        df = pd.DataFrame({'taxid': tax_ids.astype(str)})
+        for rank in desired_ranks:
+            names = self.scientific_names.reindex(found[rank]).to_numpy(dtype=object)
+            names[(found[rank] == 0) | pd.isna(names)] = None
+            df[rank] = names
+        return df
+
+    def lineage_names(self, tax_id):
+        """
+        Scientific names of the ancestors of tax_id, from below the root down to its parent, i.e. the Lineage
+        field of its NCBI efetch record. None for an unknown taxid.
+        """
+        tax_id = self.merged.get(tax_id, tax_id)
+        if not 0 < tax_id < len(self.parents) or self.parents[tax_id] == 0:
+            return None
+
+        ancestors = []
+        current = tax_id
+        for _ in range(_MAX_LINEAGE_DEPTH):
+            parent = int(self.parents[current])
+            if parent == current:
+                break
+            ancestors.append(parent)
+            current = parent
+        # the last ancestor is the root, which is not part of the lineage
+        return [self.scientific_names.get(t, '') for t in reversed(ancestors[:-1])]
+
+    def taxonomy_info(self, ncbi_id, cell_culture_key1='', cell_culture_key2=''):
+        """
+        [SampleType, SampleTypeSub1] of a taxid with the rules of REDU_conversion_functions.get_taxonomy_info,
+        [None, None] for unknown taxids. The lineage of every taxid is looked up once and kept.
+        """
+        if ncbi_id is None or ncbi_id == "NA":
+            return [None, None]
+        try:
+            if ncbi_id not in self._classifications:
+                names = self.lineage_names(int(ncbi_id))
+                self._classifications[ncbi_id] = None if names is None else [s.lower() for s in names]
+            classification = self._classifications[ncbi_id]
+            if classification is None:
+                return [None, None]
+            return classify_lineage(classification, cell_culture_key1, cell_culture_key2)
+        except Exception:
+            return [None, None]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from ncbi_dmp import read_names_dmp
+
+
+#name classes of names.dmp, a name shared by several taxa resolves to the taxon where it has the earliest class here
+NAME_CLASS_PREFERENCE = ['scientific name', 'equivalent name', 'synonym', 'genbank common name', 'common name',
+                         'genbank acronym', 'acronym', 'blast name', 'includes', 'authority', 'misspelling',
+                         'misnomer', 'type material', 'in-part']
+
+
+def fold_names(names):
+    """Series of taxon names -> the keys of TaxonomyNameIndex: stripped and case-folded."""
+    return pd.Series(names, dtype=object).astype(str).str.strip().str.casefold()
+
+
+class TaxonomyNameIndex:
+    """
+    Offline taxon name -> taxid over every name class of names.dmp. A name of several taxa goes to the one where it
+    has the most preferred class (NAME_CLASS_PREFERENCE), then to the first one in names.dmp.
+
+    Args:
+    taxids: Series of the taxid by case-folded name.
+    name_classes: Series of the name class by case-folded name, with the same index as taxids.
+    """
+
+    def __init__(self, taxids, name_classes):
+        self.taxids = taxids
+        self.name_classes = name_classes
+
+    @classmethod
+    def from_dmp(cls, names_dmp, name_class_preference=NAME_CLASS_PREFERENCE):
+        names = read_names_dmp(names_dmp)
+        names['key'] = fold_names(names['name']).to_numpy()
+
+        preference = {name_class: i for i, name_class in enumerate(name_class_preference)}
+        order = names['name_class'].map(preference).fillna(len(preference)).to_numpy()
+        names = names.iloc[np.argsort(order, kind='stable')].drop_duplicates(subset='key')
+
+        index = pd.Index(names['key'].to_numpy(), dtype=object)
+        return cls(pd.Series(names['taxid'].to_numpy(), index=index),
+                   pd.Series(names['name_class'].to_numpy(), index=index))
+
+    def __len__(self):
+        return len(self.taxids)
+
+    def lookup(self, name):
+        """taxid of a taxon name, None if names.dmp does not have it."""
+        taxid = self.taxids.get(str(name).strip().casefold())
+        return None if taxid is None else int(taxid)
+
+    def resolve(self, names):
+        """
+        Batch lookup: DataFrame with the columns taxid (nullable Int64) and name_class for every entry of names,
+        in the same order and with the same index if names is a Series. Unknown names are NA.
+        """
+        keys = fold_names(names)
+        positions = self.taxids.index.get_indexer(keys.to_numpy())
+        found = positions >= 0
+
+        taxids = pd.array(np.where(found, self.taxids.to_numpy()[positions], 0), dtype='Int64')
+        taxids[~found] = pd.NA
+        name_classes = np.where(found, self.name_classes.to_numpy()[positions], None)
+
+        index = names.index if isinstance(names, pd.Series) else None
+        return pd.DataFrame({'taxid': taxids, 'name_class': name_classes}, index=index)
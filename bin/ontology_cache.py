@@ -0,0 +1,126 @@
+import json
+import os
+
+from owlready2 import World, get_ontology, VERSION as OWLREADY2_VERSION
+
+from harmonize_manifest import sha256_file
+from owl_stream import read_owl_stream
+
+
+#bump when the way ontologies are loaded changes, older quadstores are then ignored
+CACHE_VERSION = 1
+
+#the OntologyCache used by load_ontology, None to parse every file
+_ontology_cache = None
+
+#how load_ontology reads OWL files: 'owlready2' or 'stream' (read_owl_stream)
+OWL_READERS = ['owlready2', 'stream']
+_owl_reader = 'owlready2'
+
+
+class OntologyCache:
+    """
+    owlready2 quadstores of parsed OWL files, one world per file, found by the sha256 of the file and reused
+    while the same owlready2 version is installed.
+
+    Args:
+    folder: The folder of the quadstores, created if it does not exist.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.worlds = []
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, owl_path):
+        checksum = sha256_file(owl_path)
+        store_path = os.path.join(self.folder, checksum + '.sqlite3')
+        sidecar_path = os.path.join(self.folder, checksum + '.json')
+
+        if os.path.exists(store_path) and self._sidecar_matches(sidecar_path):
+            print(f'Reading {owl_path} from {store_path}')
+            self.hits += 1
+        else:
+            os.makedirs(self.folder, exist_ok=True)
+            temporary_path = f'{store_path}.{os.getpid()}.tmp'
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+            world = World(filename=temporary_path)
+            base_iri = world.get_ontology(owl_path).load().base_iri
+            world.save()
+            world.close()
+
+            # the quadstore first, it is only used once the sidecar exists
+            os.replace(temporary_path, store_path)
+            with open(f'{sidecar_path}.{os.getpid()}.tmp', 'w') as sidecar:
+                json.dump({'version': CACHE_VERSION, 'owlready2': OWLREADY2_VERSION, 'base_iri': base_iri}, sidecar)
+            os.replace(f'{sidecar_path}.{os.getpid()}.tmp', sidecar_path)
+            self.misses += 1
+
+        with open(sidecar_path) as sidecar:
+            base_iri = json.load(sidecar)['base_iri']
+        # not exclusive and committed right away, owlready2 runs ANALYZE when it opens a quadstore and
+        # would keep the write lock, so other worlds and parallel workers could not open the same quadstore
+        world = World(filename=store_path, exclusive=False)
+        world.save()
+        self.worlds.append(world)
+        return world.get_ontology(base_iri)
+
+    def _sidecar_matches(self, sidecar_path):
+        # the layout of a quadstore is owlready2's, a store of another version is parsed again
+        if not os.path.exists(sidecar_path):
+            return False
+        with open(sidecar_path) as sidecar:
+            meta = json.load(sidecar)
+        return meta.get('version') == CACHE_VERSION and meta.get('owlready2') == OWLREADY2_VERSION
+
+    def close(self):
+        for world in self.worlds:
+            world.close()
+        self.worlds = []
+
+
+def set_ontology_cache(folder):
+    """Makes load_ontology use the quadstores in folder, or parse every file again if folder is None."""
+    global _ontology_cache
+    if _ontology_cache is not None:
+        _ontology_cache.close()
+    _ontology_cache = OntologyCache(folder) if folder else None
+    return _ontology_cache
+
+
+def set_owl_reader(reader):
+    """Makes load_ontology read OWL files with owlready2 or with read_owl_stream ('stream'), which ignores the cache."""
+    global _owl_reader
+    if reader not in OWL_READERS:
+        raise ValueError(f'Unknown OWL reader {reader}, expected one of {OWL_READERS}')
+    _owl_reader = reader
+
+
+def ontology_loader_settings():
+    """(cache folder, OWL reader) of load_ontology, to load the ontologies the same way in another process with set_ontology_loader."""
+    return (_ontology_cache.folder if _ontology_cache is not None else None, _owl_reader)
+
+
+def set_ontology_loader(folder, reader):
+    set_ontology_cache(folder)
+    set_owl_reader(reader)
+
+
+def separate_worlds():
+    """True if load_ontology reads every OWL file on its own, False if they all go into owlready2's default world."""
+    return _owl_reader == 'stream' or _ontology_cache is not None
+
+
+def load_ontology(owl_path):
+    """
+    The ontology of an OWL file in owlready2's default world, in a world of its own with set_ontology_cache or
+    as a StreamedOntology with set_owl_reader('stream').
+    """
+    if _owl_reader == 'stream':
+        return read_owl_stream(owl_path)
+    if _ontology_cache is None:
+        return get_ontology(owl_path).load()
+    return _ontology_cache.load(owl_path)
@@ -0,0 +1,80 @@
+import argparse
+import json
+
+from prepare_ontologies import (ontology_table_jobs, hierarchy_table_jobs, run_ontology_jobs, assemble_ontology_tables,
+                                assemble_hierarchy_tables, get_ncbi_rank_division, write_ontology_tables, get_ontology_table)
+from update_allowed_terms_from_ontologies import update_allowed_terms, write_allowed_terms
+from ncbi_dmp import read_names_dmp
+from ontology_cache import set_ontology_cache, set_owl_reader, OWL_READERS
+
+
+def compile_ontologies(allowedTerm_dict, path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl,
+                       path_to_biome_envs_owl, path_to_material_envs_owl, path_to_ms_owl,
+                       path_to_ncbi_names_dmp, path_to_ncbi_nodes_dmp, path_to_ncbi_division_dmp, workers=1):
+    """
+    prepare_ontologies.py and update_allowed_terms_from_ontologies.py in one pass, every OWL file parsed once.
+
+    Returns:
+    ({output csv name: DataFrame}, allowedTerm_dict updated in place)
+    """
+    owl_paths = (path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl, path_to_biome_envs_owl, path_to_material_envs_owl)
+    results = run_ontology_jobs({
+        **ontology_table_jobs(*owl_paths),
+        'ms': ('Processing mass spectrometer ontology,..', get_ontology_table, (path_to_ms_owl,),
+               {'ont_prefix': 'MS_', 'descendant_node': 'MS_1000031'}),
+        **hierarchy_table_jobs(*owl_paths),
+        'ncbi_rank_division': (None, get_ncbi_rank_division, (path_to_ncbi_nodes_dmp, path_to_ncbi_division_dmp), {}),
+        # Only the scientific names, read by the C parser and filtered while reading
+        'scientific_names': (None, read_names_dmp, (path_to_ncbi_names_dmp,),
+                             {'name_classes': ['scientific name'], 'columns': [0, 1], 'names': ['ncbi_id', 'taxaname']}),
+    }, workers)
+
+    ontology_tables = assemble_ontology_tables(results)
+    ontology_tables.update(assemble_hierarchy_tables(results))
+    ontology_tables['NCBI_Rank_Division.csv'] = results['ncbi_rank_division']
+
+    update_allowed_terms(allowedTerm_dict,
+                         scientific_names_df=results['scientific_names'],
+                         bodypart_tables=[ontology_tables['UBERON_CL_PO_ontology.csv']],
+                         envBiome_onto=ontology_tables['ENVO_biome_ontology.csv'],
+                         envMaterial_onto=ontology_tables['ENVO_material_ontology.csv'],
+                         doid_df=ontology_tables['DOID_ontology.csv'],
+                         ms_df=results['ms'])
+
+    return ontology_tables, allowedTerm_dict
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prepare the ontology tables and update the allowed terms json in one pass')
+    parser.add_argument('path_to_allowed_terms_json')
+    parser.add_argument('--path_to_uberon_owl')
+    parser.add_argument('--path_to_po_owl')
+    parser.add_argument('--path_to_cl_owl')
+    parser.add_argument('--path_to_doid_owl')
+    parser.add_argument('--path_to_ms_owl')
+    parser.add_argument('--path_to_biome_envs_owl')
+    parser.add_argument('--path_to_material_envs_owl')
+    parser.add_argument('--path_to_ncbi_names_dmp')
+    parser.add_argument('--path_to_ncbi_nodes_dmp')
+    parser.add_argument('--path_to_ncbi_division_dmp')
+    parser.add_argument('--ontology_cache', help='Folder of parsed ontologies to reuse across runs (optional)', default=None)
+    parser.add_argument('--owl_reader', choices=OWL_READERS, default='owlready2', help='Read the OWL files with owlready2 or the streaming reader')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes preparing the ontologies in parallel')
+    args = parser.parse_args()
+
+    print('Reading allowed terms json!')
+    with open(args.path_to_allowed_terms_json, 'r') as file:
+        allowedTerm_dict = json.load(file)
+
+    set_ontology_cache(args.ontology_cache)
+    set_owl_reader(args.owl_reader)
+
+    ontology_tables, allowedTerm_dict = compile_ontologies(allowedTerm_dict,
+                                                           args.path_to_uberon_owl, args.path_to_cl_owl, args.path_to_po_owl,
+                                                           args.path_to_doid_owl, args.path_to_biome_envs_owl,
+                                                           args.path_to_material_envs_owl, args.path_to_ms_owl,
+                                                           args.path_to_ncbi_names_dmp, args.path_to_ncbi_nodes_dmp,
+                                                           args.path_to_ncbi_division_dmp, workers=args.workers)
+
+    write_ontology_tables(ontology_tables)
+    write_allowed_terms(allowedTerm_dict)
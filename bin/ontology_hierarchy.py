@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+
+from owl_stream import read_owl_stream, entity_name
+
+
+HIERARCHY_COLUMNS = ['OntologyIndex', 'AncestorIndex']
+
+
+def hierarchy_table_path(ontology_csv_path):
+    """The hierarchy written next to an ontology table: UBERON_CL_PO_ontology.csv -> UBERON_CL_PO_ontology_hierarchy.csv."""
+    return os.path.splitext(ontology_csv_path)[0] + '_hierarchy.csv'
+
+
+def get_hierarchy_table(owl_path, ont_prefix):
+    """
+    (OntologyIndex, AncestorIndex) rows of every class starting with ont_prefix and every class it is in the
+    descendants() of, itself included. Indices are written with ':' like in the ontology tables.
+    """
+    onto = read_owl_stream(owl_path)
+    rows = []
+    for ancestor in onto.classes():
+        rows.extend((term, ancestor.name) for term in map(entity_name, onto.descendant_iris(ancestor.iri))
+                    if term.startswith(ont_prefix))
+
+    df = pd.DataFrame(rows, columns=HIERARCHY_COLUMNS)
+    for column in HIERARCHY_COLUMNS:
+        df[column] = df[column].str.replace('_', ':')
+    return df
+
+
+def merge_hierarchy_tables(hierarchy_tables):
+    """One hierarchy of several files, like the UBERON, CL and PO tables concatenated in UBERON_CL_PO_ontology.csv."""
+    df = pd.concat(hierarchy_tables, ignore_index=True).drop_duplicates()
+    return df.sort_values(HIERARCHY_COLUMNS, ignore_index=True)
+
+
+class OntologyHierarchy:
+    """
+    Descendant queries from a hierarchy table, without the OWL file.
+
+    Args:
+    hierarchy_df: A table of get_hierarchy_table.
+    """
+
+    def __init__(self, hierarchy_df):
+        self._hierarchy_df = hierarchy_df
+        self._ancestors = {term: frozenset(ancestors) for term, ancestors in
+                           hierarchy_df.groupby('OntologyIndex', sort=False)['AncestorIndex']}
+        self._descendants = None
+
+    @classmethod
+    def read_csv(cls, path):
+        return cls(pd.read_csv(path, dtype=str))
+
+    def ancestors(self, term):
+        return self._ancestors.get(term, frozenset())
+
+    def is_descendant(self, term, root):
+        """True if term is root or one of its descendants."""
+        return root in self._ancestors.get(term, ())
+
+    def descendants(self, root):
+        if self._descendants is None:
+            self._descendants = {ancestor: frozenset(terms) for ancestor, terms in
+                                 self._hierarchy_df.groupby('AncestorIndex', sort=False)['OntologyIndex']}
+        return self._descendants.get(root, frozenset())
+
+    def is_descendant_series(self, terms, root):
+        """is_descendant for a Series of ontology indices, False for missing values and unknown terms."""
+        return terms.isin(self.descendants(root))
@@ -0,0 +1,85 @@
+import pandas as pd
+
+
+class OntologyJoinStage:
+    """
+    Fills the ontology index columns and NCBIRank/NCBIDivision of a REDU table with Series.map over label -> value
+    dicts. The first row of a label (or TaxonID) wins, like drop_duplicates(subset=['Label']).
+
+    Args:
+    The ontology tables under their kwargs names of complete_and_fill_REDU_table, missing ones give empty lookups.
+    """
+
+    # generated column: (source column in the REDU table, ontology table, value column in the ontology table)
+    INDEX_COLUMNS = {
+        'UBERONOntologyIndex': ('UBERONBodyPartName', 'UBERONOntologyIndex_table', 'UBERONOntologyIndex'),
+        'DOIDOntologyIndex': ('DOIDCommonName', 'DOIDOntologyIndex_table', 'DOIDOntologyIndex'),
+        'ENVOEnvironmentBiomeIndex': ('ENVOEnvironmentBiome', 'ENVOEnvironmentBiomeIndex_table', 'ENVOEnvironmentBiomeIndex'),
+        'ENVOEnvironmentMaterialIndex': ('ENVOEnvironmentMaterial', 'ENVOEnvironmentMaterialIndex_table', 'ENVOEnvironmentMaterialIndex'),
+        'ENVOMediumScaleIndex': ('ENVOMediumScale', 'ENVOEnvironmentMaterialIndex_table', 'ENVOEnvironmentMaterialIndex'),
+        'ENVOLocalScaleIndex': ('ENVOLocalScale', 'ENVOEnvironmentBiomeIndex_table', 'ENVOEnvironmentBiomeIndex'),
+        'ENVOBroadScaleIndex': ('ENVOBroadScale', 'ENVOEnvironmentBiomeIndex_table', 'ENVOEnvironmentBiomeIndex'),
+    }
+
+    TABLE_KWARGS = ['UBERONOntologyIndex_table', 'DOIDOntologyIndex_table', 'ENVOEnvironmentBiomeIndex_table',
+                    'ENVOEnvironmentMaterialIndex_table', 'NCBIRankDivision_table']
+
+    def __init__(self, **tables):
+        self.index_maps = {}
+        for column, (_, table_name, value_column) in self.INDEX_COLUMNS.items():
+            table = tables.get(table_name)
+            if table_name == 'DOIDOntologyIndex_table' and table is not None and value_column not in table.columns:
+                # the DOID csv is written with the UBERON column names
+                value_column = 'UBERONOntologyIndex'
+            self.index_maps[column] = self._first_wins(table, 'Label', value_column)
+
+        # UBERON label -> (Is Fluid, Is Multicellular)
+        uberon_table = tables.get('UBERONOntologyIndex_table')
+        is_fluid = self._first_wins(uberon_table, 'Label', 'Is Fluid')
+        is_multicellular = self._first_wins(uberon_table, 'Label', 'Is Multicellular')
+        self.uberon_flags = {label: (is_fluid[label] == True, is_multicellular[label] == True) for label in is_fluid}
+        self._fluid_labels = [label for label, (fluid, _) in self.uberon_flags.items() if fluid]
+        self._multicellular_labels = [label for label, (_, multicellular) in self.uberon_flags.items() if multicellular]
+
+        ncbi_table = tables.get('NCBIRankDivision_table')
+        self.ncbi_rank_map = self._first_wins(ncbi_table, 'TaxonID', 'NCBIRank', values_as_str=True)
+        self.ncbi_division_map = self._first_wins(ncbi_table, 'TaxonID', 'NCBIDivision', values_as_str=True)
+
+    @staticmethod
+    def _first_wins(table, key_column, value_column, values_as_str=False):
+        if table is None or key_column not in table.columns or value_column not in table.columns or len(table) == 0:
+            return {}
+        table = table[[key_column, value_column]].drop_duplicates(subset=[key_column])
+        values = table[value_column].astype(str) if values_as_str else table[value_column]
+        return dict(zip(table[key_column].astype(str), values))
+
+    def apply(self, df, allowedTerm_dict, generated_keys):
+        """
+        Adds the requested generated columns to df in place and returns it.
+
+        Like the former merges, the frame gets a fresh RangeIndex if any of the columns is filled.
+        """
+        generated_keys = [key for key in generated_keys if key in self.INDEX_COLUMNS or key == 'NCBIRank']
+        if len(generated_keys) == 0:
+            return df
+
+        df.index = pd.RangeIndex(len(df))
+
+        for key in generated_keys:
+            if key == 'NCBIRank':
+                missing_value = allowedTerm_dict[key]['missing']
+                taxonomy = df['NCBITaxonomy']
+                taxon_id = taxonomy.str.split('|', n=1).str[0].where(taxonomy.str.contains('|', regex=False), 'missing value')
+                df['NCBIRank'] = taxon_id.map(self.ncbi_rank_map).fillna(missing_value)
+                df['NCBIDivision'] = taxon_id.map(self.ncbi_division_map).fillna(missing_value)
+                continue
+
+            source_column = self.INDEX_COLUMNS[key][0]
+            df[key] = df[source_column].map(self.index_maps[key])
+
+            if key == 'UBERONOntologyIndex':
+                source = df[source_column]
+                df.loc[source.isin(self._multicellular_labels), 'SampleTypeSub1'] = 'tissue'
+                df.loc[source.isin(self._fluid_labels), 'SampleTypeSub1'] = 'biofluid'
+
+        return df
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+#bump when the layout of the store changes, older stores are then ignored
+STORE_VERSION = 2
+
+#the columns the converters deduplicate the ontology tables by, first rows are marked in FIRST_ROW_COLUMN.format(key)
+UNIQUE_KEYS = ['Label', 'TaxonID']
+FIRST_ROW_COLUMN = '__first_{}'
+
+#the columns of few distinct strings, stored dictionary encoded and read as categoricals
+CATEGORICAL_COLUMNS = ['NCBIRank', 'NCBIDivision']
+
+_META_VERSION = b'redu_store_version'
+_META_SOURCE = b'redu_source_stat'
+
+
+def ontology_table_store_path(csv_path):
+    """The store written next to an ontology table: UBERON_CL_PO_ontology.csv -> UBERON_CL_PO_ontology.parquet."""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def write_ontology_table_store(csv_path, path=None):
+    """
+    Writes the table of csv_path as pd.read_csv reads it to a Parquet store, read by read_ontology_table instead
+    of the csv. Returns the path, or None if pyarrow is not installed.
+    """
+    if pq is None:
+        print(f'pyarrow is not installed, not writing a store for {csv_path}')
+        return None
+    path = path or ontology_table_store_path(csv_path)
+
+    df = pd.read_csv(csv_path, index_col=False)
+    for column in df.columns:
+        if df[column].dtype == object and df[column].dropna().map(type).eq(bool).all() and df[column].notna().any():
+            df[column] = df[column].astype('boolean')
+    # all rows are kept, some converters need every synonym of a label
+    for key in UNIQUE_KEYS:
+        if key in df.columns:
+            df[FIRST_ROW_COLUMN.format(key)] = ~df.duplicated(subset=[key])
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and df[column].dtype == object:
+            df[column] = df[column].astype('category')
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _META_VERSION: str(STORE_VERSION).encode(),
+                                           _META_SOURCE: _source_stat(csv_path)})
+    pq.write_table(table, path)
+    return path
+
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'.encode()
+
+
+def _store_matches(store_path, csv_path):
+    try:
+        meta = pq.read_schema(store_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return meta.get(_META_VERSION) == str(STORE_VERSION).encode() and meta.get(_META_SOURCE) == _source_stat(csv_path)
+
+
+def _as_read_csv(df):
+    """Columns as pd.read_csv returns them: booleans with missing values as objects, missing strings as NaN."""
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.BooleanDtype):
+            if df[column].hasnans:
+                df[column] = df[column].astype(object).where(df[column].notna(), np.nan)
+            else:
+                df[column] = df[column].astype(bool)
+        elif df[column].dtype == object and df[column].hasnans:
+            df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def read_ontology_table(csv_path, columns=None, unique=None):
+    """
+    pd.read_csv(csv_path, index_col=False) with only columns (if given) and deduplicated by unique, from the
+    Parquet store of the csv if there is one.
+    """
+    store_path = ontology_table_store_path(csv_path)
+    if pq is not None and os.path.exists(store_path) and _store_matches(store_path, csv_path):
+        stored_columns = [name for name in pq.read_schema(store_path).names if not name.startswith(FIRST_ROW_COLUMN.format(''))]
+        read_columns = [name for name in stored_columns if columns is None or name in columns]
+        first_row_column = FIRST_ROW_COLUMN.format(unique) if unique is not None else None
+        table = pq.read_table(store_path, columns=read_columns + ([first_row_column] if first_row_column else []), memory_map=True)
+        index = None
+        if first_row_column:
+            first_rows = table.column(first_row_column).to_numpy()
+            table = table.drop([first_row_column]).filter(first_rows)
+            # the row labels drop_duplicates keeps
+            index = pd.Index(np.flatnonzero(first_rows))
+        # without deduplicating the strings, whose hash tables cost more memory than the repeated labels save
+        df = table.to_pandas(split_blocks=True, self_destruct=True, deduplicate_objects=False)
+        if index is not None:
+            df.index = index
+        # hand the decoded pages back, the pool keeps them for the next read otherwise
+        pa.default_memory_pool().release_unused()
+        return _as_read_csv(df)
+
+    df = pd.read_csv(csv_path, index_col=False, usecols=None if columns is None else lambda name: name in columns)
+    if unique is not None:
+        df = df.drop_duplicates(subset=[unique])
+    return df
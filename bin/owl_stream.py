@@ -0,0 +1,189 @@
+import fnmatch
+from urllib.parse import urljoin
+
+from lxml import etree
+
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDF_RDF = '{%s}RDF' % RDF
+RDF_ABOUT = '{%s}about' % RDF
+RDF_ID = '{%s}ID' % RDF
+RDF_RESOURCE = '{%s}resource' % RDF
+RDF_TYPE = '{%s}type' % RDF
+RDFS_LABEL = '{http://www.w3.org/2000/01/rdf-schema#}label'
+RDFS_SUBCLASSOF = '{http://www.w3.org/2000/01/rdf-schema#}subClassOf'
+OWL_CLASS_IRI = 'http://www.w3.org/2002/07/owl#Class'
+OWL_CLASS = '{http://www.w3.org/2002/07/owl#}Class'
+OWL_EQUIVALENTCLASS = '{http://www.w3.org/2002/07/owl#}equivalentClass'
+XML_BASE = '{http://www.w3.org/XML/1998/namespace}base'
+SYNONYM_PROPERTY = 'hasExactSynonym'
+
+
+def entity_name(iri):
+    """The name owlready2 gives the entity of an IRI: the part after the last '#', else after the last '/'."""
+    if '#' in iri:
+        return iri.rsplit('#', 1)[1]
+    return iri.rsplit('/', 1)[-1]
+
+
+class Values(list):
+    """The values of an annotation, with first() like owlready2's attribute lists."""
+
+    def first(self):
+        return self[0] if self else None
+
+
+class StreamedClass:
+    """A class of a StreamedOntology with the attributes the ontology tables use, like an owlready2 class."""
+
+    __slots__ = ['iri', 'name', 'ontology']
+
+    def __init__(self, ontology, iri):
+        self.ontology = ontology
+        self.iri = iri
+        self.name = entity_name(iri)
+
+    @property
+    def label(self):
+        return Values(self.ontology.labels.get(self.iri, ()))
+
+    @property
+    def hasExactSynonym(self):
+        return Values(self.ontology.synonyms.get(self.iri, ()))
+
+    def descendants(self):
+        return {self.ontology._get_class(iri) for iri in self.ontology.descendant_iris(self.iri)}
+
+    def __eq__(self, other):
+        return isinstance(other, StreamedClass) and other.iri == self.iri
+
+    def __hash__(self):
+        return hash(self.iri)
+
+    def __repr__(self):
+        return f'StreamedClass({self.iri!r})'
+
+
+class StreamedOntology:
+    """The classes (in file order), labels, synonyms and class hierarchy of an OWL file, read by read_owl_stream."""
+
+    def __init__(self, base_iri):
+        self.base_iri = base_iri
+        #class IRIs in the order of the file, a dict as ordered set
+        self.classes_iris = {}
+        self.subjects = set()
+        #IRI -> literals in the order of the file, without duplicates
+        self.labels = {}
+        self.synonyms = {}
+        #IRI -> IRIs that are rdfs:subClassOf it, IRI -> owl:equivalentClass IRIs in both directions
+        self.subclasses = {}
+        self.equivalents = {}
+        self._entities = {}
+
+    def _get_class(self, iri):
+        cls = self._entities.get(iri)
+        if cls is None:
+            cls = self._entities[iri] = StreamedClass(self, iri)
+        return cls
+
+    def classes(self):
+        for iri in self.classes_iris:
+            yield self._get_class(iri)
+
+    def search(self, iri):
+        """The entities with an IRI matching iri ('*' as wildcard)."""
+        if '*' in iri:
+            matches = sorted(s for s in self.subjects if fnmatch.fnmatchcase(s, iri))
+        else:
+            matches = [iri] if iri in self.subjects else []
+        return [self._get_class(s) for s in matches]
+
+    def search_one(self, iri):
+        matches = self.search(iri)
+        return matches[0] if matches else None
+
+    def descendant_iris(self, iri):
+        """iri and the IRIs below it through rdfs:subClassOf and owl:equivalentClass, like descendants() in owlready2."""
+        found, pending = {iri}, [iri]
+        while pending:
+            node = pending.pop()
+            for other in self.subclasses.get(node, []) + self.equivalents.get(node, []):
+                if other not in found:
+                    found.add(other)
+                    pending.append(other)
+        return found
+
+
+def _add_literal(values, iri, element):
+    literals = values.setdefault(iri, [])
+    text = element.text or ''
+    if text not in literals:
+        literals.append(text)
+
+
+def _object_iri(element, base):
+    # rdf:resource, or a named class nested in the element. Anonymous classes (restrictions, intersections) are skipped
+    iri = element.get(RDF_RESOURCE)
+    if iri is None and len(element) == 1:
+        iri = element[0].get(RDF_ABOUT)
+    return urljoin(base, iri) if iri is not None else None
+
+
+def _read_description(ontology, element, base):
+    iri = element.get(RDF_ABOUT)
+    if iri is None and element.get(RDF_ID) is not None:
+        iri = '#' + element.get(RDF_ID)
+    if iri is None:
+        return
+    iri = urljoin(base, iri)
+
+    ontology.subjects.add(iri)
+    if element.tag == OWL_CLASS:
+        ontology.classes_iris.setdefault(iri)
+
+    for child in element:
+        tag = child.tag
+        if not isinstance(tag, str):
+            continue
+        if tag == RDFS_LABEL:
+            _add_literal(ontology.labels, iri, child)
+        elif tag.rsplit('}', 1)[-1] == SYNONYM_PROPERTY:
+            _add_literal(ontology.synonyms, iri, child)
+        elif tag == RDF_TYPE:
+            if child.get(RDF_RESOURCE) == OWL_CLASS_IRI:
+                ontology.classes_iris.setdefault(iri)
+        elif tag == RDFS_SUBCLASSOF:
+            parent = _object_iri(child, base)
+            if parent is not None:
+                ontology.subclasses.setdefault(parent, []).append(iri)
+        elif tag == OWL_EQUIVALENTCLASS:
+            equivalent = _object_iri(child, base)
+            if equivalent is not None:
+                ontology.equivalents.setdefault(iri, []).append(equivalent)
+                ontology.equivalents.setdefault(equivalent, []).append(iri)
+
+
+def read_owl_stream(owl_path):
+    """
+    Reads the classes, labels, hasExactSynonym values and named rdfs:subClassOf/owl:equivalentClass edges of an
+    RDF/XML OWL file one top-level element at a time, with lxml's iterparse. owl:imports are not followed.
+    """
+    ontology = StreamedOntology(owl_path if owl_path.endswith('#') else owl_path + '#')
+    base = owl_path
+    depth = 0
+    for event, element in etree.iterparse(owl_path, events=('start', 'end'), remove_comments=True, huge_tree=True):
+        if event == 'start':
+            depth += 1
+            if element.tag == RDF_RDF:
+                base = element.get(XML_BASE, base)
+            continue
+
+        depth -= 1
+        if depth == 1:
+            _read_description(ontology, element, base)
+            # the element and the ones before it are not needed anymore
+            element.clear()
+            parent = element.getparent()
+            while element.getprevious() is not None:
+                del parent[0]
+    return ontology
@@ -0,0 +1,57 @@
+import re
+
+import pandas as pd
+
+
+#shortest prefix that ends in a path part named '*.d', i.e. the Agilent/Bruker bundle folder
+_D_FOLDER_PATTERN = re.compile(r'^(.*?\.d)(?:/|$)', re.DOTALL)
+
+
+def truncate_d_folders(paths):
+    """
+    Cuts every path after its first part ending with '.d', so the files inside a .d bundle map to the bundle.
+    Paths without such a part are returned unchanged.
+    """
+    paths = pd.Series(paths)
+    return paths.str.extract(_D_FOLDER_PATTERN, expand=False).fillna(paths)
+
+
+def clean_macosx_paths(paths, prefix_only=False):
+    """
+    Maps the macOS resource-fork copies '__MACOSX/<dir>/._<file>' of zip archives to '<dir>/<file>'.
+
+    Args:
+    paths: A pandas Series of paths.
+    prefix_only: Only treat paths starting with '__MACOSX/', otherwise '__MACOSX/' anywhere in the path counts.
+    """
+    paths = pd.Series(paths)
+    if prefix_only:
+        is_macosx = paths.str.startswith('__MACOSX/', na=False)
+    else:
+        is_macosx = paths.str.contains('__MACOSX/', regex=False, na=False)
+    is_macosx &= paths.str.contains('/._', regex=False, na=False)
+
+    cleaned = paths[is_macosx].str.replace('__MACOSX/', '', regex=False).str.replace('/._', '/', regex=False)
+    paths = paths.copy()
+    paths[is_macosx] = cleaned
+    return paths
+
+
+def strip_gz(paths):
+    """Removes a trailing '.gz' extension."""
+    return pd.Series(paths).str.replace(r'\.gz$', '', regex=True)
+
+
+def basename_lower(paths, missing_as_empty=True):
+    """
+    Lower-cased last part of each path, with backslashes treated as separators.
+
+    Args:
+    paths: A pandas Series of paths.
+    missing_as_empty: Missing values give ''. If False they are converted with str() like any other value, e.g. to 'nan'.
+    """
+    paths = pd.Series(paths)
+    if missing_as_empty:
+        paths = paths.where(paths.notna(), '')
+    paths = paths.astype(str)
+    return paths.str.replace('\\', '/', regex=False).str.rsplit('/', n=1).str[-1].str.lower()
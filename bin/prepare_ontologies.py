@@ -1,14 +1,18 @@
 
-from owlready2 import get_ontology
 import owlready2
 import pandas as pd
 import tqdm
 import os
 import argparse
 import json
+from concurrent.futures import ProcessPoolExecutor
+from ncbi_dmp import read_dmp
+from ontology_cache import load_ontology, set_ontology_cache, set_owl_reader, OWL_READERS, ontology_loader_settings, set_ontology_loader, separate_worlds
+from ontology_hierarchy import get_hierarchy_table, merge_hierarchy_tables, hierarchy_table_path
+from ontology_table_store import write_ontology_table_store
 
 def get_uberon_table(owl_path):
-    onto = get_ontology(owl_path).load()
+    onto = load_ontology(owl_path)
 
     multi_cellular = onto.search(iri="http://purl.obolibrary.org/obo/UBERON_0010000")[0]
     organ = onto.search(iri="http://purl.obolibrary.org/obo/UBERON_0000062")[0]
@@ -19,7 +23,8 @@ def get_uberon_table(owl_path):
     downstream_classes_bodily_fluid = set(bodily_fluid.descendants())
             
     data = []
-    for cls in tqdm.tqdm(onto.classes(), desc="Processing classes"):
+    # by IRI, so the rows are the same with either OWL reader
+    for cls in tqdm.tqdm(sorted(onto.classes(), key=lambda cls: cls.iri), desc="Processing classes"):
         label = cls.label.first() if cls.label else None
         synonyms = [synonym for synonym in cls.hasExactSynonym] if hasattr(cls, 'hasExactSynonym') else []
 
@@ -50,7 +55,7 @@ def get_uberon_table(owl_path):
 
 
 def get_ontology_table(owl_path, ont_prefix, rm_synonym_info=False, descendant_node=None, index_column_name = 'UBERONOntologyIndex'):
-    onto = get_ontology(owl_path).load()
+    onto = load_ontology(owl_path)
     filter_class = None
     descendants = set()
     if descendant_node:
@@ -63,7 +68,8 @@ def get_ontology_table(owl_path, ont_prefix, rm_synonym_info=False, descendant_n
             descendants.discard(filter_class)
     
     data = []
-    for cls in tqdm.tqdm(onto.classes(), desc="Processing classes"):
+    # by IRI, so the rows are the same with either OWL reader
+    for cls in tqdm.tqdm(sorted(onto.classes(), key=lambda cls: cls.iri), desc="Processing classes"):
         # Skip the class if it is the filter_class itself and descendant_node is provided
         if descendant_node and cls == filter_class:
             continue
@@ -99,6 +105,128 @@ def get_ontology_table(owl_path, ont_prefix, rm_synonym_info=False, descendant_n
     return df
 
 
+def ontology_table_jobs(path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl,
+                        path_to_biome_envs_owl, path_to_material_envs_owl):
+    """The tables of prepare_ontology_tables, one job per OWL file for run_ontology_jobs."""
+    return {
+        #create ontology table to fill UBERONOntologyIndex from bodyparts
+        'uberon': ('Processing body part ontology,..', get_uberon_table, (path_to_uberon_owl,), {}),
+        'cl': ('Processing cell ontology,..', get_ontology_table, (path_to_cl_owl,), {'ont_prefix': 'CL_'}),
+        'po': ('Processing plant ontology,..', get_ontology_table, (path_to_po_owl,), {'ont_prefix': 'PO_', 'rm_synonym_info': True}),
+        #environment ontology
+        'envo_biome': ('Processing environmental biome ontology,..', get_ontology_table, (path_to_biome_envs_owl,),
+                       {'ont_prefix': 'ENVO_', 'index_column_name': 'ENVOEnvironmentBiomeIndex'}),
+        'envo_material': ('Processing environmental material ontology,..', get_ontology_table, (path_to_material_envs_owl,),
+                          {'ont_prefix': 'ENVO_', 'index_column_name': 'ENVOEnvironmentMaterialIndex'}),
+        #create ontology table to fill DOIDOntologyIndex from bodyparts
+        'doid': ('Processing disease ontology,..', get_ontology_table, (path_to_doid_owl,),
+                 {'ont_prefix': 'DOID_', 'index_column_name': 'DOIDOntologyIndex'}),
+    }
+
+
+def assemble_ontology_tables(results):
+    """The ontology tables as {output csv name: DataFrame} from the results of ontology_table_jobs."""
+    uberon_ontology_table = pd.concat([results['uberon'], results['cl'], results['po']], ignore_index=True, sort=False)
+    uberon_ontology_table['UBERONOntologyIndex'] = uberon_ontology_table['UBERONOntologyIndex'].str.replace('_', ':')
+
+    envBiome_onto = results['envo_biome']
+    envBiome_onto['ENVOEnvironmentBiomeIndex'] = envBiome_onto['ENVOEnvironmentBiomeIndex'].str.replace('_', ':')
+
+    envMaterial_onto = results['envo_material']
+    envMaterial_onto['ENVOEnvironmentMaterialIndex'] = envMaterial_onto['ENVOEnvironmentMaterialIndex'].str.replace('_', ':')
+
+    doid_ontology_table = results['doid']
+    doid_ontology_table['DOIDOntologyIndex'] = doid_ontology_table['DOIDOntologyIndex'].str.replace('_', ':')
+
+    return {'UBERON_CL_PO_ontology.csv': uberon_ontology_table,
+            'DOID_ontology.csv': doid_ontology_table,
+            'ENVO_biome_ontology.csv': envBiome_onto,
+            'ENVO_material_ontology.csv': envMaterial_onto}
+
+
+def hierarchy_table_jobs(path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl,
+                         path_to_biome_envs_owl, path_to_material_envs_owl):
+    """The hierarchies of prepare_hierarchy_tables, one job per OWL file for run_ontology_jobs."""
+    return {
+        'uberon_hierarchy': ('Indexing the body part ontology hierarchy,..', get_hierarchy_table, (path_to_uberon_owl, 'UBERON_'), {}),
+        'cl_hierarchy': ('Indexing the cell ontology hierarchy,..', get_hierarchy_table, (path_to_cl_owl, 'CL_'), {}),
+        'po_hierarchy': ('Indexing the plant ontology hierarchy,..', get_hierarchy_table, (path_to_po_owl, 'PO_'), {}),
+        'envo_biome_hierarchy': ('Indexing the environmental biome ontology hierarchy,..', get_hierarchy_table, (path_to_biome_envs_owl, 'ENVO_'), {}),
+        'envo_material_hierarchy': ('Indexing the environmental material ontology hierarchy,..', get_hierarchy_table, (path_to_material_envs_owl, 'ENVO_'), {}),
+        'doid_hierarchy': ('Indexing the disease ontology hierarchy,..', get_hierarchy_table, (path_to_doid_owl, 'DOID_'), {}),
+    }
+
+
+def assemble_hierarchy_tables(results):
+    """The hierarchies as {output csv name: DataFrame}, written next to the ontology tables, from the results of hierarchy_table_jobs."""
+    hierarchy_tables = {
+        'UBERON_CL_PO_ontology.csv': [results['uberon_hierarchy'], results['cl_hierarchy'], results['po_hierarchy']],
+        'DOID_ontology.csv': [results['doid_hierarchy']],
+        'ENVO_biome_ontology.csv': [results['envo_biome_hierarchy']],
+        'ENVO_material_ontology.csv': [results['envo_material_hierarchy']],
+    }
+    return {hierarchy_table_path(file_name): merge_hierarchy_tables(tables) for file_name, tables in hierarchy_tables.items()}
+
+
+def _run_job(description, function, args, kwargs):
+    if description:
+        print(description)
+    return function(*args, **kwargs)
+
+
+def run_ontology_jobs(jobs, workers=1):
+    """
+    Runs {name: (description, function, args, kwargs)} and returns {name: result}, in a pool of workers processes
+    if every OWL file is loaded on its own (separate_worlds), else one after the other in their order.
+    """
+    # in owlready2's default world a class also has what the files loaded before gave it
+    if workers > 1 and not separate_worlds():
+        print('The OWL files are loaded into one world, preparing the ontologies in one process')
+        workers = 1
+    if workers <= 1:
+        return {name: _run_job(*job) for name, job in jobs.items()}
+
+    # not daemonic processes, owlready2 parses large files in a child process of its own
+    with ProcessPoolExecutor(workers, initializer=set_ontology_loader, initargs=ontology_loader_settings()) as pool:
+        futures = {name: pool.submit(_run_job, *job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def prepare_ontology_tables(path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl,
+                            path_to_biome_envs_owl, path_to_material_envs_owl, workers=1):
+    """Loads the OWL files, in workers processes if workers > 1, and returns the ontology tables as {output csv name: DataFrame}."""
+    return assemble_ontology_tables(run_ontology_jobs(ontology_table_jobs(path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl,
+                                                                          path_to_biome_envs_owl, path_to_material_envs_owl), workers))
+
+
+def prepare_hierarchy_tables(path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl,
+                             path_to_biome_envs_owl, path_to_material_envs_owl, workers=1):
+    """The hierarchies of the tables of prepare_ontology_tables as {output csv name: DataFrame}, written next to them."""
+    return assemble_hierarchy_tables(run_ontology_jobs(hierarchy_table_jobs(path_to_uberon_owl, path_to_cl_owl, path_to_po_owl, path_to_doid_owl,
+                                                                            path_to_biome_envs_owl, path_to_material_envs_owl), workers))
+
+
+def get_ncbi_rank_division(path_to_ncbi_nodes_dmp, path_to_ncbi_division_dmp):
+    """TaxonID, NCBIRank and NCBIDivision of every taxon in nodes.dmp."""
+    print('Loading and processing NCBI rank file,..')
+    df_ncbi_rank = read_dmp(path_to_ncbi_nodes_dmp, [0, 2, 4], ['TaxonID', 'NCBIRank', 'DivID'], dtype={'TaxonID': 'int64', 'DivID': 'int64'})
+
+    print('Loading and processing NCBI divion file,..')
+    df_ncbi_divisions = read_dmp(path_to_ncbi_division_dmp, [0, 2], ['DivID', 'NCBIDivision'], dtype={'DivID': 'int64'})
+
+    print('Merging NCBI files,..')
+    df_ncbi_rank_divisions = pd.merge(df_ncbi_rank, df_ncbi_divisions, on='DivID', how='left')
+    return df_ncbi_rank_divisions[['TaxonID', 'NCBIRank', 'NCBIDivision']]
+
+
+def write_ontology_tables(ontology_tables):
+    for file_name, table in ontology_tables.items():
+        table.to_csv(file_name, index=False)
+        #the converters read the tables from the stores, the hierarchies are not read by them
+        if not file_name.endswith('_hierarchy.csv'):
+            write_ontology_table_store(file_name)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Prepare ontologies')
     parser.add_argument('--path_to_uberon_owl')
@@ -110,63 +238,25 @@ if __name__ == '__main__':
     parser.add_argument('--path_to_ncbi_nodes_dmp')
     parser.add_argument('--path_to_ncbi_division_dmp')
 
+    parser.add_argument('--ontology_cache', help='Folder of parsed ontologies to reuse across runs (optional)', default=None)
+    parser.add_argument('--owl_reader', choices=OWL_READERS, default='owlready2', help='Read the OWL files with owlready2 or the streaming reader')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes preparing the ontologies in parallel')
     args = parser.parse_args()
 
     #python3.8 ../ReDU-MS2-GNPS2/workflows/PublicDataset_ReDU_Metadata_Workflow/bin/read_and_validate_redu_from_github.py /home/yasin/projects/ReDU_metadata/metadata output/ --AllowedTermJson_path /home/yasin/projects/ReDU-MS2-GNPS2/workflows/PublicDataset_ReDU_Metadata_Workflow/bin/allowed_terms/allowed_terms.json --path_to_uberon_owl /home/yasin/projects/ReDU-MS2-GNPS2/workflows/PublicDataset_ReDU_Metadata_Workflow/bin/allowed_terms/uberon.owl --path_to_po_owl /home/yasin/projects/ReDU-MS2-GNPS2/workflows/PublicDataset_ReDU_Metadata_Workflow/bin/allowed_terms/po.owl --path_to_cl_owl /home/yasin/projects/ReDU-MS2-GNPS2/workflows/PublicDataset_ReDU_Metadata_Workflow/bin/allowed_terms/cl.owl  --path_to_doid_owl /home/yasin/projects/ReDU-MS2-GNPS2/workflows/PublicDataset_ReDU_Metadata_Workflow/bin/allowed_terms/doid.owl
 
+    set_ontology_cache(args.ontology_cache)
+    set_owl_reader(args.owl_reader)
 
-    #create ontology table to fill UBERONOntologyIndex from bodyparts
-    print('Processing body part ontology,..')
-    uberon_onto = get_uberon_table(args.path_to_uberon_owl)
-
-    print('Processing cell ontology,..')
-    cl_onto = get_ontology_table(args.path_to_cl_owl, ont_prefix = 'CL_')
-
-    print('Processing plant ontology,..')
-    po_onto = get_ontology_table(args.path_to_po_owl, ont_prefix = 'PO_', rm_synonym_info = True)
-
-    uberon_ontology_table = pd.concat([uberon_onto, cl_onto, po_onto], ignore_index=True, sort=False)
-    uberon_ontology_table['UBERONOntologyIndex'] = uberon_ontology_table['UBERONOntologyIndex'].str.replace('_', ':')
-
-    #environment ontology
-    print('Processing environmental biome ontology,..')
-    envBiome_onto = get_ontology_table(args.path_to_biome_envs_owl, ont_prefix = 'ENVO_', index_column_name = 'ENVOEnvironmentBiomeIndex')
-    envBiome_onto['ENVOEnvironmentBiomeIndex'] = envBiome_onto['ENVOEnvironmentBiomeIndex'].str.replace('_', ':')
-
-
-    print('Processing environmental material ontology,..')
-    envMaterial_onto = get_ontology_table(args.path_to_material_envs_owl, ont_prefix = 'ENVO_', index_column_name = 'ENVOEnvironmentMaterialIndex')
-    envMaterial_onto['ENVOEnvironmentMaterialIndex'] = envMaterial_onto['ENVOEnvironmentMaterialIndex'].str.replace('_', ':')
-
-
-    #create ontology table to fill DOIDOntologyIndex from bodyparts
-    print('Processing disease ontology,..')
-    doid_ontology_table = get_ontology_table(args.path_to_doid_owl, ont_prefix = 'DOID_', index_column_name = 'DOIDOntologyIndex')
-    doid_ontology_table['DOIDOntologyIndex'] = doid_ontology_table['DOIDOntologyIndex'].str.replace('_', ':')
-
-
-
-
-    #create ncbi - rank - division sheet
-    print('Loading and processing NCBI rank file,..')
-    df_ncbi_rank = pd.read_csv(args.path_to_ncbi_nodes_dmp, sep='\t\|\t', engine='python', header=None, index_col=False, comment='#')
-    df_ncbi_rank = df_ncbi_rank.dropna(axis=1, how='all')
-    df_ncbi_rank.columns = ['TaxonID', 'ParentID', 'NCBIRank', 'Empties1', 'DivID', 'InheritedDivFlag', 'GeneticCodeID', 'InheritedGCFlag', 'MitochondrialGeneticCodeID', 'InheritedMitoGCFlag', 'GenBankHiddenFlag', 'HiddenSubtreeRootFlag', 'Comments']
-    df_ncbi_rank = df_ncbi_rank[['TaxonID', 'NCBIRank', 'DivID']]
-
-    print('Loading and processing NCBI divion file,..')
-    df_ncbi_divisions = pd.read_csv(args.path_to_ncbi_division_dmp, sep='\t\|\t', engine='python', header=None, index_col=False)
-    df_ncbi_divisions[3] = df_ncbi_divisions[3].str.replace('\t\|', '', regex=False).str.strip()
-    df_ncbi_divisions.columns = ['DivID', 'Abbreviation', 'NCBIDivision', 'Notes']
-    df_ncbi_divisions = df_ncbi_divisions[['DivID', 'NCBIDivision']]
-
-    print('Merging NCBI files,..')
-    df_ncbi_rank_divisions = pd.merge(df_ncbi_rank, df_ncbi_divisions, on='DivID', how='left')
-    df_ncbi_rank_divisions = df_ncbi_rank_divisions[['TaxonID', 'NCBIRank', 'NCBIDivision']]
+    owl_paths = (args.path_to_uberon_owl, args.path_to_cl_owl, args.path_to_po_owl, args.path_to_doid_owl,
+                 args.path_to_biome_envs_owl, args.path_to_material_envs_owl)
+    #one pool for the tables, the hierarchies and the ncbi - rank - division sheet
+    results = run_ontology_jobs({**ontology_table_jobs(*owl_paths), **hierarchy_table_jobs(*owl_paths),
+                                 'ncbi_rank_division': (None, get_ncbi_rank_division, (args.path_to_ncbi_nodes_dmp, args.path_to_ncbi_division_dmp), {})},
+                                args.workers)
 
+    ontology_tables = assemble_ontology_tables(results)
+    ontology_tables.update(assemble_hierarchy_tables(results))
+    ontology_tables['NCBI_Rank_Division.csv'] = results['ncbi_rank_division']
 
-    uberon_ontology_table.to_csv('UBERON_CL_PO_ontology.csv', index=False)
-    doid_ontology_table.to_csv('DOID_ontology.csv', index=False)
-    envBiome_onto.to_csv('ENVO_biome_ontology.csv', index=False)
-    envMaterial_onto.to_csv('ENVO_material_ontology.csv', index=False)
-    df_ncbi_rank_divisions.to_csv('NCBI_Rank_Division.csv', index=False)
\ No newline at end of file
+    write_ontology_tables(ontology_tables)
@@ -1,11 +1,34 @@
 import argparse
 import pandas as pd
+import numpy as np
 import glob
+import multiprocessing
 import re
 import os
-import json
-from io import StringIO
-from REDU_conversion_functions import age_category
+import io
+import sys
+from REDU_conversion_functions import age_category_series
+from allowed_term_index import AllowedTermIndex
+from allowed_terms_store import load_allowed_terms
+from ontology_join import OntologyJoinStage
+from ontology_table_store import read_ontology_table
+from resolution_cache import ResolutionCache
+from redu_schema import compile_schema
+from remapping_report import RemappingReport
+from path_normalization import truncate_d_folders
+from harmonize_manifest import sha256_file, sha256_files, code_sha256, manifest_entry, load_manifest, write_manifest, reuse_previous_output
+
+#a row is only kept if at least one of these columns holds information
+SUFFICIENT_METADATA_COLUMNS = ["SampleType", "SampleTypeSub1", "NCBITaxonomy", "UBERONBodyPartName", "BiologicalSex", 
+                               "AgeInYears", "LifeStage", "Country", "HealthStatus", "SampleExtractionMethod", 
+                               "SampleCollectionMethod", "ComorbidityListDOIDIndex", "DOIDCommonName", 
+                               "DepthorAltitudeMeters", "HumanPopulationDensity", "LatitudeandLongitude",
+                               "ENVOEnvironmentBiome", "ENVOEnvironmentMaterial"]
+
+#the bin modules the harmonized tables depend on, incremental mode reprocesses every file when one of them changes
+HARMONIZER_MODULES = ['REDU_conversion_functions', 'allowed_term_index', 'allowed_terms_store', 'mass_spectrometer_resolver',
+                      'ontology_join', 'ontology_table_store', 'path_normalization', 'redu_schema', 'remapping_report',
+                      'resolution_cache', 'taxonomy_resolver']
 
 def complete_and_fill_REDU_table(df, allowedTerm_dict, add_usi = False, keep_usi = False, other_allowed_file_extensions = [], attempt_adding_file_extensions = False, **kwargs):
     """
@@ -14,6 +37,16 @@ def complete_and_fill_REDU_table(df, allowedTerm_dict, add_usi = False, keep_usi
     Args:
     df: A pandas DataFrame containing the initial data.
     allowedTerm_dict: A dictionary containing allowed terms and missing values for each column.
+    allowed_term_index (kwarg): An AllowedTermIndex built once from allowedTerm_dict. Callers processing many
+        tables should pass it in; if omitted, one is built for this call.
+    ontology_join (kwarg): An OntologyJoinStage built once from the ontology tables. If omitted, one is built
+        from the *_table kwargs for this call.
+    resolution_cache (kwarg): A ResolutionCache. If given, the resolution of observed values to allowed terms
+        is looked up in and stored to it.
+    categorical (kwarg): If True, the controlled vocabulary columns are returned as pandas categoricals whose
+        categories start with the allowed terms. The values (and any tsv written from them) are the same.
+    remapping_report (kwarg): A RemappingReport collecting the remapped values and ignored columns. If omitted,
+        they are printed as a RemappingReport with verbosity 2 does.
 
     Returns:
     A DataFrame that has been filled with default values for missing columns,
@@ -21,103 +54,25 @@ def complete_and_fill_REDU_table(df, allowedTerm_dict, add_usi = False, keep_usi
     if they are not in the allowed terms or are missing/empty, except for specific columns.
     """
 
-    #prepare UberonOntologyIndex
-    if 'UBERONOntologyIndex_table' in kwargs.keys():
-        uberon_ontology_table = kwargs['UBERONOntologyIndex_table']
-    else:
-        uberon_ontology_table = pd.DataFrame(columns=['Label', 'UBERONOntologyIndex', 'Is Multicellular','Is Organ', 'Is Fluid'])
-
-    uberon_ontology_table['Label'] = uberon_ontology_table['Label'].astype(str)
-
-    #prepare DOIDOntologyTable
-    if 'DOIDOntologyIndex_table' in kwargs.keys():
-        doid_ontology_table = kwargs['DOIDOntologyIndex_table']
-        if 'UBERONOntologyIndex' in doid_ontology_table.columns:
-            doid_ontology_table.rename(columns={'UBERONOntologyIndex': 'DOIDOntologyIndex'}, inplace=True)
-    else:
-        doid_ontology_table = pd.DataFrame(columns=['Label', 'DOIDOntologyIndex'])
-    
-    doid_ontology_table['Label'] = doid_ontology_table['Label'].astype(str)
-
-    #prepare environment biome table
-    if 'ENVOEnvironmentBiomeIndex_table' in kwargs.keys():
-        envome_biome_ontology_table = kwargs['ENVOEnvironmentBiomeIndex_table']
-    else:
-        envome_biome_ontology_table = pd.DataFrame(columns=['Label', 'ENVOEnvironmentBiomeIndex'])
-
-    envome_biome_ontology_table['Label'] = envome_biome_ontology_table['Label'].astype(str)
-
-    #prepare environment material table
-    if 'ENVOEnvironmentMaterialIndex_table' in kwargs.keys():
-        envome_material_ontology_table = kwargs['ENVOEnvironmentMaterialIndex_table']
-    else:
-        envome_material_ontology_table = pd.DataFrame(columns=['Label', 'ENVOEnvironmentMaterialIndex'])
+    ontology_join = kwargs.get('ontology_join')
+    if ontology_join is None:
+        ontology_join = OntologyJoinStage(**{name: kwargs[name] for name in OntologyJoinStage.TABLE_KWARGS if name in kwargs})
 
-    envome_material_ontology_table['Label'] = envome_material_ontology_table['Label'].astype(str)
+    allowed_term_index = kwargs.get('allowed_term_index')
+    if allowed_term_index is None:
+        allowed_term_index = AllowedTermIndex(allowedTerm_dict)
 
-    #prepare environment medium scale table
-    if 'ENVOEnvironmentMaterialIndex_table' in kwargs.keys():
-        envome_medium_scale_ontology_table = kwargs['ENVOEnvironmentMaterialIndex_table']
-        envome_medium_scale_ontology_table = envome_medium_scale_ontology_table.rename(
-            columns={'ENVOEnvironmentMaterialIndex': 'ENVOMediumScaleIndex'}
-            )
-    else:
-        envome_medium_scale_ontology_table = pd.DataFrame(columns=['Label', 'ENVOMediumScaleIndex'])
-
-    envome_medium_scale_ontology_table['Label'] = envome_medium_scale_ontology_table['Label'].astype(str)
-
-
-    #prepare environment local scale table
-    if 'ENVOEnvironmentBiomeIndex_table' in kwargs.keys():
-        envome_local_scale_ontology_table = kwargs['ENVOEnvironmentBiomeIndex_table']
-        envome_local_scale_ontology_table = envome_local_scale_ontology_table.rename(
-            columns={'ENVOEnvironmentBiomeIndex': 'ENVOLocalScaleIndex'}
-            )
-    else:
-        envome_local_scale_ontology_table = pd.DataFrame(columns=['Label', 'ENVOLocalScaleIndex'])
-
-    envome_local_scale_ontology_table['Label'] = envome_local_scale_ontology_table['Label'].astype(str)
-
-
-    #prepare environment broad scale table
-    if 'ENVOEnvironmentBiomeIndex_table' in kwargs.keys():
-        envome_broad_scale_ontology_table = kwargs['ENVOEnvironmentBiomeIndex_table']
-        envome_broad_scale_ontology_table = envome_broad_scale_ontology_table.rename(
-            columns={'ENVOEnvironmentBiomeIndex': 'ENVOBroadScaleIndex'}
-            )
-    else:
-        envome_broad_scale_ontology_table = pd.DataFrame(columns=['Label', 'ENVOBroadScaleIndex'])
+    resolution_cache = kwargs.get('resolution_cache')
+    if resolution_cache is not None:
+        cache_counts_before = (resolution_cache.hits, resolution_cache.misses)
 
-    envome_broad_scale_ontology_table['Label'] = envome_broad_scale_ontology_table['Label'].astype(str)
-
-
-    #prepare NCBI table
-    if 'NCBIRankDivision_table' in kwargs.keys():
-        NCBIRankDivision_table = kwargs['NCBIRankDivision_table']
-    else:
-        NCBIRankDivision_table = pd.DataFrame(columns=['TaxonID', 'NCBIRank', 'NCBIDivision'])
-
-    NCBIRankDivision_table['TaxonID'] = NCBIRankDivision_table['TaxonID'].astype(str)
-    NCBIRankDivision_table['NCBIRank'] = NCBIRankDivision_table['NCBIRank'].astype(str)
-    NCBIRankDivision_table['NCBIDivision'] = NCBIRankDivision_table['NCBIDivision'].astype(str)
+    remapping_report = kwargs.get('remapping_report')
+    if remapping_report is None:
+        remapping_report = RemappingReport(verbosity=2)
 
     # Convert all columns to String
     df = df.astype(str)
 
-    def _split_id_name(term: str):
-        term = "" if term is None else str(term)
-        if "|" in term:
-            tid, tname = term.split("|", 1)
-            return tid.strip(), tname.strip()
-        return None, term.strip()
-
-    def _is_sp_or_spp(name: str) -> bool:
-        toks = name.strip().split()
-        return len(toks) >= 2 and toks[1].rstrip(".").lower() in {"sp", "spp"}
-
-    def _genus_from_name(name: str) -> str:
-        return name.strip().split()[0] if name.strip() else ""
-
     #remove autogenerated columns if present
     keys_to_drop = [key for key, value in allowedTerm_dict.items() if value.get("generate") == "True"]
     columns_to_remove = [col for col in keys_to_drop + ['Is Multicellular', 'Is Organ', 'Is Fluid'] if col in df.columns]
@@ -150,117 +105,21 @@ def complete_and_fill_REDU_table(df, allowedTerm_dict, add_usi = False, keep_usi
                     print(f'{key}: ADDED!')
 
 
-    for key, value in allowedTerm_dict.items():
-        if key in df.columns and value['generate'] == 'False':
-            allowed_terms = value['allowed_values']
-            missing_value = value['missing']
+    # Validate every column with its rule compiled from allowedTerm_dict
+    for rule in compile_schema(allowedTerm_dict):
+        observed = df[rule.key]
+        df[rule.key], value_map = rule(observed, allowed_term_index, resolution_cache, other_allowed_file_extensions)
 
-            # Extract unique values from the DataFrame column
-            unique_values = df[key].unique()
-            
-            # Initialize value_map for each condition
-            if key not in ['NCBITaxonomy', 'MassSpectrometer', 'filename'] and len(allowed_terms) > 1:
-                # General case for non-specific keys with multiple allowed terms
-                value_map = {
-                    observed_value: next((allowed for allowed in allowed_terms if allowed.replace(" ", "") == str(observed_value).replace(" ", "")), missing_value)
-                    for observed_value in unique_values
-                }
-
-
-            elif key in ['NCBITaxonomy', 'MassSpectrometer']:
-                if key == 'NCBITaxonomy':
-                    # Build fast lookups from allowed terms: 'ID|Name'
-                    allowed_set = set(allowed_terms)
-                    allowed_by_id = {}
-                    allowed_by_name_ci = {}
-                    for t in allowed_terms:
-                        if "|" in t:
-                            tid, tname = t.split("|", 1)
-                            tid = tid.strip()
-                            tname = tname.strip()
-                            allowed_by_id[tid] = t
-                            allowed_by_name_ci[tname.lower()] = t
-
-                    def resolve_ncbi(observed_value: str) -> str:
-                        # observed_value like '1931|Streptomyces sp.' or '1883|Streptomyces' or just 'Streptomyces sp.'
-                        oid, oname = _split_id_name(observed_value)
-
-                        # 1) Prefer genus mapping if looks like 'Genus sp.' / 'Genus spp.' (even if exact value is allowed)
-                        if oname and _is_sp_or_spp(oname):
-                            genus = _genus_from_name(oname)
-                            hit = allowed_by_name_ci.get(genus.lower())
-                            if hit:
-                                return hit  # e.g., '1883|Streptomyces'
-
-                        # 2) Exact allowed term
-                        if observed_value in allowed_set:
-                            return observed_value
-
-                        # 3) Same ID → allowed term
-                        if oid and oid in allowed_by_id:
-                            return allowed_by_id[oid]
-
-                        # 4) Same Name (case-insensitive) → allowed term
-                        if oname:
-                            hit = allowed_by_name_ci.get(oname.lower())
-                            if hit:
-                                return hit
-
-                        # 5) No match
-                        return missing_value
-
-                    value_map = {ov: resolve_ncbi(ov) for ov in unique_values}
+        if value_map is not None:
+            remapping_report.record_remapping(df['MassiveID'], rule.key, observed, value_map)
+
+    if resolution_cache is not None:
+        print(f"Resolution cache: {resolution_cache.hits - cache_counts_before[0]} hits, {resolution_cache.misses - cache_counts_before[1]} misses")
 
-                else:
-                    # MassSpectrometer: keep your original direct matching
-                    value_map = {
-                        observed_value: (
-                            observed_value if observed_value in allowed_terms 
-                            else next(
-                                (y for y in allowed_terms if "|" in str(observed_value) and y.split("|", 1)[0] == str(observed_value).split("|", 1)[0]),
-                                next(
-                                    (y for y in allowed_terms if "|" in str(observed_value) and y.split("|", 1)[1] == str(observed_value).split("|", 1)[1]),
-                                    missing_value
-                                )
-                            )
-                        )
-                        for observed_value in unique_values
-                    }
-                
-            elif allowed_terms[0] == '00':
-                # Handling for terms where '00' indicates a placeholder for any value
-                value_map = {x: x if pd.notna(x) and x != "" else missing_value for x in unique_values}
-            elif allowed_terms[0] == 'numeric':
-                # Numeric handling is kept as is
-                df[key] = pd.to_numeric(df[key], errors='coerce').fillna(missing_value).replace("", missing_value)
-                continue
-            elif allowed_terms[0] == 'numeric|numeric':
-                # Handling for numeric ranges split by '|'
-                value_map = {
-                    x: x if all(part.replace('.', '', 1).isdigit() or part.lstrip('-').replace('.', '', 1).isdigit() for part in str(x).split('|')) else missing_value
-                    for x in unique_values
-                }
-            elif key == 'filename':
-                # Specific handling for filenames with allowed extensions
-                value_map = {
-                    x: x if any(str(x).lower().endswith(ext.lower()) for ext in allowed_terms + other_allowed_file_extensions) 
-                    else missing_value 
-                    for x in unique_values
-                }
-            # Apply the mapping for columns, except 'numeric' which is handled separately
-            if key != 'numeric':
-                df[key] = df[key].map(value_map).fillna(missing_value).replace("", missing_value)
-            
-            # preparing valuemap for print into log
-            filtered_map = {k: v for k, v in value_map.items() if k != v}
-            if filtered_map: 
-                print(f"{key}:")
-                for k, v in filtered_map.items():
-                    print(f"  {k}: {v}")
-        elif key not in df.columns and value['generate'] == 'False':
-            df[key] = value['missing']
 
 
+    #ontology indices, UBERON derived SampleTypeSub1, NCBIRank and NCBIDivision
+    df = ontology_join.apply(df, allowedTerm_dict, [key for key, value in allowedTerm_dict.items() if value['generate'] == 'True'])
 
     for key, value in allowedTerm_dict.items():
         if value['generate'] == 'True':
@@ -274,56 +133,12 @@ def complete_and_fill_REDU_table(df, allowedTerm_dict, add_usi = False, keep_usi
 
 
             if key == 'LifeStage':
-                df[key] = df.apply(lambda x: age_category(x['AgeInYears']) if x['NCBITaxonomy'] == "9606|Homo sapiens" else value['missing'], axis=1)
+                df[key] = life_stages(df, value['missing'])
             if key == 'UniqueSubjectID':
-                df[key] = df.apply(lambda x: str(x['MassiveID']) + '_' + str(x['SubjectIdentifierAsRecorded']) 
-                                if x['SubjectIdentifierAsRecorded'] != allowedTerm_dict['SubjectIdentifierAsRecorded']['missing'] 
-                                and x['SubjectIdentifierAsRecorded'] != ''
-                                and x['SubjectIdentifierAsRecorded'] != 'not applicable' 
-                                and not pd.isna(x['SubjectIdentifierAsRecorded']) 
-                                else value['missing'], axis=1)
-            if key == 'UBERONOntologyIndex':
-                df = df.merge(uberon_ontology_table[['Label', 'UBERONOntologyIndex', 'Is Multicellular','Is Organ', 'Is Fluid']], left_on='UBERONBodyPartName', right_on='Label', how='left')
-                df.loc[df['Is Multicellular'] == True, 'SampleTypeSub1'] = 'tissue'
-                df.loc[df['Is Fluid'] == True, 'SampleTypeSub1'] = 'biofluid'
-                df.drop(columns=['Label', 'Is Multicellular', 'Is Organ', 'Is Fluid'], inplace=True)
-            if key == 'DOIDOntologyIndex':
-                df = df.merge(doid_ontology_table[['Label', 'DOIDOntologyIndex']], left_on='DOIDCommonName', right_on='Label', how='left')
-                df.drop(columns=['Label'], inplace=True)
-            if key == 'ENVOEnvironmentBiomeIndex':
-                df = df.merge(envome_biome_ontology_table[['Label', 'ENVOEnvironmentBiomeIndex']], left_on='ENVOEnvironmentBiome', right_on='Label', how='left')
-                df.drop(columns=['Label'], inplace=True)
-            if key == 'ENVOEnvironmentMaterialIndex':
-                df = df.merge(envome_material_ontology_table[['Label', 'ENVOEnvironmentMaterialIndex']], left_on='ENVOEnvironmentMaterial', right_on='Label', how='left')
-                df.drop(columns=['Label'], inplace=True)
-            if key == 'ENVOMediumScaleIndex':
-                df = df.merge(envome_medium_scale_ontology_table[['Label', 'ENVOMediumScaleIndex']], left_on='ENVOMediumScale', right_on='Label', how='left')
-                df.drop(columns=['Label'], inplace=True)
-            if key == 'ENVOLocalScaleIndex':
-                df = df.merge(envome_local_scale_ontology_table[['Label', 'ENVOLocalScaleIndex']], left_on='ENVOLocalScale', right_on='Label', how='left')
-                df.drop(columns=['Label'], inplace=True)
-            if key == 'ENVOBroadScaleIndex':
-                df = df.merge(envome_broad_scale_ontology_table[['Label', 'ENVOBroadScaleIndex']], left_on='ENVOBroadScale', right_on='Label', how='left')
-                df.drop(columns=['Label'], inplace=True)
+                df[key] = unique_subject_ids(df, allowedTerm_dict['SubjectIdentifierAsRecorded']['missing'], value['missing'])
             if key == 'USI' and add_usi == True:
-                df['filename'] = df['filename'].apply(process_filename)
+                df['filename'] = truncate_d_folders(df['filename'])
                 df['USI'] = 'mzspec:' + df['MassiveID'] + ':' + df['filename']
-            if key == 'NCBIRank':
-                df['TaxonID'] = df['NCBITaxonomy'].apply(lambda x: x.split('|')[0] if '|' in x else 'missing value')
-                df['TaxonID'] = df['TaxonID'].astype(str)
-                df = pd.merge(df, NCBIRankDivision_table, on='TaxonID', how='left')
-                df.drop(columns=['TaxonID'], inplace=True)
-
-                if 'NCBIRank' in df.columns:
-                    df['NCBIRank'] = df['NCBIRank'].fillna(missing_value)
-                else:
-                    df['NCBIRank'] = missing_value
-
-                if 'NCBIDivision' in df.columns:
-                    df['NCBIDivision'] = df['NCBIDivision'].fillna(missing_value)
-                else:
-                    df['NCBIDivision'] = missing_value
-
 
 
     # Ensure the dataframe contains only the columns specified in the dictionary
@@ -332,51 +147,140 @@ def complete_and_fill_REDU_table(df, allowedTerm_dict, add_usi = False, keep_usi
     ignored_columns = input_columns - set(keys_to_include)
     
     for column in ignored_columns:
-        print(f"IGNORED:  {column}")
+        remapping_report.record_ignored(df['MassiveID'], column)
 
     #remove rows if not enough metadata are present
-    def count_non_missing_specific(row, cols):
-        return (row[cols] != "missing value").sum()
-    
-    columns_to_consider = ["SampleType", "SampleTypeSub1", "NCBITaxonomy", "UBERONBodyPartName", "BiologicalSex", 
-                           "AgeInYears", "LifeStage", "Country", "HealthStatus", "SampleExtractionMethod", 
-                           "SampleCollectionMethod", "ComorbidityListDOIDIndex", "DOIDCommonName", 
-                           "DepthorAltitudeMeters", "HumanPopulationDensity", "LatitudeandLongitude",
-                           "ENVOEnvironmentBiome", "ENVOEnvironmentMaterial"]
-    
     original_row_count = df.shape[0]
-    columns_to_check = [col for col in columns_to_consider if col in df.columns]
-    df = df[(df.apply(count_non_missing_specific, cols=columns_to_check, axis=1) >= 1)]
+    df = df[sufficient_metadata_mask(df)]
 
     print(f"Number of rows removed due to not enough metadata: {original_row_count - df.shape[0]}")
     print(f"Returning {len(df)} rows!")
 
-    return df[keys_to_include]
+    df = df[keys_to_include]
 
-def process_filename(filename):
-    path_parts = filename.split('/')
-    for part in path_parts:
-        print(part)
-        if part.endswith('.d'):
-            return '/'.join(path_parts[:path_parts.index(part)+1])
-    return filename
+    if kwargs.get('categorical', False):
+        df = to_categorical_columns(df, allowed_term_index)
+
+    return df
+
+def to_categorical_columns(df, allowed_term_index):
+    """Returns a copy of df with the controlled vocabulary columns converted to lossless categoricals."""
+    df = df.copy()
+    for key in df.columns:
+        if allowed_term_index.is_vocabulary(key):
+            df[key] = df[key].astype(allowed_term_index.categorical_dtype(key, observed=[df[key]]))
+    return df
+
+
+def life_stages(df, missing_value):
+    """LifeStage column: the age category of human samples, missing_value for everything else."""
+    is_human = (df['NCBITaxonomy'] == "9606|Homo sapiens").to_numpy()
+    return pd.Series(np.where(is_human, age_category_series(df['AgeInYears']), missing_value), index=df.index, dtype=object)
+
+
+def unique_subject_ids(df, subject_missing_value, missing_value):
+    """UniqueSubjectID column: '<MassiveID>_<SubjectIdentifierAsRecorded>' where a subject identifier was recorded."""
+    subject = df['SubjectIdentifierAsRecorded']
+    has_subject = (subject != subject_missing_value) & (subject != '') & (subject != 'not applicable') & subject.notna()
+    subject_ids = df['MassiveID'].astype(str) + '_' + subject.astype(str)
+    return subject_ids.where(has_subject, missing_value).astype(object)
+
+
+def sufficient_metadata_mask(df, columns_to_consider=SUFFICIENT_METADATA_COLUMNS):
+    """True for rows with at least one informative column that is not 'missing value'."""
+    columns_to_check = [col for col in columns_to_consider if col in df.columns]
+    return (df[columns_to_check] != "missing value").any(axis=1)
+
+
+class QuoteStrippedFile(io.TextIOBase):
+    """
+    Read-only text file object over a tsv whose lines are wrapped in double quotes, stripped of whitespace and
+    quotes line by line while pandas reads from it.
+    """
+
+    def __init__(self, file):
+        self._lines = (line.strip().strip('"') + '\n' for line in file)
+        self._remainder = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._remainder + ''.join(self._lines)
+            self._remainder = ''
+            return data
+
+        parts = [self._remainder]
+        length = len(self._remainder)
+        for line in self._lines:
+            parts.append(line)
+            length += len(line)
+            if length >= size:
+                break
+
+        data = ''.join(parts)
+        self._remainder = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        if self._remainder:
+            line, newline, self._remainder = self._remainder.partition('\n')
+            return line + newline
+        return next(self._lines, '')
 
 
 def clean_read_tsv_quoted_lines(path):
-    cleaned_data = ''
     with open(path, 'r') as file:
-        for line in file:
-            # Strip leading and trailing whitespace and then strip double quotes
-            cleaned_line = line.strip().strip('"')
-            cleaned_data += cleaned_line + '\n'
+        # the quotes are stripped while pandas parses, without a cleaned copy of the file
+        df = pd.read_csv(QuoteStrippedFile(file), sep='\t')
 
-    # Use StringIO to simulate a file object for pandas
-    cleaned_data_io = StringIO(cleaned_data)
+    return df
 
-    # Now read the cleaned data into a DataFrame
-    df = pd.read_csv(cleaned_data_io, sep='\t')
+def harmonize_metadata_file(file_path, output_metadata_folder, allowed_terms, allowed_term_index, ontology_join, resolution_cache=None, remapping_report=None):
+    """Harmonizes one GitHub/MassIVE metadata tsv and writes it to output_metadata_folder under the same name."""
+    print(f"Processing: {file_path}")
+
+    df = pd.read_csv(file_path, sep='\t')
+
+    if 'ATTRIBUTE_MassiveID' in df.columns:
+        df.rename(columns={'ATTRIBUTE_MassiveID': 'MassiveID'}, inplace=True)
+    if 'ATTRIBUTE_DatasetAccession' in df.columns:
+        df.rename(columns={'ATTRIBUTE_DatasetAccession': 'MassiveID'}, inplace=True)
+
+    #generate extra columns, add missing columns and remove values which are not in allowed terms
+    df = complete_and_fill_REDU_table(df, 
+                                      allowed_terms, 
+                                      allowed_term_index=allowed_term_index,
+                                      ontology_join=ontology_join,
+                                      resolution_cache=resolution_cache,
+                                      remapping_report=remapping_report,
+                                      attempt_adding_file_extensions=True)
+    
+    if len(df) > 0:
+    
+        file_name = os.path.join(output_metadata_folder, os.path.basename(file_path))
+        df.to_csv(file_name, sep='\t', index=False)
+
+    return file_path, len(df)
+
+
+#allowed terms and ontology lookups of a pool worker, set once by _init_harmonize_worker
+_worker_resources = None
+
+def _init_harmonize_worker(resources):
+    global _worker_resources
+    _worker_resources = resources
+
+def _harmonize_metadata_file_in_worker(file_path):
+    """Harmonizes one file, its remapped values and resolution cache hits and misses are returned with it."""
+    resolution_cache = _worker_resources['resolution_cache']
+    resources = dict(_worker_resources, remapping_report=_worker_resources['remapping_report'].empty_copy(),
+                     resolution_cache=resolution_cache.empty_copy() if resolution_cache is not None else None)
+    result = harmonize_metadata_file(file_path, **resources)
+    cache_counts = (resources['resolution_cache'].hits, resources['resolution_cache'].misses) if resolution_cache is not None else (0, 0)
+    return result, resources['remapping_report'], cache_counts
 
-    return df
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='GNPS Validator')
@@ -388,61 +292,94 @@ if __name__ == '__main__':
     parser.add_argument('--path_to_envo_material_csv')
     parser.add_argument('--path_ncbi_rank_division')
     parser.add_argument('--path_to_doid_csv')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes harmonizing files in parallel')
+    parser.add_argument('--resolution_cache', help='SQLite file to reuse term resolutions across files and runs')
+    parser.add_argument('--manifest', help='Write a manifest with the input, allowed terms, ontology and harmonizer code hashes of every file here')
+    parser.add_argument('--previous_manifest', help='Manifest of a previous run, files with unchanged hashes are not processed again')
+    parser.add_argument('--previous_output_folder', help='Output folder of the run that wrote --previous_manifest')
+    parser.add_argument('--remapping_report', help='Write the counts of remapped values and ignored columns to this JSONL file')
+    parser.add_argument('--remapping_verbosity', type=int, choices=[0, 1, 2], default=2,
+                        help='Remapped values printed to the log: 0 none, 1 one line per column, 2 every value')
     args = parser.parse_args()
 
-    with open(args.AllowedTermJson_path, 'r') as json_file:
-        allowed_terms = json.load(json_file)
+    allowed_terms = load_allowed_terms(args.AllowedTermJson_path)
+
+    allowed_term_index = AllowedTermIndex(allowed_terms)
+
+    # only the columns OntologyJoinStage reads
+    uberon_ontology_table = read_ontology_table(args.path_to_uberon_cl_po_csv, columns=['UBERONOntologyIndex', 'Label', 'Is Fluid', 'Is Multicellular'], unique='Label')
 
-    uberon_ontology_table = pd.read_csv(args.path_to_uberon_cl_po_csv, index_col=False)
-    uberon_ontology_table = uberon_ontology_table.drop_duplicates(subset=['Label'])
+    doid_ontology_table = read_ontology_table(args.path_to_doid_csv, columns=['DOIDOntologyIndex', 'UBERONOntologyIndex', 'Label'], unique='Label')
 
-    doid_ontology_table = pd.read_csv(args.path_to_doid_csv, index_col=False)
-    doid_ontology_table = doid_ontology_table.drop_duplicates(subset=['Label'])
+    ENVOEnvironmentBiomeIndex_table = read_ontology_table(args.path_to_envo_biome_csv, columns=['ENVOEnvironmentBiomeIndex', 'Label'], unique='Label')
 
-    ENVOEnvironmentBiomeIndex_table = pd.read_csv(args.path_to_envo_biome_csv, index_col=False)
-    ENVOEnvironmentBiomeIndex_table = ENVOEnvironmentBiomeIndex_table.drop_duplicates(subset=['Label'])
+    ENVOEnvironmentMaterialIndex_table = read_ontology_table(args.path_to_envo_material_csv, columns=['ENVOEnvironmentMaterialIndex', 'Label'], unique='Label')
 
-    ENVOEnvironmentMaterialIndex_table = pd.read_csv(args.path_to_envo_material_csv, index_col=False)
-    ENVOEnvironmentMaterialIndex_table = ENVOEnvironmentMaterialIndex_table.drop_duplicates(subset=['Label'])
+    NCBIRankDivision_table = read_ontology_table(args.path_ncbi_rank_division, unique='TaxonID')
 
-    NCBIRankDivision_table = pd.read_csv(args.path_ncbi_rank_division, index_col = False)
-    NCBIRankDivision_table = NCBIRankDivision_table.drop_duplicates(subset=['TaxonID'])
+    ontology_join = OntologyJoinStage(UBERONOntologyIndex_table=uberon_ontology_table,
+                                      DOIDOntologyIndex_table=doid_ontology_table,
+                                      NCBIRankDivision_table=NCBIRankDivision_table,
+                                      ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
+                                      ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table)
+
+
+    resources = {'output_metadata_folder': args.output_metadata_folder,
+                 'allowed_terms': allowed_terms,
+                 'allowed_term_index': allowed_term_index,
+                 'ontology_join': ontology_join,
+                 'resolution_cache': ResolutionCache(args.resolution_cache, allowed_terms) if args.resolution_cache else None,
+                 'remapping_report': RemappingReport(args.remapping_verbosity)}
 
 
     print('Starting tsv processing.')
-    #for file_path in glob.glob(f"{args.path_to_github_metadata}/redu_*.tsv"):
 
-    all_metadata_files = glob.glob(f"{args.path_to_github_metadata}/*.tsv")
+    #sorted so that the processing order does not depend on the file system
+    all_metadata_files = sorted(glob.glob(f"{args.path_to_github_metadata}/*.tsv"))
 
-    print("Processing", len(all_metadata_files), "files")
-   
+    #incremental mode: reuse the previous output of files whose input, allowed terms, ontology tables and harmonizer code are unchanged
+    allowed_terms_sha256 = sha256_file(args.AllowedTermJson_path)
+    ontology_sha256 = sha256_files([args.path_to_uberon_cl_po_csv, args.path_to_doid_csv, args.path_to_envo_biome_csv,
+                                    args.path_to_envo_material_csv, args.path_ncbi_rank_division])
+    harmonizer_sha256 = code_sha256([os.path.abspath(__file__)] + [sys.modules[name].__file__ for name in HARMONIZER_MODULES])
+    previous_manifest = load_manifest(args.previous_manifest)
 
+    manifest = {}
+    files_to_process = []
     for file_path in all_metadata_files:
-    #for file_path in ["/home/yasin/projects/ReDU_metadata/metadata/redu_MSV000093329.tsv"]:
-        
-        #if re.match(r'.*redu_MSV\d+\.tsv$', file_path):
-        if True:
-
-            print(f"Processing: {file_path}")
-
-            df = pd.read_csv(file_path, sep='\t')
-
-            if 'ATTRIBUTE_MassiveID' in df.columns:
-                df.rename(columns={'ATTRIBUTE_MassiveID': 'MassiveID'}, inplace=True)
-            if 'ATTRIBUTE_DatasetAccession' in df.columns:
-                df.rename(columns={'ATTRIBUTE_DatasetAccession': 'MassiveID'}, inplace=True)
-
-            #generate extra columns, add missing columns and remove values which are not in allowed terms
-            df = complete_and_fill_REDU_table(df, 
-                                              allowed_terms, 
-                                              UBERONOntologyIndex_table=uberon_ontology_table, 
-                                              DOIDOntologyIndex_table=doid_ontology_table, 
-                                              NCBIRankDivision_table=NCBIRankDivision_table,
-                                              ENVOEnvironmentBiomeIndex_table=ENVOEnvironmentBiomeIndex_table,
-                                              ENVOEnvironmentMaterialIndex_table=ENVOEnvironmentMaterialIndex_table,
-                                              attempt_adding_file_extensions=True)
-            
-            if len(df) > 0:
-            
-                file_name = os.path.join(args.output_metadata_folder, os.path.basename(file_path))
-                df.to_csv(file_name, sep='\t', index=False)
+        file_name = os.path.basename(file_path)
+        manifest[file_name] = manifest_entry(file_path, allowed_terms_sha256, ontology_sha256, harmonizer_sha256)
+        if reuse_previous_output(previous_manifest.get(file_name), manifest[file_name], args.previous_output_folder, args.output_metadata_folder):
+            resources['remapping_report'].add_records(manifest[file_name]['remapping'])
+        else:
+            files_to_process.append(file_path)
+
+    print("Reusing previous output of", len(all_metadata_files) - len(files_to_process), "unchanged files")
+    print("Processing", len(files_to_process), "files")
+
+    if args.workers > 1:
+        # the tables are handed to each worker once; with the default fork start method they are shared copy-on-write
+        with multiprocessing.Pool(args.workers, initializer=_init_harmonize_worker, initargs=(resources,)) as pool:
+            outputs = list(pool.imap(_harmonize_metadata_file_in_worker, files_to_process))
+    else:
+        _init_harmonize_worker(resources)
+        outputs = [_harmonize_metadata_file_in_worker(file_path) for file_path in files_to_process]
+
+    for (file_path, n_rows), file_remapping_report, (hits, misses) in outputs:
+        resources['remapping_report'].update(file_remapping_report)
+        if resources['resolution_cache'] is not None:
+            resources['resolution_cache'].hits += hits
+            resources['resolution_cache'].misses += misses
+        if n_rows > 0:
+            manifest[os.path.basename(file_path)]['output'] = os.path.basename(file_path)
+        # kept in the manifest for the runs that reuse this output
+        manifest[os.path.basename(file_path)]['remapping'] = list(file_remapping_report.records())
+
+    if resources['resolution_cache'] is not None:
+        resources['resolution_cache'].report()
+
+    if args.manifest:
+        write_manifest(args.manifest, manifest)
+
+    if args.remapping_report:
+        resources['remapping_report'].write(args.remapping_report)
@@ -0,0 +1,280 @@
+import re
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+
+#rule types by name, filled by register_rule
+RULE_TYPES = {}
+
+#compiled schemas of this process by id of the allowed terms dictionary, the dictionary is kept so its id stays unique
+_compiled_schemas = {}
+_MAX_COMPILED_SCHEMAS = 8
+
+
+def register_rule(name):
+    """
+    Class decorator adding a ColumnRule subclass to RULE_TYPES. A column of allowed_terms.json can name its
+    rule explicitly with "rule": "<name>", otherwise compile_schema infers it as before.
+    """
+    def decorator(rule_class):
+        rule_class.rule_name = name
+        RULE_TYPES[name] = rule_class
+        return rule_class
+    return decorator
+
+
+def infer_rule_name(key, value):
+    """The rule complete_and_fill_REDU_table applied to a column before it had a compiled schema."""
+    allowed_values = value['allowed_values']
+    if key not in ['NCBITaxonomy', 'MassSpectrometer', 'filename'] and len(allowed_values) > 1:
+        return 'vocabulary'
+    if key == 'NCBITaxonomy':
+        return 'ncbi_taxonomy'
+    if key == 'MassSpectrometer':
+        return 'mass_spectrometer'
+    if len(allowed_values) > 0 and allowed_values[0] == '00':
+        return 'any'
+    if len(allowed_values) > 0 and allowed_values[0] == 'numeric':
+        return 'numeric'
+    if len(allowed_values) > 0 and allowed_values[0] == 'numeric|numeric':
+        return 'numeric_pair'
+    if key == 'filename':
+        return 'file_extension'
+    # complete_and_fill_REDU_table had no rule for these either
+    raise ValueError(f"{key}: no rule for {len(allowed_values)} allowed value(s), set one with \"rule\" in allowed_terms.json")
+
+
+def compile_schema(allowedTerm_dict):
+    """
+    Returns the list of column rules of allowedTerm_dict, one per column that is not generated, in the order of
+    the dictionary. The list is compiled once per dictionary and process.
+    """
+    cached = _compiled_schemas.get(id(allowedTerm_dict))
+    if cached is not None and cached[0] is allowedTerm_dict:
+        return cached[1]
+
+    schema = []
+    for key, value in allowedTerm_dict.items():
+        if value['generate'] != 'False':
+            continue
+        rule_name = value['rule'] if 'rule' in value else infer_rule_name(key, value)
+        if rule_name not in RULE_TYPES:
+            raise ValueError(f"{key}: unknown rule '{rule_name}', expected one of {sorted(RULE_TYPES)}")
+        schema.append(RULE_TYPES[rule_name](key, value))
+
+    if len(_compiled_schemas) >= _MAX_COMPILED_SCHEMAS:
+        _compiled_schemas.clear()
+    _compiled_schemas[id(allowedTerm_dict)] = (allowedTerm_dict, schema)
+    return schema
+
+
+#a number as the former per-value check accepted it: leading '-', digits with at most one '.' anywhere
+_NUMBER = r'-*(?:[0-9]+\.?[0-9]*|\.[0-9]+)'
+_NUMERIC_PAIR = re.compile(rf'{_NUMBER}(?:\|{_NUMBER})*')
+
+
+def _is_numeric_pair(value):
+    return all(part.replace('.', '', 1).isdigit() or part.lstrip('-').replace('.', '', 1).isdigit() for part in value.split('|'))
+
+
+def numeric_pair_mask(values):
+    """True for values whose '|'-separated parts are all digits after removing leading '-' and one '.', e.g. '32.88|-117.24'."""
+    values = pd.Series(values, dtype=object).astype(str)
+    mask = values.str.fullmatch(_NUMERIC_PAIR).to_numpy(dtype=bool)
+    # str.isdigit also accepts non-ASCII digits such as '²', which the ASCII expression does not match
+    for i in np.flatnonzero(~mask & ~values.map(str.isascii).to_numpy(dtype=bool)):
+        mask[i] = _is_numeric_pair(values.iat[i])
+    return mask
+
+
+def file_extension_mask(values, extensions):
+    """True for values ending in one of extensions, ignoring case."""
+    extensions = tuple(ext.lower() for ext in extensions)
+    return pd.Series(values, dtype=object).astype(str).str.lower().str.endswith(extensions).to_numpy(dtype=bool)
+
+
+def resolve_unique_values(key, unique_values, resolve_function, resolution_cache=None):
+    """Returns {observed value: resolve_function(observed value)}, served from resolution_cache where possible."""
+    if resolution_cache is None:
+        return {observed_value: resolve_function(observed_value) for observed_value in unique_values}
+    return resolution_cache.resolve(key, unique_values, resolve_function)
+
+
+def apply_value_map(column, value_map, missing_value):
+    """Maps column with value_map, values without an entry and empty results become missing_value."""
+    return column.map(value_map).fillna(missing_value).replace("", missing_value)
+
+
+def validate_vocabulary_column(column, key, allowed_term_index, missing_value, resolution_cache=None):
+    """
+    Validates a vocabulary column by its category codes, resolving only the unique values that are not allowed terms.
+
+    Returns:
+    The validated column (object dtype) and the map of the values that were not allowed terms to their replacement.
+    """
+    categories = allowed_term_index.categories(key)
+    codes = categories.get_indexer(column)
+    unmatched = codes < 0
+
+    value_map = resolve_unique_values(key, pd.unique(column[unmatched]),
+                                      lambda observed_value: allowed_term_index.match_normalized(key, observed_value, missing_value),
+                                      resolution_cache)
+    if value_map:
+        resolved = column[unmatched].map(value_map).replace("", missing_value)
+        codes[unmatched] = categories.get_indexer(resolved)
+
+    return pd.Series(np.asarray(categories, dtype=object)[codes], index=column.index, dtype=object), value_map
+
+
+class ColumnRule(ABC):
+    """
+    Validation of one REDU column from its entry in allowed_terms.json. Called with the column, a rule returns the
+    validated column and the map of observed values to their replacement, or None if nothing is logged.
+
+    Args:
+    key: The column name.
+    value: The entry of the column in allowed_terms.json.
+    """
+
+    rule_name = None
+
+    def __init__(self, key, value):
+        self.key = key
+        self.allowed_values = value['allowed_values']
+        self.missing_value = value['missing']
+
+    @abstractmethod
+    def __call__(self, column, allowed_term_index, resolution_cache=None, other_allowed_file_extensions=()):
+        pass
+
+
+class ValueMapRule(ColumnRule):
+    """
+    A rule deciding per unique value, subclasses implement resolve. With cache_resolutions the decisions are
+    looked up in and stored to the resolution cache of the call.
+    """
+
+    cache_resolutions = False
+
+    @abstractmethod
+    def resolve(self, observed_value, allowed_term_index):
+        pass
+
+    def value_map(self, unique_values, allowed_term_index, resolution_cache=None, other_allowed_file_extensions=()):
+        if self.cache_resolutions:
+            return resolve_unique_values(self.key, unique_values, lambda x: self.resolve(x, allowed_term_index), resolution_cache)
+        return {x: self.resolve(x, allowed_term_index) for x in unique_values}
+
+    def __call__(self, column, allowed_term_index, resolution_cache=None, other_allowed_file_extensions=()):
+        value_map = self.value_map(column.unique(), allowed_term_index, resolution_cache, other_allowed_file_extensions)
+        return apply_value_map(column, value_map, self.missing_value), value_map
+
+
+@register_rule('vocabulary')
+class VocabularyRule(ColumnRule):
+    """Allowed terms, matched exactly or ignoring whitespace."""
+
+    def __call__(self, column, allowed_term_index, resolution_cache=None, other_allowed_file_extensions=()):
+        return validate_vocabulary_column(column, self.key, allowed_term_index, self.missing_value, resolution_cache)
+
+
+def _split_id_name(term: str):
+    term = "" if term is None else str(term)
+    if "|" in term:
+        tid, tname = term.split("|", 1)
+        return tid.strip(), tname.strip()
+    return None, term.strip()
+
+def _is_sp_or_spp(name: str) -> bool:
+    toks = name.strip().split()
+    return len(toks) >= 2 and toks[1].rstrip(".").lower() in {"sp", "spp"}
+
+def _genus_from_name(name: str) -> str:
+    return name.strip().split()[0] if name.strip() else ""
+
+
+@register_rule('ncbi_taxonomy')
+class NCBITaxonomyRule(ValueMapRule):
+    """'ID|Name' terms, resolved by genus for 'Genus sp.', the exact term, the taxon ID or the name."""
+
+    cache_resolutions = True
+
+    def resolve(self, observed_value, allowed_term_index):
+        # observed_value like '1931|Streptomyces sp.' or '1883|Streptomyces' or just 'Streptomyces sp.'
+        taxonomy = allowed_term_index.taxonomy
+        allowed_by_name_ci = taxonomy.by_name
+        oid, oname = _split_id_name(observed_value)
+
+        # 1) Prefer genus mapping if looks like 'Genus sp.' / 'Genus spp.' (even if exact value is allowed)
+        if oname and _is_sp_or_spp(oname):
+            genus = _genus_from_name(oname)
+            hit = allowed_by_name_ci.get(genus.lower())
+            if hit:
+                return hit  # e.g., '1883|Streptomyces'
+
+        # 2) Exact allowed term
+        if observed_value in taxonomy.terms:
+            return observed_value
+
+        # 3) Same ID → allowed term
+        if oid and oid in taxonomy.by_id:
+            return taxonomy.by_id[oid]
+
+        # 4) Same Name (case-insensitive) → allowed term
+        if oname:
+            hit = allowed_by_name_ci.get(oname.lower())
+            if hit:
+                return hit
+
+        # 5) No match
+        return self.missing_value
+
+
+@register_rule('mass_spectrometer')
+class MassSpectrometerRule(ValueMapRule):
+    """'Name|Accession' terms, resolved by the exact term, then the same name, then the same accession."""
+
+    cache_resolutions = True
+
+    def resolve(self, observed_value, allowed_term_index):
+        return allowed_term_index.mass_spectrometers.resolve(observed_value, self.missing_value)
+
+
+@register_rule('any')
+class AnyValueRule(ValueMapRule):
+    """'00': any value that is not empty."""
+
+    def resolve(self, observed_value, allowed_term_index):
+        return observed_value if pd.notna(observed_value) and observed_value != "" else self.missing_value
+
+
+@register_rule('numeric')
+class NumericRule(ColumnRule):
+    """'numeric': the column is converted to numbers, anything else becomes the missing value. Nothing is logged."""
+
+    def __call__(self, column, allowed_term_index, resolution_cache=None, other_allowed_file_extensions=()):
+        return pd.to_numeric(column, errors='coerce').fillna(self.missing_value).replace("", self.missing_value), None
+
+
+@register_rule('numeric_pair')
+class NumericPairRule(ColumnRule):
+    """'numeric|numeric': numbers separated by '|', e.g. latitude and longitude."""
+
+    def __call__(self, column, allowed_term_index, resolution_cache=None, other_allowed_file_extensions=()):
+        unique_values = column.unique()
+        value_map = dict(zip(unique_values, np.where(numeric_pair_mask(unique_values), unique_values, self.missing_value)))
+        return apply_value_map(column, value_map, self.missing_value), value_map
+
+
+@register_rule('file_extension')
+class FileExtensionRule(ColumnRule):
+    """Values ending in one of the allowed extensions or the other_allowed_file_extensions of the call, ignoring case."""
+
+    def __call__(self, column, allowed_term_index, resolution_cache=None, other_allowed_file_extensions=()):
+        unique_values = column.unique()
+        mask = file_extension_mask(unique_values, list(self.allowed_values) + list(other_allowed_file_extensions))
+        value_map = dict(zip(unique_values, np.where(mask, unique_values, self.missing_value)))
+        return apply_value_map(column, value_map, self.missing_value), value_map
+
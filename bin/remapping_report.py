@@ -0,0 +1,81 @@
+import json
+import os
+from collections import Counter
+
+import pandas as pd
+
+
+class RemappingReport:
+    """
+    Counts of the values complete_and_fill_REDU_table remapped and of the columns it ignored, per dataset.
+
+    Args:
+    verbosity: 0: print nothing, 1: one line per remapped or ignored column, 2: every remapped value.
+    """
+
+    def __init__(self, verbosity=0):
+        self.verbosity = verbosity
+        self.remapped = Counter()
+        self.ignored = Counter()
+
+    def empty_copy(self):
+        return RemappingReport(self.verbosity)
+
+    def record_remapping(self, datasets, column_name, observed, value_map):
+        """
+        Counts the rows of observed whose value value_map changes.
+
+        Args:
+        datasets: The MassiveID of every row.
+        column_name: The name of the column.
+        observed: The column before the mapping.
+        value_map: Observed value -> mapped value, as returned by the column rule.
+        """
+        changed = {k: v for k, v in value_map.items() if k != v}
+        if not changed:
+            return
+
+        if self.verbosity >= 2:
+            print(f"{column_name}:")
+            for k, v in changed.items():
+                print(f"  {k}: {v}")
+        elif self.verbosity == 1:
+            print(f"{column_name}: {len(changed)} values remapped")
+
+        is_changed = observed.isin(list(changed)).to_numpy()
+        counts = pd.DataFrame({'dataset': datasets.to_numpy()[is_changed], 'observed': observed.to_numpy()[is_changed]}).value_counts(sort=False)
+        for (dataset, observed_value), count in counts.items():
+            self.remapped[(dataset, column_name, observed_value, changed[observed_value])] += int(count)
+
+    def record_ignored(self, datasets, column_name):
+        """Counts the rows per dataset that had the ignored column column_name."""
+        if self.verbosity >= 1:
+            print(f"IGNORED:  {column_name}")
+        for dataset, count in datasets.value_counts(sort=False).items():
+            self.ignored[(dataset, column_name)] += int(count)
+
+    def update(self, other):
+        self.remapped.update(other.remapped)
+        self.ignored.update(other.ignored)
+
+    def add_records(self, records):
+        """Counts records as written by write, e.g. those kept in a harmonize manifest."""
+        for record in records:
+            if record['kind'] == 'remapped':
+                self.remapped[(record['dataset'], record['column'], record['observed'], record['mapped'])] += record['count']
+            else:
+                self.ignored[(record['dataset'], record['column'])] += record['count']
+
+    def records(self):
+        for (dataset, column_name, observed, mapped), count in sorted(self.remapped.items()):
+            yield {'kind': 'remapped', 'dataset': dataset, 'column': column_name, 'observed': observed, 'mapped': mapped, 'count': count}
+        for (dataset, column_name), count in sorted(self.ignored.items()):
+            yield {'kind': 'ignored', 'dataset': dataset, 'column': column_name, 'count': count}
+
+    def write(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            for record in self.records():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"Remapping report {path}: {len(self.remapped)} remapped and {len(self.ignored)} ignored entries")
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+
+#bump when the resolution logic in complete_and_fill_REDU_table changes, so older entries are not reused
+RESOLUTION_VERSION = 1
+
+#stay below the host parameter limit of older SQLite builds
+_QUERY_CHUNK_SIZE = 500
+
+
+class ResolutionCache:
+    """
+    SQLite memo of the value maps of complete_and_fill_REDU_table, by column, observed value and a hash of the
+    allowed terms of the column. The connection is opened per process.
+
+    Args:
+    path: The SQLite file, created if it does not exist.
+    allowedTerm_dict: The dictionary loaded from allowed_terms.json.
+    """
+
+    def __init__(self, path, allowedTerm_dict):
+        self.path = path
+        self.allowedTerm_dict = allowedTerm_dict
+        self.hits = 0
+        self.misses = 0
+        self._terms_hashes = {}
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    def empty_copy(self):
+        """The same cache with hit and miss counts of its own, e.g. for one file."""
+        cache = ResolutionCache(self.path, self.allowedTerm_dict)
+        cache._terms_hashes = self._terms_hashes
+        cache._connection, cache._pid = self._connect(), self._pid
+        return cache
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS resolutions ('
+                                     'column_name TEXT NOT NULL, terms_hash TEXT NOT NULL, observed TEXT NOT NULL, resolved TEXT NOT NULL, '
+                                     'PRIMARY KEY (column_name, terms_hash, observed)) WITHOUT ROWID')
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def terms_hash(self, key):
+        """Content hash of the allowed values and missing value of a column."""
+        if key not in self._terms_hashes:
+            content = json.dumps([RESOLUTION_VERSION, self.allowedTerm_dict[key]['allowed_values'], self.allowedTerm_dict[key]['missing']],
+                                 ensure_ascii=False)
+            self._terms_hashes[key] = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return self._terms_hashes[key]
+
+    def resolve(self, key, observed_values, resolve_function):
+        """
+        Returns {observed value: resolved value} in the order of observed_values. Values not in the cache are
+        resolved with resolve_function and stored.
+        """
+        observed_values = [str(observed_value) for observed_value in observed_values]
+        connection = self._connect()
+        terms_hash = self.terms_hash(key)
+
+        cached = {}
+        for start in range(0, len(observed_values), _QUERY_CHUNK_SIZE):
+            chunk = observed_values[start:start + _QUERY_CHUNK_SIZE]
+            rows = connection.execute(f"SELECT observed, resolved FROM resolutions WHERE column_name = ? AND terms_hash = ? "
+                                      f"AND observed IN ({','.join('?' * len(chunk))})", [key, terms_hash] + chunk)
+            cached.update(rows)
+
+        value_map = {}
+        new_rows = []
+        for observed_value in observed_values:
+            if observed_value in cached:
+                value_map[observed_value] = cached[observed_value]
+            elif observed_value not in value_map:
+                value_map[observed_value] = resolve_function(observed_value)
+                new_rows.append((key, terms_hash, observed_value, value_map[observed_value]))
+
+        self.hits += len(value_map) - len(new_rows)
+        self.misses += len(new_rows)
+
+        if new_rows:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?)', new_rows)
+
+        return value_map
+
+    def report(self):
+        print(f"Resolution cache {self.path}: {self.hits} hits, {self.misses} misses")
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+
+#resolvers of the allowed_values lists they were built for, kept with the list so its id stays valid
+_resolvers = {}
+_MAX_CACHED_RESOLVERS = 4
+
+
+class TaxonomyResolver:
+    """
+    Maps over the allowed NCBITaxonomy terms ('ID|Name'), built once per allowed_values list when first used.
+    first_by_id/first_by_name keep the first term of a key like the converters, by_id/by_name the last one like
+    the harmonizer.
+
+    Args:
+    allowed_values: The allowed NCBITaxonomy terms.
+    """
+
+    def __init__(self, allowed_values):
+        self.allowed_values = allowed_values
+        self._terms = None
+        self._first = None
+        self._last = None
+
+    @classmethod
+    def cached(cls, allowed_values):
+        """The resolver of allowed_values, built once per process for the same list."""
+        key = id(allowed_values)
+        if key not in _resolvers or _resolvers[key].allowed_values is not allowed_values:
+            if len(_resolvers) >= _MAX_CACHED_RESOLVERS:
+                _resolvers.pop(next(iter(_resolvers)))
+            _resolvers[key] = cls(allowed_values)
+        return _resolvers[key]
+
+    @property
+    def terms(self):
+        if self._terms is None:
+            self._terms = set(self.allowed_values)
+        return self._terms
+
+    def _build_first(self):
+        first_by_id = {}
+        first_by_name = {}
+        for term in self.allowed_values:
+            parts = term.split('|')
+            if len(parts) == 2:
+                first_by_id.setdefault(parts[0], term)
+                first_by_name.setdefault(parts[1].lower(), term)
+        self._first = (first_by_id, first_by_name)
+
+    def _build_last(self):
+        by_id = {}
+        by_name = {}
+        for term in self.allowed_values:
+            if "|" in term:
+                tid, tname = term.split("|", 1)
+                by_id[tid.strip()] = term
+                by_name[tname.strip().lower()] = term
+        self._last = (by_id, by_name)
+
+    @property
+    def first_by_id(self):
+        if self._first is None:
+            self._build_first()
+        return self._first[0]
+
+    @property
+    def first_by_name(self):
+        """Lower-cased taxon name -> the first allowed 'ID|Name' term with it."""
+        if self._first is None:
+            self._build_first()
+        return self._first[1]
+
+    @property
+    def by_id(self):
+        if self._last is None:
+            self._build_last()
+        return self._last[0]
+
+    @property
+    def by_name(self):
+        """Stripped, lower-cased taxon name -> the last allowed 'ID|Name' term with it."""
+        if self._last is None:
+            self._build_last()
+        return self._last[1]
+
+    def match(self, organism_name, ncbi_id='', name_index=None):
+        """
+        Allowed term of an organism: the term of ncbi_id if it is numeric and allowed, else the term with the
+        organism name, else the term of the taxid the name has in name_index (a TaxonomyNameIndex). None if none.
+        """
+        ncbi_id = str(ncbi_id)
+        try:
+            int(ncbi_id)
+        except ValueError:
+            ncbi_id = ''
+
+        if ncbi_id != '' and ncbi_id in self.first_by_id:
+            return self.first_by_id[ncbi_id]
+
+        hit = self.first_by_name.get(str(organism_name).lower())
+        if hit is None and name_index is not None:
+            name_taxid = name_index.lookup(organism_name)
+            if name_taxid is not None:
+                hit = self.first_by_id.get(str(name_taxid))
+        return hit
+
+    def resolve(self, organism_names, name_index=None):
+        """
+        Batch match by name: Series of the allowed term per entry of organism_names (same index if it is a
+        Series), None where there is none. Names missing from the allowed terms are looked up in name_index together.
+        """
+        # names are matched as str like in match, so None and NaN need no special handling
+        organism_names = pd.Series(organism_names, dtype=object)
+        keys = organism_names.astype(str)
+        unique_keys = pd.Index(keys.unique())
+
+        # dict.get per name, Series.map would first turn the whole map into a Series
+        first_by_name = self.first_by_name
+        hits = np.array([first_by_name.get(key) for key in unique_keys.str.lower()], dtype=object)
+        missing = pd.isna(hits)
+        if name_index is not None and missing.any():
+            name_taxids = name_index.resolve(unique_keys[missing])['taxid']
+            hits[missing] = [None if pd.isna(taxid) else self.first_by_id.get(str(taxid)) for taxid in name_taxids]
+
+        return pd.Series(hits[unique_keys.get_indexer(keys)], index=organism_names.index, dtype=object)
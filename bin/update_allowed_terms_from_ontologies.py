@@ -3,97 +3,35 @@ import argparse
 import json
 from REDU_conversion_functions import get_uberon_table
 from REDU_conversion_functions import get_ontology_table
+from ncbi_dmp import read_names_dmp, format_taxonomy_terms
+from allowed_terms_store import write_allowed_terms_store
+from ontology_cache import set_ontology_cache, set_owl_reader, OWL_READERS
+
+def update_allowed_terms(allowedTerm_dict, scientific_names_df=None, bodypart_tables=None, envBiome_onto=None,
+                         envMaterial_onto=None, doid_df=None, ms_df=None):
+    """
+    Replaces the allowed values of allowedTerm_dict with the terms of the given tables, columns without a table are kept.
+
+    Args:
+    scientific_names_df: ncbi_id and taxaname of the scientific names in names.dmp.
+    bodypart_tables: The UBERON, CL and PO tables (get_uberon_table, get_ontology_table).
+    envBiome_onto, envMaterial_onto: The ENVO biome and material tables.
+    doid_df: The DOID table with DOIDOntologyIndex.
+    ms_df: The MS table of the MS_1000031 descendants.
+    """
+    if scientific_names_df is not None:
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='update allowed terms json')
-    parser.add_argument('path_to_allowed_terms_json')
-    parser.add_argument('--path_to_ncbi_dump', default = 'none')
-    parser.add_argument('--path_to_uberon_owl', default = 'none')
-    parser.add_argument('--path_to_po_owl', default = 'none')
-    parser.add_argument('--path_to_cl_owl', default = 'none')
-    parser.add_argument('--path_to_doid_owl', default = 'none')
-    parser.add_argument('--path_to_ms_owl', default = 'none')
-    parser.add_argument('--path_to_biome_envs_owl', default = 'none')
-    parser.add_argument('--path_to_material_envs_owl', default = 'none')
-    args = parser.parse_args()
-
-    #ncbi_dump can be downloaded from https://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdmp.zip 
-    #after unzipping the file we need is named names.dmp
-
-    #uberon_owl can be downloaded from http://aber-owl.net/ontology/UBERON/#/Download
-    #always take the latest verion!
-
-    #po_owl can be downloaded from http://aber-owl.net/ontology/PO/#/Download
-    #always take the latest verion!
-
-    #cl_owl can be downloaded from http://aber-owl.net/ontology/CL/#/Download
-    #always take the latest verion!
-
-    #doid_owl can be downloaded from http://aber-owl.net/ontology/DOID/#/Download
-    #always take the latest verion!
-
-    #ms_owl can be downloaded from http://aber-owl.net/ontology/MS/#/Download
-    #always take the latest verion!
-
-    #envo_bimoe can be downloaded from https://github.com/EnvironmentOntology/envo/blob/master/subsets/biome-hierarchy.owl
-    #always take the latest verion!
-
-    #envo_material can be downloaded from https://github.com/EnvironmentOntology/envo/blob/master/subsets/material-hierarchy.owl
-    #always take the latest verion!
-
-
-    # Load allowed Terms json
-    print('Reading allowed terms json!')
-    with open(args.path_to_allowed_terms_json, 'r') as file:
-        allowedTerm_dict = json.load(file)
-
-
-    #update from path_to_ncbi_dump
-    ############
-    if args.path_to_ncbi_dump != 'none':
-
-        
         print('Updating NCBIs!')
 
-        df = pd.read_csv(
-            args.path_to_ncbi_dump,
-            sep='\t\|\t',  
-            engine='python',
-            header=None,
-            usecols=[0, 1, 2, 3],
-            names=['ncbi_id', 'taxaname', 'unique_name', 'name_class'],
-            dtype=str,
-            lineterminator='\n'
-    )
-        
-        df['name_class'] = df['name_class'].str.rstrip('\t|')
-
-        # Now, filter for scientific names
-        scientific_names_df = df[df['name_class'].str.strip() == 'scientific name'].copy()
-
-        # Drop the 'unique_name' and 'name_class' columns as they are no longer needed
-        scientific_names_df = scientific_names_df.drop(['unique_name', 'name_class'], axis=1)
-
-        # Reset index
-        scientific_names_df.reset_index(drop=True, inplace=True)
-
         # Make REDU formatted taxas 
-        redu_formatted_ncbis = scientific_names_df.apply(lambda x: f'{x["ncbi_id"]}|{x["taxaname"]}', axis=1).to_frame(name='redu_ncbis')
-
+        allowedTerm_dict['NCBITaxonomy']['allowed_values'] = format_taxonomy_terms(scientific_names_df['ncbi_id'], scientific_names_df['taxaname'])
 
-        allowedTerm_dict['NCBITaxonomy']['allowed_values'] = redu_formatted_ncbis['redu_ncbis'].tolist()
 
-
-    if args.path_to_uberon_owl != 'none' and args.path_to_po_owl != 'none' and args.path_to_cl_owl != 'none':
+    if bodypart_tables is not None:
         
         print('Updating bodyparts!')
 
-        uberon_df = get_uberon_table(args.path_to_uberon_owl)
-        cl_df = get_ontology_table(args.path_to_cl_owl, ont_prefix = 'CL_')
-        po_df = get_ontology_table(args.path_to_po_owl, ont_prefix = 'PO_', rm_synonym_info = True)
-
-
-        combined_df = pd.concat([uberon_df, cl_df, po_df])
+        combined_df = pd.concat(bodypart_tables)
 
         # Get unique values for 'Label'
         unique_labels = combined_df['Label'].unique().tolist()
@@ -107,10 +45,9 @@ if __name__ == "__main__":
 
 
     #environment ontology
-    if args.path_to_biome_envs_owl != 'none' and args.path_to_material_envs_owl != 'none':
+    if envBiome_onto is not None and envMaterial_onto is not None:
 
         print('Processing environmental biome ontology,..')
-        envBiome_onto = get_ontology_table(args.path_to_biome_envs_owl, ont_prefix = 'ENVO_', index_column_name = 'ENVOEnvironmentBiomeIndex')
         unique_labels = envBiome_onto['Label'].unique().tolist()
         unique_indexes = envBiome_onto['ENVOEnvironmentBiomeIndex'].str.replace("_", ":").unique().tolist()
 
@@ -127,7 +64,6 @@ if __name__ == "__main__":
 
 
         print('Processing environmental material ontology,..')
-        envMaterial_onto = get_ontology_table(args.path_to_material_envs_owl, ont_prefix = 'ENVO_', index_column_name = 'ENVOEnvironmentMaterialIndex')
         unique_labels = envMaterial_onto['Label'].unique().tolist()
         unique_indexes = envMaterial_onto['ENVOEnvironmentMaterialIndex'].str.replace("_", ":").unique().tolist()
 
@@ -139,17 +75,15 @@ if __name__ == "__main__":
         allowedTerm_dict['ENVOMediumScaleIndex']['allowed_values'] = unique_indexes
 
 
-    if args.path_to_doid_owl != 'none':
+    if doid_df is not None:
         
         print('Updating diseases!')
 
-        doid_df = get_ontology_table(args.path_to_doid_owl, ont_prefix = 'DOID_')
-
         # Get unique values for 'Label'
         unique_labels = doid_df['Label'].unique().tolist()
 
-        # Get unique values for 'DOIDOntologyIndex' (ignore the wrong UBERONOntologyIndex name)
-        unique_doid_indexes = doid_df['UBERONOntologyIndex'].str.replace("_", ":").unique().tolist()
+        # Get unique values for 'DOIDOntologyIndex'
+        unique_doid_indexes = doid_df['DOIDOntologyIndex'].str.replace("_", ":").unique().tolist()
 
 
         allowedTerm_dict['DOIDCommonName']['allowed_values'] = unique_labels
@@ -157,12 +91,11 @@ if __name__ == "__main__":
 
 
 
-    if args.path_to_ms_owl != 'none':
+    if ms_df is not None:
 
         print('Updating mass spectrometers!')
 
-        ms_df = get_ontology_table(args.path_to_ms_owl, ont_prefix = 'MS_', descendant_node='MS_1000031')
-        ms_df.reset_index(drop=True, inplace=True)
+        ms_df = ms_df.reset_index(drop=True)
 
         # Make REDU formatted taxas 
         ms_df = ms_df.apply(lambda x: f'{x["Label"]}|{x["UBERONOntologyIndex"].replace("_", ":")}', axis=1).to_frame(name='redu_ms')
@@ -171,8 +104,92 @@ if __name__ == "__main__":
 
         allowedTerm_dict['MassSpectrometer']['allowed_values'] = unique_labels
 
+    return allowedTerm_dict
+
+
+def write_allowed_terms(allowedTerm_dict, json_path='allowed_terms.json', store_path='allowed_terms.sqlite'):
+    with open(json_path , 'w') as json_file:
+        json.dump(allowedTerm_dict, json_file, indent=4)
+
+    # the store lets the converters and the harmonizer load the terms without parsing the json
+    write_allowed_terms_store(allowedTerm_dict, store_path, source_json=json_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='update allowed terms json')
+    parser.add_argument('path_to_allowed_terms_json')
+    parser.add_argument('--path_to_ncbi_dump', default = 'none')
+    parser.add_argument('--path_to_uberon_owl', default = 'none')
+    parser.add_argument('--path_to_po_owl', default = 'none')
+    parser.add_argument('--path_to_cl_owl', default = 'none')
+    parser.add_argument('--path_to_doid_owl', default = 'none')
+    parser.add_argument('--path_to_ms_owl', default = 'none')
+    parser.add_argument('--path_to_biome_envs_owl', default = 'none')
+    parser.add_argument('--path_to_material_envs_owl', default = 'none')
+    parser.add_argument('--ontology_cache', help='Folder of parsed ontologies to reuse across runs (optional)', default=None)
+    parser.add_argument('--owl_reader', choices=OWL_READERS, default='owlready2', help='Read the OWL files with owlready2 or the streaming reader')
+    args = parser.parse_args()
+
+    #ncbi_dump can be downloaded from https://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdmp.zip 
+    #after unzipping the file we need is named names.dmp
+
+    #uberon_owl can be downloaded from http://aber-owl.net/ontology/UBERON/#/Download
+    #always take the latest verion!
+
+    #po_owl can be downloaded from http://aber-owl.net/ontology/PO/#/Download
+    #always take the latest verion!
+
+    #cl_owl can be downloaded from http://aber-owl.net/ontology/CL/#/Download
+    #always take the latest verion!
+
+    #doid_owl can be downloaded from http://aber-owl.net/ontology/DOID/#/Download
+    #always take the latest verion!
+
+    #ms_owl can be downloaded from http://aber-owl.net/ontology/MS/#/Download
+    #always take the latest verion!
+
+    #envo_bimoe can be downloaded from https://github.com/EnvironmentOntology/envo/blob/master/subsets/biome-hierarchy.owl
+    #always take the latest verion!
+
+    #envo_material can be downloaded from https://github.com/EnvironmentOntology/envo/blob/master/subsets/material-hierarchy.owl
+    #always take the latest verion!
+
+
+    # Load allowed Terms json
+    print('Reading allowed terms json!')
+    with open(args.path_to_allowed_terms_json, 'r') as file:
+        allowedTerm_dict = json.load(file)
+
+    scientific_names_df = bodypart_tables = envBiome_onto = envMaterial_onto = doid_df = ms_df = None
+
+    #update from path_to_ncbi_dump
+    ############
+    if args.path_to_ncbi_dump != 'none':
+        # Only the scientific names, read by the C parser and filtered while reading
+        scientific_names_df = read_names_dmp(args.path_to_ncbi_dump, name_classes=['scientific name'],
+                                             columns=[0, 1], names=['ncbi_id', 'taxaname'])
+
+    set_ontology_cache(args.ontology_cache)
+    set_owl_reader(args.owl_reader)
+
+    if args.path_to_uberon_owl != 'none' and args.path_to_po_owl != 'none' and args.path_to_cl_owl != 'none':
+        uberon_df = get_uberon_table(args.path_to_uberon_owl)
+        cl_df = get_ontology_table(args.path_to_cl_owl, ont_prefix = 'CL_')
+        po_df = get_ontology_table(args.path_to_po_owl, ont_prefix = 'PO_', rm_synonym_info = True)
+        bodypart_tables = [uberon_df, cl_df, po_df]
+
+    if args.path_to_biome_envs_owl != 'none' and args.path_to_material_envs_owl != 'none':
+        envBiome_onto = get_ontology_table(args.path_to_biome_envs_owl, ont_prefix = 'ENVO_', index_column_name = 'ENVOEnvironmentBiomeIndex')
+        envMaterial_onto = get_ontology_table(args.path_to_material_envs_owl, ont_prefix = 'ENVO_', index_column_name = 'ENVOEnvironmentMaterialIndex')
+
+    if args.path_to_doid_owl != 'none':
+        doid_df = get_ontology_table(args.path_to_doid_owl, ont_prefix = 'DOID_', index_column_name = 'DOIDOntologyIndex')
+
+    if args.path_to_ms_owl != 'none':
+        ms_df = get_ontology_table(args.path_to_ms_owl, ont_prefix = 'MS_', descendant_node='MS_1000031')
+
+    update_allowed_terms(allowedTerm_dict, scientific_names_df, bodypart_tables, envBiome_onto, envMaterial_onto, doid_df, ms_df)
 
     #print(f"Saving new allowed terms to {args.path_to_allowed_terms_json}")
 
-    with open('allowed_terms.json' , 'w') as json_file:
-        json.dump(allowedTerm_dict, json_file, indent=4)
\ No newline at end of file
+    write_allowed_terms(allowedTerm_dict)
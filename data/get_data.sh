@@ -38,6 +38,8 @@ if [ -f "${SCRIPT_DIR}/taxdmp.zip" ]; then
     echo "nodes.dmp has been extracted."
     unzip -o -j "${SCRIPT_DIR}/taxdmp.zip" "division.dmp" -d "${SCRIPT_DIR}"
     echo "division.dmp has been extracted."
+    unzip -o -j "${SCRIPT_DIR}/taxdmp.zip" "merged.dmp" -d "${SCRIPT_DIR}"
+    echo "merged.dmp has been extracted."
     
     # Remove the zip file to clean up
     rm "${SCRIPT_DIR}/taxdmp.zip"
@@ -8,34 +8,46 @@ DATA_FOLDER = "$baseDir/data"
 //This is default empty file, we will overwrite this in web application
 params.old_redu = './data/empty_redu.tsv'
 
-
-process updateAllowedTerms {
-    publishDir "./nf_output", mode: 'copy'
-
-    conda "$TOOL_FOLDER/conda_env.yml"
-
-    input:
-    val x
-
-    output:
-    file 'allowed_terms.json'
-
-    """
-    python $TOOL_FOLDER/update_allowed_terms_from_ontologies.py  \
-    $DATA_FOLDER/allowed_terms.json \
-    --path_to_ncbi_dump $DATA_FOLDER/names.dmp \
-    --path_to_uberon_owl $DATA_FOLDER/uberon.owl \
-    --path_to_po_owl $DATA_FOLDER/po.owl \
-    --path_to_cl_owl $DATA_FOLDER/cl.owl \
-    --path_to_doid_owl $DATA_FOLDER/doid.owl \
-    --path_to_ms_owl $DATA_FOLDER/ms.owl \
-    --path_to_material_envs_owl $DATA_FOLDER/material-hierarchy.owl \
-    --path_to_biome_envs_owl $DATA_FOLDER/biome-hierarchy.owl
-    """
+//Number of processes used to harmonize the GitHub/MassIVE metadata files
+params.harmonize_cpus = 4
+
+//Number of processes preparing the ontology tables, one OWL or NCBI file each. Only used with ontology_cache or
+//owl_reader = "stream", owlready2 otherwise loads all OWL files into one world in one process
+params.ontology_cpus = 4
+
+//SQLite file that keeps term resolutions across runs, off by default. It is written by several processes outside
+//the work directories, so only set it to a writable path on a local file system
+params.resolution_cache = ''
+RESOLUTION_CACHE_ARG = params.resolution_cache ? "--resolution_cache ${params.resolution_cache}" : ''
+
+//Folder keeping the parsed OWL files across runs, off by default. It is written by several processes outside
+//the work directories, so only set it to a writable path on a local file system
+params.ontology_cache = ''
+ONTOLOGY_CACHE_ARG = params.ontology_cache ? "--ontology_cache ${params.ontology_cache}" : ''
+
+//How the OWL files are read: 'owlready2', or 'stream' to only extract the classes, labels, synonyms and hierarchy
+params.owl_reader = "owlready2"
+
+//Manifest and output of a previous gnpsHarmonize run, unchanged files are not harmonized again. Off by default, the
+//last run is kept in nf_output/gnps_harmonized/harmonize_manifest.json and nf_output/gnps_harmonized/adjusted_metadata_folder
+params.previous_harmonize_manifest = ''
+params.previous_harmonized_folder = ''
+HARMONIZE_INCREMENTAL_ARG = params.previous_harmonize_manifest && file(params.previous_harmonize_manifest).exists() ? "--previous_manifest ${params.previous_harmonize_manifest} --previous_output_folder ${params.previous_harmonized_folder}" : ''
+
+//merged.dmp maps merged taxids to the current ones, it is only extracted by newer versions of data/get_data.sh
+MERGED_DMP_ARG = file("$DATA_FOLDER/merged.dmp").exists() ? "--merged_dmp $DATA_FOLDER/merged.dmp" : ''
+
+//Write one JSONL report of remapped values and ignored columns per converter, published to nf_output/remapping_reports
+params.remapping_report = true
+//Remapped values printed to the process logs: 0 none, 1 one line per column, 2 every value
+params.remapping_verbosity = 1
+
+def remappingReportArg(name) {
+    def report_arg = params.remapping_report ? "--remapping_report ${name}_remapping_report.jsonl " : ''
+    return report_arg + "--remapping_verbosity ${params.remapping_verbosity}"
 }
 
 
-
 process downloadMetadata_massive_and_github {
     publishDir "./nf_output", mode: 'copy'
 
@@ -61,17 +73,20 @@ process downloadMetadata_massive_and_github {
 process mwbRun {
     conda "$TOOL_FOLDER/conda_env.yml"
 
-    publishDir "./nf_output", mode: 'copy'
+    publishDir "./nf_output", mode: 'copy', pattern: 'REDU_from_MWB_all.tsv'
+    publishDir "./nf_output/remapping_reports", mode: 'copy', pattern: '*_remapping_report.jsonl'
 
     input:
     path uberon_po_cl_csv_path
     path ENVO_bio_csv
     path ENVO_material_csv
     path ncbi_rank_division
+    path ontology_table_stores
     path allowed_terms
 
     output:
     file 'REDU_from_MWB_all.tsv'
+    path 'MWB_remapping_report.jsonl', optional: true
 
     """
     python $TOOL_FOLDER/MWB_to_REDU.py \
@@ -83,7 +98,12 @@ process mwbRun {
     --path_to_envo_biome_csv ${ENVO_bio_csv} \
     --path_to_envo_material_csv ${ENVO_material_csv} \
     --path_ncbi_rank_division ${ncbi_rank_division} \
-    --path_to_polarity_info $DATA_FOLDER/MWB_polarity_table.csv
+    --path_to_polarity_info $DATA_FOLDER/MWB_polarity_table.csv \
+    --nodes_dmp $DATA_FOLDER/nodes.dmp \
+    --names_dmp $DATA_FOLDER/names.dmp \
+    $MERGED_DMP_ARG \
+    $RESOLUTION_CACHE_ARG \
+    ${remappingReportArg('MWB')}
     """
 }
 
@@ -132,17 +152,20 @@ process mlRun {
 
     conda "$TOOL_FOLDER/conda_env.yml"
 
-    publishDir "./nf_output", mode: 'copy'
+    publishDir "./nf_output", mode: 'copy', pattern: 'Metabolights2REDU_ALL.tsv'
+    publishDir "./nf_output/remapping_reports", mode: 'copy', pattern: '*_remapping_report.jsonl'
 
     input:
     path uberon_po_cl_csv_path
     path ENVO_bio_csv
     path ENVO_material_csv
     path ncbi_rank_division
+    path ontology_table_stores
     path allowed_terms
 
     output:
     file 'Metabolights2REDU_ALL.tsv'
+    path 'Metabolights_remapping_report.jsonl', optional: true
 
 
     """
@@ -153,7 +176,12 @@ process mlRun {
     --path_to_uberon_cl_po_csv ${uberon_po_cl_csv_path} \
     --path_to_envo_biome_csv ${ENVO_bio_csv} \
     --path_to_envo_material_csv ${ENVO_material_csv} \
-    --path_ncbi_rank_division ${ncbi_rank_division}
+    --path_ncbi_rank_division ${ncbi_rank_division} \
+    --nodes_dmp $DATA_FOLDER/nodes.dmp \
+    --names_dmp $DATA_FOLDER/names.dmp \
+    $MERGED_DMP_ARG \
+    $RESOLUTION_CACHE_ARG \
+    ${remappingReportArg('Metabolights')}
     """
 }
 
@@ -200,17 +228,20 @@ process normanRun {
 
     conda "$TOOL_FOLDER/conda_env.yml"
 
-    publishDir "./nf_output", mode: 'copy'
+    publishDir "./nf_output", mode: 'copy', pattern: 'NORMAN2REDU_ALL.tsv'
+    publishDir "./nf_output/remapping_reports", mode: 'copy', pattern: '*_remapping_report.jsonl'
 
     input:
     path uberon_po_cl_csv_path
     path ENVO_bio_csv
     path ENVO_material_csv
     path ncbi_rank_division
+    path ontology_table_stores
     path allowed_terms
 
     output:
     file 'NORMAN2REDU_ALL.tsv'
+    path 'NORMAN_remapping_report.jsonl', optional: true
 
 
     """
@@ -221,7 +252,10 @@ process normanRun {
     --path_to_envo_biome_csv ${ENVO_bio_csv} \
     --path_to_envo_material_csv ${ENVO_material_csv} \
     --path_ncbi_rank_division ${ncbi_rank_division} \
-    --output NORMAN2REDU_ALL.tsv
+    --output NORMAN2REDU_ALL.tsv \
+    --names_dmp $DATA_FOLDER/names.dmp \
+    $RESOLUTION_CACHE_ARG \
+    ${remappingReportArg('NORMAN')}
     """
 }
 
@@ -253,11 +287,14 @@ process mergeAllMetadata {
     """
 }
 
-process prepare_ontologies {
+// Builds the ontology tables and the allowed terms, every OWL file is parsed once
+process compileOntologies {
     publishDir "./nf_output", mode: 'copy'
 
     conda "$TOOL_FOLDER/conda_env.yml"
 
+    cpus params.ontology_cpus
+
     input:
     val x
 
@@ -267,27 +304,42 @@ process prepare_ontologies {
     path 'ENVO_biome_ontology.csv'
     path 'ENVO_material_ontology.csv'
     path 'NCBI_Rank_Division.csv'
+    path '*_ontology_hierarchy.csv'
+    path '*.parquet'
+    path 'allowed_terms.json'
+    path 'allowed_terms.sqlite'
 
     """
-    python $TOOL_FOLDER/prepare_ontologies.py \
+    python $TOOL_FOLDER/ontology_compiler.py \
+    $DATA_FOLDER/allowed_terms.json \
     --path_to_uberon_owl $DATA_FOLDER/uberon.owl \
     --path_to_cl_owl $DATA_FOLDER/cl.owl \
     --path_to_po_owl $DATA_FOLDER/po.owl \
     --path_to_doid_owl $DATA_FOLDER/doid.owl \
+    --path_to_ms_owl $DATA_FOLDER/ms.owl \
     --path_to_biome_envs_owl $DATA_FOLDER/biome-hierarchy.owl \
     --path_to_material_envs_owl $DATA_FOLDER/material-hierarchy.owl \
+    --path_to_ncbi_names_dmp $DATA_FOLDER/names.dmp \
     --path_to_ncbi_nodes_dmp $DATA_FOLDER/nodes.dmp \
-    --path_to_ncbi_division_dmp $DATA_FOLDER/division.dmp
+    --path_to_ncbi_division_dmp $DATA_FOLDER/division.dmp \
+    $ONTOLOGY_CACHE_ARG \
+    --owl_reader ${params.owl_reader} \
+    --workers ${task.cpus}
     """
 }
 
 
 // This cleans up the metadata from MassIVE into the appropriate CV terms
 process gnpsHarmonize {
-    publishDir "./nf_output", mode: 'copy'
+    publishDir "./nf_output", mode: 'copy', pattern: 'adjusted_metadata_folder'
+    // MASST_to_REDU publishes a folder of the same name, this copy is kept for the next incremental run
+    publishDir "./nf_output/gnps_harmonized", mode: 'copy', pattern: '{adjusted_metadata_folder,harmonize_manifest.json}'
+    publishDir "./nf_output/remapping_reports", mode: 'copy', pattern: '*_remapping_report.jsonl'
 
     conda "$TOOL_FOLDER/conda_env.yml"
 
+    cpus params.harmonize_cpus
+
     input:
     path metadata_ch
     path UBERON_CL_PO_ontology_csv
@@ -295,10 +347,13 @@ process gnpsHarmonize {
     path ENVO_bio_csv
     path ENVO_material_csv
     path ncbi_rank_division
+    path ontology_table_stores
     path allowed_terms
 
     output:
     file 'adjusted_metadata_folder'
+    file 'harmonize_manifest.json'
+    path 'GNPS_remapping_report.jsonl', optional: true
 
     """
     mkdir adjusted_metadata_folder
@@ -310,7 +365,12 @@ process gnpsHarmonize {
     --path_to_uberon_cl_po_csv ${UBERON_CL_PO_ontology_csv} \
     --path_to_doid_csv ${DOID_ontology_csv} \
     --path_to_envo_biome_csv ${ENVO_bio_csv} \
-    --path_to_envo_material_csv ${ENVO_material_csv}
+    --path_to_envo_material_csv ${ENVO_material_csv} \
+    --workers ${task.cpus} \
+    --manifest harmonize_manifest.json \
+    $HARMONIZE_INCREMENTAL_ARG \
+    $RESOLUTION_CACHE_ARG \
+    ${remappingReportArg('GNPS')}
     """
 }
 
@@ -324,6 +384,7 @@ process gnpsmatchName {
     // file 'passed_file_names.tsv'
     file 'adjusted_metadata_folder'
     path allowed_terms
+    path allowed_terms_store
 
     output:
     file 'gnps_metadata_all.tsv'
@@ -340,17 +401,20 @@ process gnpsmatchName {
 
 // Getting microbmemasst data and putting it in a tentaive redu format
 process MASST_to_REDU {
-    publishDir "./nf_output", mode: 'copy'
+    publishDir "./nf_output", mode: 'copy', pattern: 'adjusted_metadata_folder'
+    publishDir "./nf_output/remapping_reports", mode: 'copy', pattern: '*_remapping_report.jsonl'
 
     conda "$TOOL_FOLDER/conda_env.yml"
 
     input:
     path redu_table
     path ncbi_rank_division
+    path ontology_table_stores
     path allowed_terms
 
     output:
     file 'adjusted_metadata_folder'
+    path 'MASST_remapping_report.jsonl', optional: true
 
     """
     mkdir adjusted_metadata_folder
@@ -360,7 +424,9 @@ process MASST_to_REDU {
     --path_microbeMASST $DATA_FOLDER/microbe_masst_table.csv \
     --path_plantMASST $DATA_FOLDER/plant_masst_table.csv \
     --path_ncbiRanksDivisions ${ncbi_rank_division} \
-    --AllowedTermJson_path ${allowed_terms}
+    --AllowedTermJson_path ${allowed_terms} \
+    $RESOLUTION_CACHE_ARG \
+    ${remappingReportArg('MASST')}
     """
 }
 
@@ -374,6 +440,7 @@ process gnpsmatchName_masst {
     input:
     file 'adjusted_metadata_folder' 
     path allowed_terms
+    path allowed_terms_store
 
     output:
     file 'masst_metadata_all.tsv'
@@ -433,7 +500,7 @@ process saveOlderData {
 process enrich_ncbi_information {
     publishDir "./nf_output", mode: 'copy'
 
-    conda "$TOOL_FOLDER/conda_env_ete3.yml"
+    conda "$TOOL_FOLDER/conda_env.yml"
 
     input:
     path merged_ch
@@ -451,38 +518,40 @@ process enrich_ncbi_information {
 
     python $TOOL_FOLDER/ncbi_database.py \
     ${merged_ch}  \
-    merged_with_ncbi.tsv
+    merged_with_ncbi.tsv \
+    --nodes_dmp $DATA_FOLDER/nodes.dmp \
+    --names_dmp $DATA_FOLDER/names.dmp \
+    $MERGED_DMP_ARG
     """
 }
 
 
 workflow {
 
-    //  Prepare ontologies
-    (uberon_cl_co_onto, doid_onto, envo_bio, envo_material, ncbi_rank_division) = prepare_ontologies(1)
-    allowed_terms = updateAllowedTerms(1)
+    //  Prepare ontologies and allowed terms, every OWL file is parsed once
+    (uberon_cl_co_onto, doid_onto, envo_bio, envo_material, ncbi_rank_division, ontology_hierarchies, ontology_table_stores, allowed_terms, allowed_terms_store) = compileOntologies(1)
 
     // Massive REDU data, called before GitHub because taking it from MassIVE as the place to keep metadata and not github
     (file_paths_ch, metadata_ch) = downloadMetadata_massive_and_github(1)
-    msv_metadata_ch = gnpsHarmonize(metadata_ch, uberon_cl_co_onto, doid_onto, envo_bio, envo_material, ncbi_rank_division, allowed_terms)
-    gnps_metadata_ch = gnpsmatchName(msv_metadata_ch, allowed_terms)
+    (msv_metadata_ch, harmonize_manifest_ch, gnps_remapping_report) = gnpsHarmonize(metadata_ch, uberon_cl_co_onto, doid_onto, envo_bio, envo_material, ncbi_rank_division, ontology_table_stores, allowed_terms)
+    gnps_metadata_ch = gnpsmatchName(msv_metadata_ch, allowed_terms, allowed_terms_store)
 
     // MicrobeMASST and PlantMASST
-    masst_metadata_ch = MASST_to_REDU(gnps_metadata_ch, ncbi_rank_division, allowed_terms)
-    masst_metadata_wFiles_ch = gnpsmatchName_masst(masst_metadata_ch, allowed_terms)
+    (masst_metadata_ch, masst_remapping_report) = MASST_to_REDU(gnps_metadata_ch, ncbi_rank_division, ontology_table_stores, allowed_terms)
+    masst_metadata_wFiles_ch = gnpsmatchName_masst(masst_metadata_ch, allowed_terms, allowed_terms_store)
 
     // Metabolomics Workbench
-    mwb_metadata_ch = mwbRun(uberon_cl_co_onto, envo_bio, envo_material, ncbi_rank_division, allowed_terms)
+    (mwb_metadata_ch, mwb_remapping_report) = mwbRun(uberon_cl_co_onto, envo_bio, envo_material, ncbi_rank_division, ontology_table_stores, allowed_terms)
     mwb_files_ch = mwbFiles(1)
     mwb_redu_ch = formatmwb(mwb_metadata_ch, mwb_files_ch)
 
     // Metabolights
-    ml_metadata_ch = mlRun(uberon_cl_co_onto, envo_bio, envo_material, ncbi_rank_division, allowed_terms)
+    (ml_metadata_ch, ml_remapping_report) = mlRun(uberon_cl_co_onto, envo_bio, envo_material, ncbi_rank_division, ontology_table_stores, allowed_terms)
     ml_files_ch = mlFiles(1)
     ml_redu_ch = formatml(ml_metadata_ch, ml_files_ch)
 
     // NORMAN
-    norman_metadata_ch = normanRun(uberon_cl_co_onto, envo_bio, envo_material, ncbi_rank_division, allowed_terms)
+    (norman_metadata_ch, norman_remapping_report) = normanRun(uberon_cl_co_onto, envo_bio, envo_material, ncbi_rank_division, ontology_table_stores, allowed_terms)
 
     // Combine everything
     merged_ch = mergeAllMetadata(allowed_terms, gnps_metadata_ch, mwb_redu_ch, ml_redu_ch, norman_metadata_ch, masst_metadata_wFiles_ch)
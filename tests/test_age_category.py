@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from REDU_conversion_functions import age_category, age_category_series
+
+
+@pytest.mark.parametrize('age, category', [
+    ('1.99', 'Infancy (<2 yrs)'),
+    ('2', 'Early Childhood (2 yrs < x <=8 yrs)'),
+    ('8', 'Early Childhood (2 yrs < x <=8 yrs)'),
+    ('8.0001', 'Adolescence (8 yrs < x <= 18 yrs)'),
+    ('65', 'Middle Adulthood (45 yrs < x <= 65 yrs)'),
+    ('inf', 'Later Adulthood (>65 yrs)'),
+    ('-inf', 'Infancy (<2 yrs)'),
+    ('nan', ''),
+    ('abc', ''),
+    ('', ''),
+])
+def test_bin_edges(age, category):
+    assert age_category(age) == category
+    assert age_category_series([age])[0] == category
+
+
+def test_series_matches_age_category():
+    ages = ['2', 2, 8.0, np.nextafter(2, -np.inf), np.inf, np.nan, None, '1e2', ' 45 ', 'missing value', '2', '8']
+    assert list(age_category_series(ages)) == [age_category(age) for age in ages]
@@ -0,0 +1,45 @@
+import io
+import json
+import os
+
+import pandas as pd
+
+from read_and_validate_redu_from_github import complete_and_fill_REDU_table
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+#the ontology tables the expected output was made with
+UBERON = pd.DataFrame({'UBERONOntologyIndex': ['UBERON:1', 'UBERON:2', 'UBERON:3', 'UBERON:4', 'UBERON:5'],
+                       'Label': ['blood plasma', 'feces', 'skin of body', 'liver', 'urine'],
+                       'Synonym': ['plasma', 'stool', 'skin', 'liver', 'urine'],
+                       'Is Multicellular': [False, False, True, True, False],
+                       'Is Organ': [False, False, True, True, False],
+                       'Is Fluid': [True, False, False, False, True]})
+DOID = pd.DataFrame({'DOIDOntologyIndex': ['DOID:1', 'DOID:2', 'DOID:3'],
+                     'Label': ['diabetes mellitus', 'asthma', 'obesity'], 'Synonym': ['d', 'a', 'o']})
+BIOME = pd.DataFrame({'ENVOEnvironmentBiomeIndex': ['ENVO:1', 'ENVO:2', 'ENVO:3'],
+                      'Label': ['marine biome', 'forest biome', 'desert biome']})
+MATERIAL = pd.DataFrame({'ENVOEnvironmentMaterialIndex': ['ENVO:11', 'ENVO:12', 'ENVO:13'],
+                         'Label': ['soil', 'sea water', 'sediment']})
+NCBI = pd.DataFrame({'TaxonID': [9606, 1883, 562, 10090], 'NCBIRank': ['species', 'genus', 'species', 'species'],
+                     'NCBIDivision': ['Primates', 'Bacteria', 'Bacteria', 'Rodents']})
+
+
+def test_matches_the_merge_based_output():
+    # redu_table_expected.tsv was written by complete_and_fill_REDU_table before the ontology join stage,
+    # which merged every ontology table into the frame
+    with open(os.path.join(DATA, 'allowed_terms.json')) as f:
+        allowedTerm_dict = json.load(f)
+    df = pd.read_csv(os.path.join(DATA, 'redu_table_input.tsv'), sep='\t', dtype=str, keep_default_na=False)
+
+    result = complete_and_fill_REDU_table(df, allowedTerm_dict,
+                                          UBERONOntologyIndex_table=UBERON.copy(), DOIDOntologyIndex_table=DOID.copy(),
+                                          ENVOEnvironmentBiomeIndex_table=BIOME.copy(),
+                                          ENVOEnvironmentMaterialIndex_table=MATERIAL.copy(),
+                                          NCBIRankDivision_table=NCBI.copy())
+
+    output = io.StringIO()
+    result.to_csv(output, sep='\t', index=False)
+    with open(os.path.join(DATA, 'redu_table_expected.tsv')) as f:
+        assert output.getvalue() == f.read()
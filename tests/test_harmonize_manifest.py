@@ -0,0 +1,55 @@
+import pytest
+
+from harmonize_manifest import manifest_entry, load_manifest, write_manifest, reuse_previous_output
+from remapping_report import RemappingReport
+
+
+RECORDS = [{'kind': 'remapped', 'dataset': 'MSV000001', 'column': 'SampleType', 'observed': ' animal ', 'mapped': 'animal', 'count': 3},
+           {'kind': 'ignored', 'dataset': 'MSV000001', 'column': 'ExtraColumn', 'count': 3}]
+
+
+@pytest.fixture
+def previous_run(tmp_path):
+    input_path = tmp_path / 'MSV000001.tsv'
+    input_path.write_text('MassiveID\tSampleType\nMSV000001\t animal \n')
+    previous_folder = tmp_path / 'previous'
+    previous_folder.mkdir()
+    (previous_folder / 'MSV000001.tsv').write_text('harmonized')
+
+    previous_entry = manifest_entry(str(input_path), 'terms', 'ontologies', 'code')
+    previous_entry['output'] = 'MSV000001.tsv'
+    previous_entry['remapping'] = RECORDS
+    write_manifest(str(tmp_path / 'manifest.json'), {'MSV000001.tsv': previous_entry})
+
+    output_folder = tmp_path / 'output'
+    output_folder.mkdir()
+    return input_path, previous_folder, output_folder, load_manifest(str(tmp_path / 'manifest.json'))['MSV000001.tsv']
+
+
+def test_reuses_output_and_remapping(previous_run):
+    input_path, previous_folder, output_folder, previous_entry = previous_run
+    entry = manifest_entry(str(input_path), 'terms', 'ontologies', 'code')
+
+    assert reuse_previous_output(previous_entry, entry, str(previous_folder), str(output_folder))
+    assert (output_folder / 'MSV000001.tsv').read_text() == 'harmonized'
+    assert entry['output'] == 'MSV000001.tsv'
+
+    report = RemappingReport()
+    report.add_records(entry['remapping'])
+    assert list(report.records()) == RECORDS
+
+
+@pytest.mark.parametrize('changed', ['input', 'allowed_terms', 'code', 'old_manifest', 'missing_output'])
+def test_does_not_reuse(previous_run, changed):
+    input_path, previous_folder, output_folder, previous_entry = previous_run
+    if changed == 'input':
+        input_path.write_text('MassiveID\tSampleType\nMSV000001\tplant\n')
+    elif changed == 'old_manifest':
+        del previous_entry['remapping']
+    elif changed == 'missing_output':
+        (previous_folder / 'MSV000001.tsv').unlink()
+    entry = manifest_entry(str(input_path), 'new terms' if changed == 'allowed_terms' else 'terms', 'ontologies',
+                           'new code' if changed == 'code' else 'code')
+
+    assert not reuse_previous_output(previous_entry, entry, str(previous_folder), str(output_folder))
+    assert not (output_folder / 'MSV000001.tsv').exists()
@@ -0,0 +1,23 @@
+import pandas as pd
+
+from mass_spectrometer_resolver import MassSpectrometerResolver
+
+
+#two terms share the name Orbitrap and two the accession MS:1000447
+TERMS = ['Orbitrap|MS:1000001', 'LTQ|MS:1000447', 'Orbitrap|MS:1000002', 'LTQ XL|MS:1000447']
+
+
+def test_resolve_takes_the_first_term():
+    resolver = MassSpectrometerResolver(TERMS)
+    assert resolver.resolve('Orbitrap|MS:9') == 'Orbitrap|MS:1000001'
+    assert resolver.resolve('unknown|MS:1000447') == 'LTQ|MS:1000447'
+    assert resolver.resolve('Orbitrap|MS:1000002') == 'Orbitrap|MS:1000002'
+    assert resolver.resolve('unknown|MS:9', default='missing value') == 'missing value'
+    assert resolver.resolve('Orbitrap', default='missing value') == 'missing value'
+
+
+def test_name_matches_take_the_last_term():
+    resolver = MassSpectrometerResolver(TERMS)
+    assert resolver.match_names(['Orbitrap', 'LTQ']).tolist() == ['Orbitrap|MS:1000002', 'LTQ|MS:1000447']
+    assert pd.isna(resolver.match_names(['nope'])[0])
+    assert resolver.match_normalized_names(['orbi-trap', 'ltq xl']).tolist() == ['Orbitrap|MS:1000002', 'LTQ XL|MS:1000447']